@@ -69,6 +69,20 @@ class APIgwQueueIngestionStack(Stack):
         #Allow SQS Processor Lambda to invoke Batch Simulator Lambda function
         batch_simulator_function.grant_invoke(sqs_processor_lambda.role)
 
+        #Run batch jobs in the Batch Simulator function (remote) or in the SQS Processor function (in_process),
+        #select the mode with: cdk deploy -c job_execution_mode=in_process
+        job_execution_mode = self.node.try_get_context('job_execution_mode') or 'remote'
+        sqs_processor_lambda.add_environment('JOB_EXECUTION_MODE', job_execution_mode)
+        if job_execution_mode == 'in_process':
+            sqs_processor_lambda.add_environment('BATCH_SIMULATOR_BUCKET_NAME', job_output_payload_s3.bucket_name)
+            job_output_payload_s3.grant_write(sqs_processor_lambda)
+
+        #Job payloads as a JSON document (json) or one JSON record per line (ndjson), optionally gzip compressed,
+        #select them with: cdk deploy -c job_output_format=ndjson -c job_output_compression=gzip
+        for lambda_function in [batch_simulator_function, sqs_processor_lambda]:
+            lambda_function.add_environment('JOB_OUTPUT_FORMAT', self.node.try_get_context('job_output_format') or 'json')
+            lambda_function.add_environment('JOB_OUTPUT_COMPRESSION', self.node.try_get_context('job_output_compression') or 'none')
+
         #create get job status function 
         get_job_status_function = APIgwQueueIngestionStack.create_get_job_status_function(self, sqs_msg_store_ddb_tbl)
 
@@ -234,7 +248,7 @@ class APIgwQueueIngestionStack(Stack):
         )
 
         #Create an SQS event source for Lambda
-        sqs_event_source = lambda_event_source.SqsEventSource(job_request_queue)
+        sqs_event_source = lambda_event_source.SqsEventSource(job_request_queue, report_batch_item_failures=True)
 
         #Add SQS event source to the Lambda function
         sqs_processor_lambda.add_event_source(sqs_event_source)
@@ -261,6 +275,8 @@ class APIgwQueueIngestionStack(Stack):
             "job-payload-output-bucket"+ this.stack_name,
             bucket_name = "job-payload-output-bucket"+ this.stack_name,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            #Remove the parts of job payload uploads that were neither completed nor aborted
+            lifecycle_rules=[s3.LifecycleRule(abort_incomplete_multipart_upload_after=cdk.Duration.days(1))],
         )
 
         return  job_output_payload_s3
@@ -5,56 +5,141 @@ import boto3
 import json
 import os
 import random
+import zlib
 
 DEFAULT_WEATHER_DATA_STORE = 'weather_sample_data.dat'
+# Weather records of a generated job payload
+JOB_RECORD_COUNT = int(os.environ.get('JOB_RECORD_COUNT', '99'))
+# Fields of the '|' separated lines of the sample data file
+WEATHER_DATA_FIELDS = ["station", "geoLocation", "localTime", "conditions", "temperature", "pressure", "humidity"]
+weather_data_records = {}
+# Job payloads are a JSON document ('json') or one JSON record per line ('ndjson'), optionally gzip compressed
+JOB_OUTPUT_FORMAT = os.environ.get('JOB_OUTPUT_FORMAT', 'json')
+JOB_OUTPUT_COMPRESSION = os.environ.get('JOB_OUTPUT_COMPRESSION', 'none')
+CONTENT_TYPES = {'json': 'application/json', 'ndjson': 'application/x-ndjson'}
+GZIP_LEVEL = 6
+# Job payloads are uploaded in parts while they are generated, at most about one part is held in memory.
+# S3 requires parts of at least 5 MiB except for the last one
+JOB_OUTPUT_PART_SIZE = int(os.environ.get('JOB_OUTPUT_PART_SIZE', str(8 * 1024 * 1024)))
+# Records are sampled and serialized this many at a time
+SAMPLE_CHUNK_SIZE = 1000
+
 def lambda_handler(event, context):
     bucket_name = os.environ['BATCH_SIMULATOR_BUCKET_NAME']
     #'aws-sqs-ingestion-job-payload-bucket'
     print('Input reqeust event:'+ str(event))
     s3_client = boto3.client('s3')
-    messageID = event['jobRequestId']
-    print(messageID)
+    response = run_job(event, s3_client, bucket_name)
+
+    return {
+        "statusCode": 200,
+        "body": response
+    }
 
-    json_payload = generateBatchPayload(event)
+# Generates the job payload and stores it in S3, also called in-process by the SQS processor function
+def run_job(job_request, s3_client, bucket_name):
+    messageID = job_request['jobRequestId']
+    print(messageID)
+    if JOB_OUTPUT_FORMAT not in CONTENT_TYPES:
+        raise ValueError('unsupported JOB_OUTPUT_FORMAT ' + JOB_OUTPUT_FORMAT)
+    if JOB_OUTPUT_COMPRESSION not in ('none', 'gzip'):
+        raise ValueError('unsupported JOB_OUTPUT_COMPRESSION ' + JOB_OUTPUT_COMPRESSION)
 
-    s3_client.put_object( 
-     Body=json.dumps(json_payload),
-     Bucket=bucket_name,
-     Key=messageID
-    )
-    response =  {
+    writer = S3StreamWriter(s3_client, bucket_name, messageID, CONTENT_TYPES[JOB_OUTPUT_FORMAT], JOB_OUTPUT_COMPRESSION)
+    try:
+        writeBatchPayload(writer, JOB_OUTPUT_FORMAT)
+        payload_size = writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    print('Generated Payload - ' + str(JOB_RECORD_COUNT) + ' records, ' + str(payload_size) + ' bytes')
+    return {
         "jobStatus": "complete",
         "jobPayloadLocation": bucket_name,
         "jobPayloadKey" :messageID,
-        "jobRequestId" : messageID
+        "jobRequestId" : messageID,
+        "jobPayloadFormat": JOB_OUTPUT_FORMAT,
+        "jobPayloadCompression": JOB_OUTPUT_COMPRESSION,
+        "jobPayloadSize": payload_size
         }
 
-    return {
-        "statusCode": 200,
-        "body": response
-    }
+class S3StreamWriter:
+    # Writes an S3 object with a multipart upload while its content is produced.
+    # Objects smaller than a part are stored with a single put_object call instead
+    def __init__(self, s3_client, bucket_name, key, content_type, compression):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.key = key
+        self.object_args = {'ContentType': content_type}
+        self.compressor = None
+        if compression == 'gzip':
+            self.object_args['ContentEncoding'] = 'gzip'
+            # wbits 31 writes the gzip header and trailer
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        self.buffer = bytearray()
+        self.upload_id = None
+        self.parts = []
+        self.size = 0
+
+    def write(self, data):
+        if self.compressor:
+            data = self.compressor.compress(data)
+        self.buffer += data
+        if len(self.buffer) >= JOB_OUTPUT_PART_SIZE:
+            self.upload_part()
+
+    def upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name, Key=self.key, **self.object_args)['UploadId']
+        part_number = len(self.parts) + 1
+        s3_response = self.s3_client.upload_part(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id, PartNumber=part_number, Body=bytes(self.buffer))
+        self.parts.append({'ETag': s3_response['ETag'], 'PartNumber': part_number})
+        self.size += len(self.buffer)
+        self.buffer = bytearray()
 
-def generateBatchPayload(event) :
-    
-    MAX_RECORDS= 100
+    def close(self):
+        # Upload the remaining content, returns the size of the stored object
+        if self.compressor:
+            self.buffer += self.compressor.flush()
+        if self.upload_id is None:
+            self.s3_client.put_object(Body=bytes(self.buffer), Bucket=self.bucket_name, Key=self.key, **self.object_args)
+            self.size += len(self.buffer)
+            return self.size
+        if self.buffer:
+            self.upload_part()
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id, MultipartUpload={'Parts': self.parts})
+        return self.size
+
+    def abort(self):
+        # Uploaded parts of an unfinished upload are billed until the upload is aborted
+        if self.upload_id is not None:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=self.key, UploadId=self.upload_id)
+
+def load_weather_data(weather_data_store_location):
+    # Split and serialize the sample records once per execution environment, payloads are sampled from the
+    # cached records
+    if weather_data_store_location not in weather_data_records:
+        with open(weather_data_store_location) as f:
+            weather_data_records[weather_data_store_location] = [
+                json.dumps(dict(zip(WEATHER_DATA_FIELDS, line.split("|")))).encode("utf-8")
+                for line in f.read().splitlines() if line]
+    return weather_data_records[weather_data_store_location]
+
+def writeBatchPayload(writer, output_format) :
+    # The json format is the document {"weatherData": [...]}, the ndjson format has a record per line
     weather_data_store_location= os.environ.get("WEATHER_DATA_STORE",DEFAULT_WEATHER_DATA_STORE)
-    lines = open(weather_data_store_location).read().splitlines()
-    output_json  = json.loads ('{"weatherData":[]}')
-    print(output_json)
-    for ctr in range (1,MAX_RECORDS):
-        file_record = random.choice(lines)
-        file_record_split = file_record.split("|")
-        json_record =  {
-            "station" : file_record_split[0],
-            "geoLocation" : file_record_split[1],
-            "localTime": file_record_split[2],
-            "conditions" : file_record_split[3],
-            "temperature": file_record_split[4],
-            "pressure" : file_record_split[5],
-            "humidity" : file_record_split[6]
-        }
-        output_json["weatherData"].append(json_record)
-        #print (json_record) 
-    print('Genearted Payload -' + str(output_json)) 
-    return output_json 
-    
\ No newline at end of file
+    records = load_weather_data(weather_data_store_location)
+    separator = b'\n' if output_format == 'ndjson' else b', '
+    if output_format == 'json':
+        writer.write(b'{"weatherData": [')
+    for start in range(0, JOB_RECORD_COUNT, SAMPLE_CHUNK_SIZE):
+        chunk = separator.join(random.choices(records, k=min(SAMPLE_CHUNK_SIZE, JOB_RECORD_COUNT - start)))
+        if output_format == 'ndjson':
+            writer.write(chunk + separator)
+        else:
+            writer.write(separator + chunk if start else chunk)
+    if output_format == 'json':
+        writer.write(b']}')
@@ -50,6 +50,11 @@ def lambda_handler(event, context):
                 "jobProcessedPayloadLink" :S3_presigned_url,
                 "jobRequestId" :job_request_id
                 }
+            # Jobs completed before the payload format was recorded have JSON payloads of unknown size
+            response_str['jobPayloadFormat'] = dynamo_record.get('jobPayloadFormat', 'json')
+            response_str['jobPayloadCompression'] = dynamo_record.get('jobPayloadCompression', 'none')
+            if 'jobPayloadSize' in dynamo_record:
+                response_str['jobPayloadSize'] = int(dynamo_record['jobPayloadSize'])
             print ("sending response.... "+str(response_str))
             return {
                 "statusCode":"200",
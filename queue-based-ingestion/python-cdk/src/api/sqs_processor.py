@@ -4,41 +4,129 @@
 import boto3
 import json
 import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 lambda_client = boto3.client('lambda')
-def lambda_handler(event, context):
-    dynamo_table_name = os.environ['SQS_MESSAGE_STORE_TABLE_NAME']
-    simulator_function_name = os.environ['BATCH_SIMULATOR_FUNCTION_NAME']
-    dynamo_client = boto3.resource('dynamodb').Table(dynamo_table_name)
-    
-    print('incoming request payload from SQS'+ str(event)) 
-    for record in event['Records']:
-        print(' processing record' + str(record))
-        job_request_paylod = create_job_reqeust(record)
-        dynamo_client.put_item(Item=job_request_paylod)
-       # batch_payload = record
-        print('invoking simulator function' + simulator_function_name)
+# Records of a batch are processed concurrently, the wall time of a batch is that of its slowest record
+MAX_CONCURRENT_RECORDS = int(os.environ.get('MAX_CONCURRENT_RECORDS', '10'))
+# Batch jobs run in the batch simulator function ('remote') or in this function ('in_process'),
+# in-process jobs save an invocation, its serialization and the billed time of waiting for it
+JOB_EXECUTION_MODE = os.environ.get('JOB_EXECUTION_MODE', 'remote')
+# Job requests of a batch are stored with BatchWriteItem, it accepts up to 25 items per call
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_RETRIES = 5
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+# Attributes of the job response stored with the job request, when the response has them
+JOB_RESULT_ATTRIBUTES = ['jobStatus', 'jobPayloadLocation', 'jobPayloadKey',
+                         'jobPayloadFormat', 'jobPayloadCompression', 'jobPayloadSize']
+
+class RemoteJobExecutor:
+    # Invokes the batch simulator function and waits for its response
+    def __init__(self, function_name):
+        self.function_name = function_name
+
+    def run(self, job_request):
+        print('invoking simulator function' + self.function_name)
         # Invoke another Function
         batch_simulator_response = lambda_client.invoke(
-            FunctionName=simulator_function_name,
-            Payload=json.dumps(job_request_paylod)
+            FunctionName=self.function_name,
+            Payload=json.dumps(job_request)
         )
         print('response from simulator function : ' + str(batch_simulator_response))
         reponse_payload= json.loads(batch_simulator_response['Payload'].read().decode("utf-8"))
         print ('response  payload from simulator function '+ str(reponse_payload))
-        response_body= reponse_payload ['body']
-        job_status = response_body ['jobStatus']
-        
-        job_request_paylod ['jobStatus'] = job_status
-        job_request_paylod ['jobPayloadLocation'] = response_body ['jobPayloadLocation']
-        job_request_paylod ['jobPayloadKey'] = response_body ['jobPayloadKey']
-        dynamo_client.put_item(Item=job_request_paylod)
-        print (' sucessfuly updated  job status in DynamoDB '+  str(job_request_paylod))
+        if 'FunctionError' in batch_simulator_response:
+            raise RuntimeError('simulator function failed: ' + str(reponse_payload))
+        return reponse_payload ['body']
+
+class InProcessJobExecutor:
+    # Runs the batch simulator code in this function, it needs the simulator's bucket and sample data
+    def __init__(self, bucket_name):
+        # SAM deploys the function as the src.api.sqs_processor module, CDK as a top-level module
+        try:
+            from . import batch_simulator
+        except ImportError:
+            import batch_simulator
+        self.batch_simulator = batch_simulator
+        self.bucket_name = bucket_name
+        self.s3_client = boto3.client('s3')
+
+    def run(self, job_request):
+        return self.batch_simulator.run_job(job_request, self.s3_client, self.bucket_name)
+
+job_executors = {}
+
+def get_job_executor():
+    # Executors are created once per execution environment
+    if JOB_EXECUTION_MODE not in job_executors:
+        if JOB_EXECUTION_MODE == 'in_process':
+            job_executors[JOB_EXECUTION_MODE] = InProcessJobExecutor(os.environ['BATCH_SIMULATOR_BUCKET_NAME'])
+        elif JOB_EXECUTION_MODE == 'remote':
+            job_executors[JOB_EXECUTION_MODE] = RemoteJobExecutor(os.environ['BATCH_SIMULATOR_FUNCTION_NAME'])
+        else:
+            raise ValueError('unsupported JOB_EXECUTION_MODE ' + JOB_EXECUTION_MODE)
+    return job_executors[JOB_EXECUTION_MODE]
+
+def lambda_handler(event, context):
+    dynamo_table_name = os.environ['SQS_MESSAGE_STORE_TABLE_NAME']
+    job_executor = get_job_executor()
+    # the low level client is thread safe, Table resources are not
+    dynamo_client = boto3.resource('dynamodb').meta.client
+
+    print('incoming request payload from SQS'+ str(event))
+    job_requests = [create_job_reqeust(record) for record in event['Records']]
+    # Report only the failed messages, the others are deleted from the queue (ReportBatchItemFailures)
+    failed_job_request_ids = put_job_requests(dynamo_client, dynamo_table_name, job_requests)
+    submitted_job_requests = [job_request for job_request in job_requests
+                              if job_request['jobRequestId'] not in failed_job_request_ids]
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_CONCURRENT_RECORDS, len(submitted_job_requests)))) as executor:
+        futures = [executor.submit(process_job_request, job_request, dynamo_client, dynamo_table_name, job_executor)
+                   for job_request in submitted_job_requests]
+    for job_request, future in zip(submitted_job_requests, futures):
+        if future.exception() is not None:
+            print('failed to process job request ' + job_request['jobRequestId'] + ': ' + str(future.exception()))
+            failed_job_request_ids.append(job_request['jobRequestId'])
+    return {'batchItemFailures': [{'itemIdentifier': job_request_id} for job_request_id in failed_job_request_ids]}
+
+def put_job_requests(dynamo_client, dynamo_table_name, job_requests):
+    # Store the submitted job requests in BatchWriteItem calls, retry unprocessed items with exponential backoff
+    # and jitter. Returns the ids of the job requests that could not be stored
+    failed_job_request_ids = []
+    for i in range(0, len(job_requests), BATCH_WRITE_SIZE):
+        request_items = [{'PutRequest': {'Item': job_request}} for job_request in job_requests[i:i + BATCH_WRITE_SIZE]]
+        for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+            ddb_response = dynamo_client.batch_write_item(RequestItems={dynamo_table_name: request_items})
+            request_items = ddb_response.get('UnprocessedItems', {}).get(dynamo_table_name, [])
+            if not request_items:
+                break
+            if attempt < BATCH_WRITE_MAX_RETRIES:
+                time.sleep(BATCH_WRITE_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1))
+        failed_job_request_ids += [item['PutRequest']['Item']['jobRequestId'] for item in request_items]
+    return failed_job_request_ids
+
+def process_job_request(job_request_paylod, dynamo_client, dynamo_table_name, job_executor):
+    print(' processing job request' + str(job_request_paylod))
+    response_body = job_executor.run(job_request_paylod)
+    # Update only the attributes set by the job instead of writing the whole item again
+    job_attributes = [attribute for attribute in JOB_RESULT_ATTRIBUTES if attribute in response_body]
+    if not job_attributes:
+        # a response without any job result can't complete the job, record it as failed
+        response_body = {'jobStatus': 'Failed'}
+        job_attributes = ['jobStatus']
+    dynamo_client.update_item(
+        TableName=dynamo_table_name,
+        Key={'jobRequestId': job_request_paylod['jobRequestId']},
+        UpdateExpression='SET ' + ', '.join(attribute + ' = :' + attribute for attribute in job_attributes),
+        ExpressionAttributeValues={':' + attribute: response_body[attribute] for attribute in job_attributes}
+    )
+    print (' sucessfuly updated  job status in DynamoDB '+  str(response_body))
 
 def create_job_reqeust(record):
-    job_request =  { 
+    job_request =  {
         "jobRequestId" :record ["messageId"],
         "jobRequestPayload": record["body"],
         "SentTimestamp" : record["attributes"]["SentTimestamp"],
         "jobStatus":"Submitted"
     }
-    return job_request
\ No newline at end of file
+    return job_request
@@ -1,6 +1,7 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import gzip
 import json
 import os
 from contextlib import contextmanager
@@ -39,3 +40,74 @@ def test_batch_simulator_sucess():
         assert result["body"]["jobStatus"] == "complete"
         assert result["body"]["jobPayloadLocation"] == BATCH_SIMULATOR_BUCKET_NAME
         assert result["body"]["jobPayloadKey"] == job_message_id
+
+WEATHER_SAMPLE_DATA = ('KSEA|47.45,-122.31|2022-02-28 10:53|Cloudy|44|1021|80\n'
+                       'KPDX|45.59,-122.60|2022-02-28 10:53|Rain|46|1019|90\n')
+
+def test_run_job_reads_sample_data_once(tmp_path):
+    from src.api import batch_simulator
+    weather_data_store = tmp_path / 'weather_sample_data.dat'
+    weather_data_store.write_text(WEATHER_SAMPLE_DATA)
+    s3_client = mock.MagicMock()
+    with patch.dict(os.environ, {'WEATHER_DATA_STORE': str(weather_data_store)}), \
+         patch.object(batch_simulator, 'JOB_RECORD_COUNT', 250):
+        result = batch_simulator.run_job({'jobRequestId': 'job-1'}, s3_client, BATCH_SIMULATOR_BUCKET_NAME)
+        weather_data_store.write_text('')
+        batch_simulator.run_job({'jobRequestId': 'job-2'}, s3_client, BATCH_SIMULATOR_BUCKET_NAME)
+
+    # payloads smaller than a part are stored with a single put_object call
+    s3_client.create_multipart_upload.assert_not_called()
+    payload = s3_client.put_object.call_args_list[0].kwargs['Body']
+    weather_data = json.loads(payload)["weatherData"]
+    assert len(weather_data) == 250
+    assert len(json.loads(s3_client.put_object.call_args_list[1].kwargs['Body'])["weatherData"]) == 250
+    assert {record["station"] for record in weather_data} <= {'KSEA', 'KPDX'}
+    assert weather_data[0]["humidity"] in ('80', '90')
+    assert result["jobPayloadFormat"] == 'json'
+    assert result["jobPayloadSize"] == len(payload)
+
+def test_run_job_streams_gzip_ndjson_in_parts(tmp_path):
+    from src.api import batch_simulator
+    weather_data_store = tmp_path / 'weather_sample_data.dat'
+    # distinct records, repeated ones compress into less than a part
+    weather_data_store.write_text(''.join(f'K{i:03}|47.{i},-122.{i}|2022-02-28 10:{i % 60:02}|Cloudy|{i % 50}|{1000 + i}|{i % 100}\n'
+                                          for i in range(1000)))
+    s3_client = mock.MagicMock()
+    s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+    s3_client.upload_part.side_effect = lambda PartNumber, **kwargs: {'ETag': 'etag-' + str(PartNumber)}
+    with patch.dict(os.environ, {'WEATHER_DATA_STORE': str(weather_data_store)}), \
+         patch.multiple(batch_simulator, JOB_RECORD_COUNT=20000, JOB_OUTPUT_FORMAT='ndjson',
+                        JOB_OUTPUT_COMPRESSION='gzip', JOB_OUTPUT_PART_SIZE=1024):
+        result = batch_simulator.run_job({'jobRequestId': 'job-1'}, s3_client, BATCH_SIMULATOR_BUCKET_NAME)
+
+    s3_client.put_object.assert_not_called()
+    assert s3_client.create_multipart_upload.call_args.kwargs['ContentType'] == 'application/x-ndjson'
+    assert s3_client.create_multipart_upload.call_args.kwargs['ContentEncoding'] == 'gzip'
+    parts = [call.kwargs['Body'] for call in s3_client.upload_part.call_args_list]
+    assert len(parts) > 1
+    assert all(len(part) >= 1024 for part in parts[:-1])
+    s3_client.complete_multipart_upload.assert_called_once_with(
+        Bucket=BATCH_SIMULATOR_BUCKET_NAME, Key='job-1', UploadId='upload-1',
+        MultipartUpload={'Parts': [{'ETag': 'etag-' + str(i), 'PartNumber': i} for i in range(1, len(parts) + 1)]})
+    lines = gzip.decompress(b''.join(parts)).decode('utf-8').splitlines()
+    assert len(lines) == 20000
+    assert json.loads(lines[-1])["station"].startswith('K')
+    assert result["jobPayloadFormat"] == 'ndjson'
+    assert result["jobPayloadCompression"] == 'gzip'
+    assert result["jobPayloadSize"] == sum(len(part) for part in parts)
+
+def test_run_job_aborts_failed_upload(tmp_path):
+    from src.api import batch_simulator
+    weather_data_store = tmp_path / 'weather_sample_data.dat'
+    weather_data_store.write_text(WEATHER_SAMPLE_DATA)
+    s3_client = mock.MagicMock()
+    s3_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+    s3_client.upload_part.side_effect = [{'ETag': 'etag-1'}, RuntimeError('upload failed')]
+    with patch.dict(os.environ, {'WEATHER_DATA_STORE': str(weather_data_store)}), \
+         patch.multiple(batch_simulator, JOB_RECORD_COUNT=5000, JOB_OUTPUT_PART_SIZE=16 * 1024):
+        with pytest.raises(RuntimeError):
+            batch_simulator.run_job({'jobRequestId': 'job-1'}, s3_client, BATCH_SIMULATOR_BUCKET_NAME)
+
+    s3_client.complete_multipart_upload.assert_not_called()
+    s3_client.abort_multipart_upload.assert_called_once_with(
+        Bucket=BATCH_SIMULATOR_BUCKET_NAME, Key='job-1', UploadId='upload-1')
@@ -111,6 +111,30 @@ def test_get_job_status_job_in_complete():
         assert response_body['jobStatus'] == JOB_STAUS_INCOMPLETE
         assert 'jobProcessedPayloadLink' not in response
 
+@patch.dict(os.environ, {'SQS_MESSAGE_STORE_TABLE_NAME': SQS_MESSAGE_STORE_TABLE_NAME, 'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR','BATCH_SIMULATOR_BUCKET_NAME':BATCH_SIMULATOR_BUCKET_NAME})
+def test_get_job_status_payload_format():
+    with setup_test_environment():
+        from src.api import get_job_status
+        with open('./events/get_job_status_function.txt', 'r') as f:
+            get_job_status_event = json.load(f)
+        job_id = get_job_status_event["pathParameters"]["job-id"]
+
+        store_mock_job_record(job_id, JOB_STAUS_COMPLETE)
+        boto3.resource('dynamodb').Table(SQS_MESSAGE_STORE_TABLE_NAME).update_item(
+            Key={'jobRequestId': job_id},
+            UpdateExpression='SET jobPayloadFormat = :format, jobPayloadCompression = :compression, jobPayloadSize = :size',
+            ExpressionAttributeValues={':format': 'ndjson', ':compression': 'gzip', ':size': 1048576}
+        )
+
+        response = get_job_status.lambda_handler(get_job_status_event, '')
+        response_data = response.get("body")
+        response_data = response_data.replace("\'", "\"")
+        response_body =json.loads(response_data)
+
+        assert response_body['jobPayloadFormat'] == 'ndjson'
+        assert response_body['jobPayloadCompression'] == 'gzip'
+        assert response_body['jobPayloadSize'] == 1048576
+
 def store_mock_job_record(mock_job_url_parameter, mock_job_status):
     mock_dynamodb_table = boto3.resource('dynamodb').Table(SQS_MESSAGE_STORE_TABLE_NAME)
     mock_job_record= {
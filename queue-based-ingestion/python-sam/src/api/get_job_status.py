@@ -44,12 +44,18 @@ def lambda_handler(event, context):
                 return {
                     "Error Message" : "Error While generating S3 Pre0signed URL for  Job Id : " + job_id_parameter
                 }   
-            return {
+            response_payload = {
                 "jobStatus": job_status ,
                 "jobId": job_id_parameter,
                 "jobProcessedPayloadLink" :S3_presigned_url,
                 "jobRequestId" :job_request_id
             }
+            # Jobs completed before the payload format was recorded have JSON payloads of unknown size
+            response_payload['jobPayloadFormat'] = dynamo_record.get('jobPayloadFormat', 'json')
+            response_payload['jobPayloadCompression'] = dynamo_record.get('jobPayloadCompression', 'none')
+            if 'jobPayloadSize' in dynamo_record:
+                response_payload['jobPayloadSize'] = int(dynamo_record['jobPayloadSize'])
+            return response_payload
         else :
             # Since Job status is not complete dont add  S3 Pre-signed URL to response   
             return {
@@ -0,0 +1,82 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Compares jobs per second of the remote (batch simulator function) and in-process job executors of the
+# SQS processor, one job at a time and MAX_CONCURRENT_RECORDS jobs at a time as in an SQS batch.
+# S3 is moto's in-memory S3. The remote executor runs the batch simulator handler behind a stand-in Lambda
+# client: the JSON round trip of the payloads is real, the invocation itself is modelled by INVOKE_LATENCY_MS
+# Run from the project root: python -m tests.benchmark.benchmark_job_executor
+import contextlib
+import io
+import json
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import boto3
+from moto import mock_aws
+
+JOBS = 50
+# Round trip of a synchronous invoke of a warm function in the same region
+INVOKE_LATENCY_MS = 20
+BUCKET_NAME = 'benchmark-job-payloads'
+WEATHER_RECORD = 'KSEA|47.45,-122.31|2022-02-28 10:53|Cloudy|44|1021|80'
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+os.environ['BATCH_SIMULATOR_BUCKET_NAME'] = BUCKET_NAME
+
+
+class SimulatorLambdaClient:
+    # Stand-in for the Lambda client, invokes the batch simulator handler in this process
+    def invoke(self, FunctionName, Payload):
+        from src.api import batch_simulator
+        time.sleep(INVOKE_LATENCY_MS / 1000)
+        response_payload = json.dumps(batch_simulator.lambda_handler(json.loads(Payload), None)).encode('utf-8')
+        return {'StatusCode': 200, 'Payload': io.BytesIO(response_payload)}
+
+
+def job_request(i):
+    return {'jobRequestId': f'job-{i}', 'jobRequestPayload': '{}', 'SentTimestamp': '1646009685044', 'jobStatus': 'Submitted'}
+
+
+def run(job_executor, concurrency):
+    latencies = []
+
+    def run_job(i):
+        start = time.perf_counter()
+        job_executor.run(job_request(i))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    # The executors print the job payloads, keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(run_job, range(JOBS)))
+    elapsed = time.perf_counter() - start
+    return {
+        'jobs_per_second': round(JOBS / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 2)
+    }
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as data_dir, mock_aws():
+        os.environ['WEATHER_DATA_STORE'] = os.path.join(data_dir, 'weather_sample_data.dat')
+        with open(os.environ['WEATHER_DATA_STORE'], 'w') as f:
+            f.write('\n'.join([WEATHER_RECORD] * 1000))
+        boto3.client('s3').create_bucket(Bucket=BUCKET_NAME)
+        from src.api import sqs_processor
+        print(f"{'mode':<12}{'concurrency':>12}{'jobs/s':>10}{'p50 (ms)':>10}")
+        with patch.object(sqs_processor, 'lambda_client', SimulatorLambdaClient()):
+            executors = {
+                'remote': sqs_processor.RemoteJobExecutor('BatchSimulatorFunction'),
+                'in_process': sqs_processor.InProcessJobExecutor(BUCKET_NAME)
+            }
+            for concurrency in [1, sqs_processor.MAX_CONCURRENT_RECORDS]:
+                for mode, job_executor in executors.items():
+                    result = run(job_executor, concurrency)
+                    print(f"{mode:<12}{concurrency:>12}{result['jobs_per_second']:>10}{result['p50_ms']:>10}")
@@ -14,6 +14,7 @@ from botocore.response import StreamingBody
 
 SQS_MESSAGE_STORE_TABLE_NAME = 'SQS_MESSAGE_STORE_TEST'
 BATCH_SIMULATOR_FUNCTION_NAME = 'BATCH_SIMULATOR_TEST'
+BATCH_SIMULATOR_BUCKET_NAME = 'BATCH_SIMULATOR_TEST_BUCKET'
 TEST_PAYLOAD_MESSAGE_ID= ''
 MOCK_JOB_STATUS ='complete'
 MOCK_PAYLOAD_LOCATION='mock_payload_location'
@@ -59,7 +60,8 @@ def test_process_sqs_message(mock_lambda_client):
         mock_lambda_client.invoke.return_value = {'Payload': StreamingBody(io.BytesIO(mocked_response_payload), len(mocked_response_payload))}
         
 
-        sqs_processor.lambda_handler(sqs_event, '')
+        ret = sqs_processor.lambda_handler(sqs_event, '')
+        assert ret == {'batchItemFailures': []}
 
         return_job_record= retrieve_job_record(test_paylaod_message_id)
         assert return_job_record['jobRequestId'] == test_paylaod_message_id
@@ -67,6 +69,98 @@ def test_process_sqs_message(mock_lambda_client):
         assert return_job_record['jobPayloadLocation'] == MOCK_PAYLOAD_LOCATION
         assert return_job_record['jobPayloadKey'] == MOCK_PAYLOAD_KEY
 
+@patch.dict(os.environ, {'SQS_MESSAGE_STORE_TABLE_NAME': SQS_MESSAGE_STORE_TABLE_NAME, 'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR','BATCH_SIMULATOR_FUNCTION_NAME':BATCH_SIMULATOR_FUNCTION_NAME})
+@mock.patch("src.api.sqs_processor.lambda_client")
+def test_process_sqs_message_without_job_result(mock_lambda_client):
+    with setup_test_environment():
+        from src.api import sqs_processor
+        with open('./events/SQS_message_processor_function.txt', 'r') as f:
+            sqs_event = json.load(f)
+        test_paylaod_message_id= sqs_event['Records'][0]['messageId']
+
+        # none of the job result attributes are in the response
+        mocked_response_payload = json.dumps({'body':{'jobRequestId':test_paylaod_message_id}}).encode("utf-8")
+        mock_lambda_client.invoke.return_value = {'Payload': StreamingBody(io.BytesIO(mocked_response_payload), len(mocked_response_payload))}
+
+        ret = sqs_processor.lambda_handler(sqs_event, '')
+        assert ret == {'batchItemFailures': []}
+
+        return_job_record= retrieve_job_record(test_paylaod_message_id)
+        assert return_job_record['jobStatus'] == 'Failed'
+        assert 'jobPayloadLocation' not in return_job_record
+
+@patch.dict(os.environ, {'SQS_MESSAGE_STORE_TABLE_NAME': SQS_MESSAGE_STORE_TABLE_NAME, 'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR','BATCH_SIMULATOR_FUNCTION_NAME':BATCH_SIMULATOR_FUNCTION_NAME})
+@mock.patch("src.api.sqs_processor.lambda_client")
+def test_process_sqs_batch_partial_failure(mock_lambda_client):
+    with setup_test_environment():
+        from src.api import sqs_processor
+        with open('./events/SQS_message_processor_function.txt', 'r') as f:
+            record = json.load(f)['Records'][0]
+        sqs_event = {'Records': [dict(record, messageId=f'message-{i}') for i in range(5)]}
+
+        def invoke(FunctionName, Payload):
+            job_request_id = json.loads(Payload)['jobRequestId']
+            if job_request_id == 'message-1':
+                raise Exception('simulator throttled')
+            if job_request_id == 'message-3':
+                payload = json.dumps({'errorMessage': 'simulator failed'}).encode("utf-8")
+                return {'FunctionError': 'Unhandled', 'Payload': StreamingBody(io.BytesIO(payload), len(payload))}
+            payload = json.dumps({'body':{'jobStatus':MOCK_JOB_STATUS,'jobPayloadLocation':MOCK_PAYLOAD_LOCATION,'jobPayloadKey':job_request_id}}).encode("utf-8")
+            return {'Payload': StreamingBody(io.BytesIO(payload), len(payload))}
+        mock_lambda_client.invoke.side_effect = invoke
+
+        ret = sqs_processor.lambda_handler(sqs_event, '')
+
+        # only the failed messages are returned to the queue
+        assert ret == {'batchItemFailures': [{'itemIdentifier': 'message-1'}, {'itemIdentifier': 'message-3'}]}
+        for message_id in ['message-0', 'message-2', 'message-4']:
+            assert retrieve_job_record(message_id)['jobPayloadKey'] == message_id
+        assert retrieve_job_record('message-1')['jobStatus'] == 'Submitted'
+
+@patch.dict(os.environ, {'SQS_MESSAGE_STORE_TABLE_NAME': SQS_MESSAGE_STORE_TABLE_NAME, 'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR','BATCH_SIMULATOR_BUCKET_NAME':BATCH_SIMULATOR_BUCKET_NAME})
+@mock.patch("src.api.sqs_processor.lambda_client")
+def test_process_sqs_message_in_process(mock_lambda_client, tmp_path):
+    weather_data_store = tmp_path / 'weather_sample_data.dat'
+    weather_data_store.write_text('KSEA|47.45,-122.31|2022-02-28 10:53|Cloudy|44|1021|80\n')
+    with setup_test_environment(), mock_aws(), patch.dict(os.environ, {'WEATHER_DATA_STORE': str(weather_data_store)}):
+        boto3.client('s3').create_bucket(Bucket=BATCH_SIMULATOR_BUCKET_NAME)
+        from src.api import sqs_processor
+        with open('./events/SQS_message_processor_function.txt', 'r') as f:
+            sqs_event = json.load(f)
+        message_id = sqs_event['Records'][0]['messageId']
+
+        with patch.object(sqs_processor, 'JOB_EXECUTION_MODE', 'in_process'), patch.dict(sqs_processor.job_executors, clear=True):
+            ret = sqs_processor.lambda_handler(sqs_event, '')
+
+        # the job runs in the function, the batch simulator isn't invoked
+        assert ret == {'batchItemFailures': []}
+        mock_lambda_client.invoke.assert_not_called()
+        return_job_record = retrieve_job_record(message_id)
+        assert return_job_record['jobStatus'] == MOCK_JOB_STATUS
+        assert return_job_record['jobPayloadLocation'] == BATCH_SIMULATOR_BUCKET_NAME
+        job_payloads = boto3.client('s3').list_objects_v2(Bucket=BATCH_SIMULATOR_BUCKET_NAME)['Contents']
+        assert [job_payload['Key'] for job_payload in job_payloads] == [message_id]
+        assert return_job_record['jobPayloadFormat'] == 'json'
+        assert return_job_record['jobPayloadSize'] == job_payloads[0]['Size']
+
+@patch.dict(os.environ, {'SQS_MESSAGE_STORE_TABLE_NAME': SQS_MESSAGE_STORE_TABLE_NAME, 'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR','BATCH_SIMULATOR_FUNCTION_NAME':BATCH_SIMULATOR_FUNCTION_NAME})
+def test_put_job_requests_retries_unprocessed_items():
+    with setup_test_environment():
+        from src.api import sqs_processor
+        job_requests = [{'jobRequestId': f'message-{i}', 'jobStatus': 'Submitted'} for i in range(30)]
+        unprocessed = {SQS_MESSAGE_STORE_TABLE_NAME: [{'PutRequest': {'Item': job_requests[26]}}]}
+        dynamo_client = mock.MagicMock()
+        dynamo_client.batch_write_item.side_effect = [{'UnprocessedItems': {}}, {'UnprocessedItems': unprocessed}] + \
+            [{'UnprocessedItems': unprocessed}] * sqs_processor.BATCH_WRITE_MAX_RETRIES
+
+        with patch.object(sqs_processor, 'BATCH_WRITE_BACKOFF_SECONDS', 0):
+            failed_job_request_ids = sqs_processor.put_job_requests(dynamo_client, SQS_MESSAGE_STORE_TABLE_NAME, job_requests)
+
+        # one call for the first 25 items, the last 5 items and their retries
+        assert dynamo_client.batch_write_item.call_count == 2 + sqs_processor.BATCH_WRITE_MAX_RETRIES
+        assert len(dynamo_client.batch_write_item.call_args_list[0][1]['RequestItems'][SQS_MESSAGE_STORE_TABLE_NAME]) == 25
+        assert failed_job_request_ids == ['message-26']
+
 def retrieve_job_record(test_paylaod_message_id):
     mock_dynamodb_table = boto3.resource('dynamodb').Table(SQS_MESSAGE_STORE_TABLE_NAME)
     response = mock_dynamodb_table.get_item(Key={'jobRequestId':test_paylaod_message_id})
@@ -4,16 +4,20 @@
 from aws_cdk import (
     core as cdk,
     aws_dynamodb as ddb,
+    aws_iam as iam,
     aws_lambda as lmbd,
     aws_apigatewayv2 as httpapi,
     aws_logs as logs,
     aws_sns as sns,
+    aws_sqs as sqs,
     aws_cloudwatch as cwl
 )
 from aws_cdk.aws_lambda_python import PythonFunction
 from aws_cdk.aws_apigatewayv2_integrations import LambdaProxyIntegration
-from aws_cdk.aws_apigatewayv2_authorizers import HttpLambdaAuthorizer
+from aws_cdk.aws_apigatewayv2_authorizers import HttpLambdaAuthorizer, HttpLambdaResponseType
 from aws_cdk.aws_cloudwatch_actions import SnsAction
+from aws_cdk.aws_lambda_destinations import SqsDestination
+from aws_cdk.aws_lambda_event_sources import DynamoEventSource, SqsDlq
 
 
 class ServerlessApiStack(cdk.Stack):
@@ -32,10 +36,12 @@ class ServerlessApiStack(cdk.Stack):
 
         # Create DynamoDB tables and GSIs for the API
         locations_table = ddb.Table(self, 'LocationsTable',
-                                    partition_key=ddb.Attribute(name='locationid', type=ddb.AttributeType.STRING)
+                                    partition_key=ddb.Attribute(name='locationid', type=ddb.AttributeType.STRING),
+                                    stream=ddb.StreamViewType.KEYS_ONLY
                                     )
         resources_table = ddb.Table(self, 'ResourcesTable',
-                                    partition_key=ddb.Attribute(name='resourceid', type=ddb.AttributeType.STRING)
+                                    partition_key=ddb.Attribute(name='resourceid', type=ddb.AttributeType.STRING),
+                                    stream=ddb.StreamViewType.OLD_IMAGE
                                     )
         resources_table.add_global_secondary_index(index_name='locationidGSI',
                                                    partition_key=ddb.Attribute(name='locationid',
@@ -64,6 +70,16 @@ class ServerlessApiStack(cdk.Stack):
                                                                          type=ddb.AttributeType.NUMBER),
                                                   projection_type=ddb.ProjectionType.ALL
                                                   )
+        # Create optional single-table layout, enabled with 'cdk deploy -c single_table_layout=true'
+        single_table = None
+        if self.node.try_get_context('single_table_layout') == 'true':
+            single_table = ddb.Table(self, 'SingleTable',
+                                     partition_key=ddb.Attribute(name='PK', type=ddb.AttributeType.STRING),
+                                     sort_key=ddb.Attribute(name='SK', type=ddb.AttributeType.STRING)
+                                     )
+        single_table_name = single_table.table_name if single_table else ''
+        # Read list routes with the low-level client, enabled with 'cdk deploy -c fast_json_responses=true'
+        fast_json_responses = 'true' if self.node.try_get_context('fast_json_responses') == 'true' else 'false'
         # Create CRUD and search Lambda functions for APIs
         locations_lambda_function = PythonFunction(self, 'LocationsFunction',
                                                    entry='src/api',
@@ -74,12 +90,18 @@ class ServerlessApiStack(cdk.Stack):
                                                    tracing=lmbd.Tracing.ACTIVE,
                                                    environment={
                                                        'LOCATIONS_TABLE': locations_table.table_name,
+                                                       'RESOURCES_TABLE': resources_table.table_name,
+                                                       'BOOKINGS_TABLE': bookings_table.table_name,
+                                                       'SINGLE_TABLE': single_table_name,
+                                                       'FAST_JSON_RESPONSES': fast_json_responses,
                                                        'AWS_EMF_NAMESPACE': self.stack_name,
                                                        'AWS_XRAY_TRACING_NAME': self.stack_name,
                                                        'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR'
                                                    }
                                                    )
         locations_table.grant_read_write_data(locations_lambda_function)
+        resources_table.grant_read_data(locations_lambda_function)
+        bookings_table.grant_read_data(locations_lambda_function)
         resources_lambda_function = PythonFunction(self, 'ResourcesFunction',
                                                    entry='src/api',
                                                    index='resources.py',
@@ -89,6 +111,8 @@ class ServerlessApiStack(cdk.Stack):
                                                    tracing=lmbd.Tracing.ACTIVE,
                                                    environment={
                                                        'RESOURCES_TABLE': resources_table.table_name,
+                                                       'SINGLE_TABLE': single_table_name,
+                                                       'FAST_JSON_RESPONSES': fast_json_responses,
                                                        'AWS_EMF_NAMESPACE': self.stack_name,
                                                        'AWS_XRAY_TRACING_NAME': self.stack_name,
                                                        'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR'
@@ -104,14 +128,75 @@ class ServerlessApiStack(cdk.Stack):
                                                   tracing=lmbd.Tracing.ACTIVE,
                                                   environment={
                                                       'BOOKINGS_TABLE': bookings_table.table_name,
+                                                      'RESOURCES_TABLE': resources_table.table_name,
+                                                      'SINGLE_TABLE': single_table_name,
+                                                      'FAST_JSON_RESPONSES': fast_json_responses,
                                                       'AWS_EMF_NAMESPACE': self.stack_name,
                                                       'AWS_XRAY_TRACING_NAME': self.stack_name,
                                                       'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR'
                                                   }
                                                   )
         bookings_table.grant_read_write_data(bookings_lambda_function)
+        resources_table.grant_read_data(bookings_lambda_function)
+        # Delete resources and bookings of deleted locations and resources asynchronously
+        cascade_dead_letter_queue = sqs.Queue(self, 'CascadeDeadLetterQueue',
+                                              retention_period=cdk.Duration.days(14),
+                                              encryption=sqs.QueueEncryption.KMS_MANAGED)
+        cascade_lambda_function = PythonFunction(self, 'CascadeFunction',
+                                                 entry='src/api',
+                                                 index='cascade.py',
+                                                 handler='lambda_handler',
+                                                 runtime=lmbd.Runtime.PYTHON_3_9,
+                                                 memory_size=1024,
+                                                 timeout=cdk.Duration.seconds(100),
+                                                 tracing=lmbd.Tracing.ACTIVE,
+                                                 environment={
+                                                     'RESOURCES_TABLE': resources_table.table_name,
+                                                     'BOOKINGS_TABLE': bookings_table.table_name,
+                                                     'SINGLE_TABLE': single_table_name,
+                                                     'AWS_EMF_NAMESPACE': self.stack_name,
+                                                     'AWS_XRAY_TRACING_NAME': self.stack_name,
+                                                     'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR'
+                                                 },
+                                                 # cascades that run out of time continue in asynchronous invocations
+                                                 retry_attempts=2,
+                                                 on_failure=SqsDestination(cascade_dead_letter_queue)
+                                                 )
+        # A separate policy, the function's default policy can't refer to the function itself
+        iam.Policy(self, 'CascadeFunctionInvokePolicy',
+                   roles=[cascade_lambda_function.role],
+                   statements=[iam.PolicyStatement(actions=['lambda:InvokeFunction'],
+                                                   resources=[cascade_lambda_function.function_arn])])
+        resources_table.grant_read_write_data(cascade_lambda_function)
+        bookings_table.grant_read_write_data(cascade_lambda_function)
+        for table in [locations_table, resources_table]:
+            cascade_lambda_function.add_event_source(DynamoEventSource(table,
+                                                                       starting_position=lmbd.StartingPosition.TRIM_HORIZON,
+                                                                       batch_size=10,
+                                                                       report_batch_item_failures=True,
+                                                                       bisect_batch_on_error=True,
+                                                                       retry_attempts=3,
+                                                                       on_failure=SqsDlq(cascade_dead_letter_queue),
+                                                                       filters=[lmbd.FilterCriteria.filter(
+                                                                           {'eventName': lmbd.FilterRule.is_equal('REMOVE')})]
+                                                                       ))
+        if single_table:
+            for function in [locations_lambda_function, resources_lambda_function, bookings_lambda_function,
+                             cascade_lambda_function]:
+                single_table.grant_read_write_data(function)
         # Create API with proper authentication/authorization
         cognito_stack_name_prefix = self.cognito_stack_name.replace('-', '')
+        # Authorizer policy mode and result cache TTL, e.g. 'cdk deploy -c authorizer_policy_mode=principal'
+        authorizer_policy_mode = self.node.try_get_context('authorizer_policy_mode') or 'route'
+        authorizer_result_ttl = int(self.node.try_get_context('authorizer_result_ttl') or 300)
+        # Authorizer response mode, 'cdk deploy -c authorizer_response_mode=simple' switches to simple responses
+        authorizer_response_mode = self.node.try_get_context('authorizer_response_mode') or 'policy'
+        authorizer_identity_source = ['$request.header.Authorization']
+        authorizer_response_types = [HttpLambdaResponseType.IAM]
+        if authorizer_response_mode == 'simple':
+            # Simple responses allow or deny a single route, cache them per route and path
+            authorizer_identity_source += ['$context.routeKey', '$context.path']
+            authorizer_response_types = [HttpLambdaResponseType.SIMPLE]
         authorizer_lambda_function = PythonFunction(self, 'APIAuthorizerFunction',
                                                     entry='src/api',
                                                     index='authorizer.py',
@@ -126,18 +211,23 @@ class ServerlessApiStack(cdk.Stack):
                                                             cognito_stack_name_prefix + 'UserPoolClient'),
                                                         'ADMIN_GROUP_NAME': cdk.Fn.import_value(
                                                             cognito_stack_name_prefix + 'UserPoolAdminGroupName'),
+                                                        'POLICY_MODE': authorizer_policy_mode,
+                                                        'RESPONSE_MODE': authorizer_response_mode,
                                                         'AWS_XRAY_TRACING_NAME': self.stack_name,
                                                         'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR'
                                                     }
                                                     )
         api_lambda_authorizer = HttpLambdaAuthorizer(authorizer_name='ApiLambdaAuthorizer',
                                                      handler=authorizer_lambda_function,
-                                                     identity_source=['$request.header.Authorization'])
+                                                     response_types=authorizer_response_types,
+                                                     identity_source=authorizer_identity_source,
+                                                     results_cache_ttl=cdk.Duration.seconds(authorizer_result_ttl))
         api_log_group = logs.LogGroup(self, 'ApiLogs', retention=logs.RetentionDays.ONE_MONTH)
         api = httpapi.HttpApi(self, 'ServiceApi',
                               default_authorizer=api_lambda_authorizer,
                               cors_preflight={
-                                  'allow_headers': ['Content-Type', 'Authorization', 'X-Forwarded-For', 'X-Api-Key', 'X-Amz-Date', 'X-Amz-Security-Token'],
+                                  'allow_headers': ['Content-Type', 'Authorization', 'X-Forwarded-For', 'X-Api-Key', 'X-Amz-Date', 'X-Amz-Security-Token', 'If-None-Match'],
+                                  'expose_headers': ['ETag'],
                                   'allow_methods': [httpapi.CorsHttpMethod.GET, httpapi.CorsHttpMethod.PUT, httpapi.CorsHttpMethod.DELETE, httpapi.CorsHttpMethod.OPTIONS],
                                   'allow_origins': ['*']
                               }
@@ -162,6 +252,10 @@ class ServerlessApiStack(cdk.Stack):
                        methods=[httpapi.HttpMethod.GET, httpapi.HttpMethod.DELETE],
                        integration=LambdaProxyIntegration(handler=resources_lambda_function)
                        )
+        api.add_routes(path='/locations/{locationid}/availability',
+                       methods=[httpapi.HttpMethod.GET],
+                       integration=LambdaProxyIntegration(handler=bookings_lambda_function)
+                       )
         api.add_routes(path='/locations/{locationid}/resources/{resourceid}/bookings',
                        methods=[httpapi.HttpMethod.GET],
                        integration=LambdaProxyIntegration(handler=bookings_lambda_function)
@@ -170,6 +264,10 @@ class ServerlessApiStack(cdk.Stack):
                        methods=[httpapi.HttpMethod.GET, httpapi.HttpMethod.PUT],
                        integration=LambdaProxyIntegration(handler=bookings_lambda_function)
                        )
+        api.add_routes(path='/users/{userid}/bookings/batch',
+                       methods=[httpapi.HttpMethod.PUT],
+                       integration=LambdaProxyIntegration(handler=bookings_lambda_function)
+                       )
         api.add_routes(path='/users/{userid}/bookings/{bookingid}',
                        methods=[httpapi.HttpMethod.GET, httpapi.HttpMethod.DELETE],
                        integration=LambdaProxyIntegration(handler=bookings_lambda_function)
@@ -225,6 +323,16 @@ class ServerlessApiStack(cdk.Stack):
                                                       statistic='Sum',
                                                       threshold=1.0)
         locations_lambda_throttling_alarm.add_alarm_action(SnsAction(alarms_topic))
+        cascade_lambda_errors_alarm = cwl.Alarm(self, 'CascadeFunctionErrorsAlarm',
+                                                metric=cwl.Metric(namespace='AWS/Lambda',
+                                                                  metric_name='Errors',
+                                                                  dimensions={
+                                                                      'FunctionName': cascade_lambda_function.function_name}),
+                                                evaluation_periods=1,
+                                                period=cdk.Duration.minutes(1),
+                                                statistic='Sum',
+                                                threshold=1.0)
+        cascade_lambda_errors_alarm.add_alarm_action(SnsAction(alarms_topic))
         resources_lambda_errors_alarm = cwl.Alarm(self, 'ResourcesFunctionErrorsAlarm',
                                                   metric=cwl.Metric(namespace='AWS/Lambda',
                                                                     metric_name='Errors',
@@ -0,0 +1,57 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Compression of large response bodies, negotiated with the Accept-Encoding request header
+import base64
+import gzip
+
+# brotli is optional, responses fall back to gzip when it isn't installed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Smaller bodies are returned as is, compressing them saves less than it costs.
+# See tests/benchmark/benchmark_compression.py for the size and latency trade-off
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def accepted_encodings(event):
+    # Content codings of the Accept-Encoding header, without the ones refused with q=0
+    header = (event.get('headers') or {}).get('accept-encoding', '')
+    encodings = set()
+    for coding in header.split(','):
+        name, _, params = coding.partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name.strip():
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def compress_response(event, response):
+    # Compress the body of the response in place with the preferred accepted encoding, brotli then gzip
+    body = response['body'].encode('utf-8')
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return response
+    response['headers']['Vary'] = 'Accept-Encoding'
+    encodings = accepted_encodings(event)
+    if brotli and ('br' in encodings or '*' in encodings):
+        encoding = 'br'
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif 'gzip' in encodings or '*' in encodings:
+        encoding = 'gzip'
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        return response
+    response['headers']['Content-Encoding'] = encoding
+    response['body'] = base64.b64encode(compressed).decode('ascii')
+    response['isBase64Encoded'] = True
+    return response
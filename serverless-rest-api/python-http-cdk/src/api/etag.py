@@ -0,0 +1,40 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Entity tags and conditional GET requests, clients revalidate unchanged responses with If-None-Match
+import hashlib
+
+
+def request_header(event, name):
+    # REST API events keep the header names as sent, HTTP API events have them in lower case
+    for header, value in (event.get('headers') or {}).items():
+        if header.lower() == name:
+            return value
+    return None
+
+
+def response_etag(body):
+    # Weak tag derived from the body content, compressed and uncompressed bodies are equivalent representations
+    return f'W/"{hashlib.sha256(body.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match, etag):
+    # Weak comparison, see https://www.rfc-editor.org/rfc/rfc9110#section-13.1.2
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    opaque_tag = etag.removeprefix('W/')
+    return any(tag.strip().removeprefix('W/') == opaque_tag for tag in if_none_match.split(','))
+
+
+def conditional_get(event, response):
+    # Add an ETag to a successful GET response and replace it with 304 Not Modified when the client has it already
+    if response['statusCode'] != 200:
+        return response
+    etag = response_etag(response['body'])
+    response['headers']['ETag'] = etag
+    if not etag_matches(request_header(event, 'if-none-match'), etag):
+        return response
+    headers = {name: value for name, value in response['headers'].items() if name != 'Content-Type'}
+    return {'statusCode': 304, 'body': '', 'headers': headers}
@@ -1,6 +1,10 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import time
+
+init_started = time.perf_counter()
+
 import boto3
 import json
 import os
@@ -8,87 +12,177 @@ import uuid
 from datetime import datetime
 
 from aws_embedded_metrics import metric_scope
-from aws_xray_sdk.core import patch_all
 
-patch_all()
+try:
+    from .bulk_get import batch_get_items, get_ids
+    from .cache import TTLCache
+    from .compression import compress_response
+    from .etag import conditional_get
+    from .fast_json import EncodedJSON, query_json
+    from .fields import get_projection, project_item
+    from .router import DynamoDBMetrics, Router, patch_libraries
+except ImportError:
+    from bulk_get import batch_get_items, get_ids
+    from cache import TTLCache
+    from compression import compress_response
+    from etag import conditional_get
+    from fast_json import EncodedJSON, query_json
+    from fields import get_projection, project_item
+    from router import DynamoDBMetrics, Router, patch_libraries
+
+patch_libraries()
+router = Router(init_started)
 
 RESOURCES_TABLE = os.getenv('RESOURCES_TABLE', None)
 dynamodb = boto3.resource('dynamodb')
 ddbTable = dynamodb.Table(RESOURCES_TABLE)
+# Optional single-table layout, a location, its resources and bookings share the partition key
+SINGLE_TABLE = os.getenv('SINGLE_TABLE') or None
+single_table = dynamodb.Table(SINGLE_TABLE) if SINGLE_TABLE else None
+# Optional fast path for list responses, the low-level client returns items in DynamoDB JSON
+# that is encoded to the response directly instead of being deserialized to Python types first
+FAST_JSON_RESPONSES = os.getenv('FAST_JSON_RESPONSES', 'false') == 'true'
+ddb_client = boto3.client('dynamodb') if FAST_JSON_RESPONSES else None
+ddb_metrics = DynamoDBMetrics()
+ddb_metrics.instrument(dynamodb.meta.client)
+if ddb_client:
+    ddb_metrics.instrument(ddb_client)
+
+# Read-through cache of single resource lookups, writes of this execution environment invalidate it
+CACHE_MAX_ITEMS = int(os.getenv('CACHE_MAX_ITEMS', '1000'))
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '60'))
+resource_cache = TTLCache(CACHE_MAX_ITEMS, CACHE_TTL_SECONDS)
+
+
+# Get all resources
+@router.route('GET /locations/{locationid}/resources')
+def get_resources(event, metric_payload):
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    query_parameters = event.get('queryStringParameters') or {}
+    if 'ids' in query_parameters:
+        # get requested resources from the database, return only the ones in the location
+        items, unprocessed_ids = batch_get_items(
+            dynamodb, RESOURCES_TABLE, 'resourceid',
+            get_ids(query_parameters),
+            get_projection(query_parameters, 'resourceid', 'locationid')
+        )
+        response_body = {'items': [item for item in items
+                                   if item['locationid'] == event['pathParameters']['locationid']]}
+        if unprocessed_ids:
+            response_body['unprocessedIds'] = unprocessed_ids
+    else:
+        query_args = dict(
+            IndexName='locationidGSI',
+            KeyConditionExpression='locationid = :locationid',
+            ExpressionAttributeValues={
+                ':locationid': event['pathParameters']['locationid']
+            },
+            **get_projection(query_parameters, 'resourceid', 'locationid')
+        )
+        if FAST_JSON_RESPONSES:
+            response_body, _ = query_json(ddb_client, RESOURCES_TABLE, **query_args)
+        else:
+            ddb_response = ddbTable.query(**query_args)
+            response_body = ddb_response['Items']
+    return 200, response_body
+
+
+# Resource CRUD operations
+@router.route('GET /locations/{locationid}/resources/{resourceid}')
+def get_resource(event, metric_payload):
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = event['pathParameters']['resourceid']
+    resourceid = event['pathParameters']['resourceid']
+    item = resource_cache.get(resourceid)
+    if item is None:
+        item = ddbTable.get_item(Key={'resourceid': resourceid}).get('Item')
+        if item:
+            resource_cache.put(resourceid, item)
+    query_parameters = event.get('queryStringParameters') or {}
+    response_body = project_item(item, query_parameters, 'resourceid', 'locationid') if item else {}
+    return 200, response_body
+
+
+@router.route('DELETE /locations/{locationid}/resources/{resourceid}')
+def delete_resource(event, metric_payload):
+    metric_payload['operation'] = 'DELETE'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = event['pathParameters']['resourceid']
+    ddbTable.delete_item(
+        Key={'resourceid': event['pathParameters']['resourceid']}
+    )
+    resource_cache.invalidate(event['pathParameters']['resourceid'])
+    if single_table:
+        single_table.delete_item(
+            Key={
+                'PK': f"LOCATION#{event['pathParameters']['locationid']}",
+                'SK': f"RESOURCE#{event['pathParameters']['resourceid']}"
+            }
+        )
+    response_body = {}
+    return 200, response_body
+
+
+@router.route('PUT /locations/{locationid}/resources')
+def put_resource(event, metric_payload):
+    request_json = json.loads(event['body'])
+    request_json['locationid'] = event['pathParameters']['locationid']
+    request_json['timestamp'] = datetime.now().isoformat()
+    if 'resourceid' not in request_json:
+        request_json['resourceid'] = str(uuid.uuid1())
+    metric_payload['operation'] = 'DELETE'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = request_json['resourceid']
+    ddbTable.put_item(
+        Item=request_json
+    )
+    resource_cache.invalidate(request_json['resourceid'])
+    if single_table:
+        single_table.put_item(
+            Item=dict(
+                request_json,
+                PK=f"LOCATION#{request_json['locationid']}",
+                SK=f"RESOURCE#{request_json['resourceid']}"
+            )
+        )
+    response_body = request_json
+    return 200, response_body
 
 
 @metric_scope
 def lambda_handler(event, context, metrics):
     route_key = event['routeKey']
 
-    response_body = {'Message': 'Unsupported route'}
-    status_code = 400
     headers = {'Content-Type': 'application/json'}
 
     # Put common business metrics using EMF
     metric_payload = {}
     metrics.put_dimensions({'Service': 'Resources'})
+    metrics.put_dimensions({'Service': 'Resources', 'RouteKey': route_key})
     metrics.put_metric('ProcessedResources', 1, 'Count')
     metrics.set_property('requestId', event['requestContext']['requestId'])
     metrics.set_property('routeKey', event['routeKey'])
+    router.put_cold_start_metrics(metrics)
 
+    ddb_metrics.reset()
+    started = time.perf_counter()
     try:
-        # Get all resources
-        if route_key == 'GET /locations/{locationid}/resources':
-            metric_payload['operation'] = 'GET'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            ddb_response = ddbTable.query(
-                IndexName='locationidGSI',
-                KeyConditionExpression='locationid = :locationid',
-                ExpressionAttributeValues={
-                    ':locationid': event['pathParameters']['locationid']
-                }
-            )
-            response_body = ddb_response['Items']
-            status_code = 200
-        # Resource CRUD operations
-        if route_key == 'GET /locations/{locationid}/resources/{resourceid}':
-            metric_payload['operation'] = 'GET'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = event['pathParameters']['resourceid']
-            ddb_response = ddbTable.get_item(
-                Key={'resourceid': event['pathParameters']['resourceid']}
-            )
-            if 'Item' in ddb_response:
-                response_body = ddb_response['Item']
-            else:
-                response_body = {}
-            status_code = 200
-        if route_key == 'DELETE /locations/{locationid}/resources/{resourceid}':
-            metric_payload['operation'] = 'DELETE'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = event['pathParameters']['resourceid']
-            ddbTable.delete_item(
-                Key={'resourceid': event['pathParameters']['resourceid']}
-            )
-            response_body = {}
-            status_code = 200
-        if route_key == 'PUT /locations/{locationid}/resources':
-            request_json = json.loads(event['body'])
-            request_json['locationid'] = event['pathParameters']['locationid']
-            request_json['timestamp'] = datetime.now().isoformat()
-            if 'resourceid' not in request_json:
-                request_json['resourceid'] = str(uuid.uuid1())
-            metric_payload['operation'] = 'DELETE'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = request_json['resourceid']
-            ddbTable.put_item(
-                Item=request_json
-            )
-            response_body = request_json
-            status_code = 200
+        status_code, response_body = router.dispatch(route_key, event, metric_payload)
     except Exception as err:
         status_code = 400
         response_body = {'Error:': str(err)}
         print(str(err))
+    metrics.put_metric('Latency', (time.perf_counter() - started) * 1000, 'Milliseconds')
+    ddb_metrics.put_metrics(metrics)
+    resource_cache.put_metrics(metrics)
     metrics.set_property("Payload", metric_payload)
-    return {
+    response = {
         'statusCode': status_code,
-        'body': json.dumps(response_body),
+        'body': response_body if isinstance(response_body, EncodedJSON) else json.dumps(response_body),
         'headers': headers
     }
+    if route_key.startswith('GET '):
+        response = conditional_get(event, response)
+    return compress_response(event, response)
@@ -0,0 +1,48 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Measures handler module import time, the part of Lambda init duration under the application's control,
+# with X-Ray patch_all() as before, with botocore patching only and with tracing disabled.
+# Every sample imports the handler in a fresh interpreter
+# Run from the project root: python -m tests.benchmark.benchmark_cold_start
+import os
+import statistics
+import subprocess
+import sys
+
+ITERATIONS = 10
+HANDLERS = ['locations', 'resources', 'bookings']
+MODES = {
+    'patch_all': ('from aws_xray_sdk.core import patch_all\npatch_all()\n', {'AWS_XRAY_SDK_ENABLED': 'false'}),
+    'botocore': ('', {}),
+    'disabled': ('', {'AWS_XRAY_SDK_ENABLED': 'false'})
+}
+SAMPLE = """import time
+started = time.perf_counter()
+{setup}import src.api.{handler}
+print((time.perf_counter() - started) * 1000)
+"""
+
+
+def run(handler, mode):
+    setup, environment = MODES[mode]
+    env = dict(os.environ, AWS_DEFAULT_REGION='us-east-1', AWS_XRAY_CONTEXT_MISSING='LOG_ERROR', **environment)
+    for table in ['LOCATIONS_TABLE', 'RESOURCES_TABLE', 'BOOKINGS_TABLE']:
+        env.setdefault(table, table.split('_')[0].capitalize())
+    latencies = []
+    for i in range(ITERATIONS):
+        output = subprocess.run([sys.executable, '-c', SAMPLE.format(setup=setup, handler=handler)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        latencies.append(float(output.strip().splitlines()[-1]))
+    return {
+        'p50_ms': round(statistics.median(latencies), 1),
+        'max_ms': round(max(latencies), 1)
+    }
+
+
+if __name__ == '__main__':
+    print(f"{'handler':<12}{'x-ray':<12}{'p50 (ms)':>12}{'max (ms)':>12}")
+    for handler in HANDLERS:
+        for mode in MODES:
+            result = run(handler, mode)
+            print(f"{handler:<12}{mode:<12}{result['p50_ms']:>12}{result['max_ms']:>12}")
@@ -0,0 +1,63 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Compares response body size and compression time of gzip and brotli for list responses of bookings,
+# to find the body size above which compressing a response pays off (COMPRESSION_MIN_SIZE)
+# Run from the project root: python -m tests.benchmark.benchmark_compression
+import gzip
+import json
+import statistics
+import time
+
+from src.api import compression
+
+ITERATIONS = 50
+ITEM_COUNTS = [1, 5, 10, 50, 500, 5000]
+# Time to send one kilobyte to a client on a 10 Mbit/s connection
+TRANSFER_MS_PER_KB = 0.8
+
+
+def generate_body(count):
+    return json.dumps([
+        {
+            'bookingid': f'1f290bf0-9be2-11eb-9326-{i:012d}',
+            'resourceid': 'f8216640-91a2-11eb-8ab9-57aa454facef',
+            'userid': 'bf6dbddc-db2e-4f70-a892-1b165556dede',
+            'timestamp': '2021-03-30T21:57:49.860Z',
+            'starttimeepochtime': 1617278400 + i * 3600
+        }
+        for i in range(count)
+    ]).encode('utf-8')
+
+
+def encoders():
+    yield 'gzip', lambda body: gzip.compress(body, compresslevel=compression.GZIP_LEVEL, mtime=0)
+    if compression.brotli:
+        yield 'br', lambda body: compression.brotli.compress(body, quality=compression.BROTLI_QUALITY)
+
+
+def run(encode, body):
+    latencies = []
+    for i in range(ITERATIONS):
+        start = time.perf_counter()
+        compressed = encode(body)
+        latencies.append((time.perf_counter() - start) * 1000)
+    compress_ms = statistics.median(latencies)
+    saved_ms = (len(body) - len(compressed)) / 1024 * TRANSFER_MS_PER_KB
+    return {
+        'compressed_bytes': len(compressed),
+        'p50_ms': round(compress_ms, 3),
+        'net_ms': round(saved_ms - compress_ms, 3)
+    }
+
+
+if __name__ == '__main__':
+    if not compression.brotli:
+        print('brotli is not installed, only gzip is measured')
+    print(f"{'items':<8}{'body (B)':>10}{'encoding':>10}{'compressed (B)':>16}{'p50 (ms)':>10}{'net saved (ms)':>16}")
+    for count in ITEM_COUNTS:
+        body = generate_body(count)
+        for name, encode in encoders():
+            result = run(encode, body)
+            print(f"{count:<8}{len(body):>10}{name:>10}{result['compressed_bytes']:>16}{result['p50_ms']:>10}"
+                  f"{result['net_ms']:>16}")
@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+from unittest.mock import MagicMock, patch
+
+from src.api.cache import TTLCache
+
+
+def test_least_recently_used_evicted():
+    cache = TTLCache(2, 60)
+    cache.put('a', {'id': 'a'})
+    cache.put('b', {'id': 'b'})
+    assert cache.get('a') == {'id': 'a'}
+    cache.put('c', {'id': 'c'})
+    assert cache.get('b') is None
+    assert cache.get('a') == {'id': 'a'}
+    assert cache.get('c') == {'id': 'c'}
+
+
+def test_expired_and_invalidated():
+    cache = TTLCache(10, 60)
+    with patch('src.api.cache.time.monotonic', return_value=1000):
+        cache.put('a', {'id': 'a'})
+        cache.put('b', {'id': 'b'})
+    with patch('src.api.cache.time.monotonic', return_value=1059):
+        assert cache.get('a') == {'id': 'a'}
+        cache.invalidate('b')
+        assert cache.get('b') is None
+    with patch('src.api.cache.time.monotonic', return_value=1061):
+        assert cache.get('a') is None
+    assert cache.items == {}
+
+
+def test_cache_metrics():
+    cache = TTLCache(10, 60)
+    cache.put('a', {'id': 'a'})
+    cache.get('a')
+    cache.get('a')
+    cache.get('b')
+    metrics = MagicMock()
+    cache.put_metrics(metrics)
+    assert [call[0] for call in metrics.put_metric.call_args_list] == [('CacheHits', 2, 'Count'), ('CacheMisses', 1, 'Count')]
+    # counters start over with every request
+    metrics = MagicMock()
+    cache.put_metrics(metrics)
+    metrics.put_metric.assert_not_called()
@@ -0,0 +1,147 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import json
+
+import os
+import boto3
+from moto import mock_dynamodb
+from unittest.mock import MagicMock, patch
+
+RESOURCES_MOCK_TABLE_NAME = 'Resources'
+BOOKINGS_MOCK_TABLE_NAME = 'Bookings'
+SINGLE_TABLE_MOCK_NAME = 'Single'
+LOCATION_MOCK_VALUE = '6db6cd70-9bd8-11eb-a21c-434bdc25fe66'
+RESOURCE_MOCK_VALUE = 'fe2f4dc0-9be1-11eb-b37e-e5a4dce7e27c'
+ENVIRONMENT = {
+    'RESOURCES_TABLE': RESOURCES_MOCK_TABLE_NAME,
+    'BOOKINGS_TABLE': BOOKINGS_MOCK_TABLE_NAME,
+    'SINGLE_TABLE': SINGLE_TABLE_MOCK_NAME,
+    'AWS_XRAY_CONTEXT_MISSING': 'LOG_ERROR'
+}
+
+
+class MockContext:
+    def __init__(self, remaining_time_in_millis):
+        self.remaining_time_in_millis = remaining_time_in_millis
+        self.invoked_function_arn = 'arn:aws:lambda:us-east-1:123456789012:function:Cascade'
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_time_in_millis
+
+
+def set_up_dynamodb():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    throughput = {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    dynamodb.create_table(
+        TableName=RESOURCES_MOCK_TABLE_NAME,
+        KeySchema=[{'AttributeName': 'resourceid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'resourceid', 'AttributeType': 'S'},
+            {'AttributeName': 'locationid', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'locationidGSI',
+            'KeySchema': [{'AttributeName': 'locationid', 'KeyType': 'HASH'}],
+            'Projection': {'ProjectionType': 'ALL'},
+            'ProvisionedThroughput': throughput
+        }],
+        ProvisionedThroughput=throughput
+    )
+    dynamodb.create_table(
+        TableName=BOOKINGS_MOCK_TABLE_NAME,
+        KeySchema=[{'AttributeName': 'bookingid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'bookingid', 'AttributeType': 'S'},
+            {'AttributeName': 'resourceid', 'AttributeType': 'S'},
+            {'AttributeName': 'starttimeepochtime', 'AttributeType': 'N'}
+        ],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'bookingsByResourceByTimeGSI',
+            'KeySchema': [
+                {'AttributeName': 'resourceid', 'KeyType': 'HASH'},
+                {'AttributeName': 'starttimeepochtime', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'},
+            'ProvisionedThroughput': throughput
+        }],
+        ProvisionedThroughput=throughput
+    )
+    dynamodb.create_table(
+        TableName=SINGLE_TABLE_MOCK_NAME,
+        KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}, {'AttributeName': 'SK', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'PK', 'AttributeType': 'S'}, {'AttributeName': 'SK', 'AttributeType': 'S'}],
+        ProvisionedThroughput=throughput
+    )
+    single_table = dynamodb.Table(SINGLE_TABLE_MOCK_NAME)
+    single_table.put_item(Item={'PK': f'LOCATION#{LOCATION_MOCK_VALUE}', 'SK': 'LOCATION'})
+    for i in range(30):
+        dynamodb.Table(RESOURCES_MOCK_TABLE_NAME).put_item(
+            Item={'resourceid': f'resource-{i}', 'locationid': LOCATION_MOCK_VALUE}
+        )
+        single_table.put_item(Item={'PK': f'LOCATION#{LOCATION_MOCK_VALUE}', 'SK': f'RESOURCE#resource-{i}'})
+        dynamodb.Table(BOOKINGS_MOCK_TABLE_NAME).put_item(
+            Item={'bookingid': f'booking-{i}', 'resourceid': RESOURCE_MOCK_VALUE,
+                  'starttimeepochtime': 1617278400 + i * 3600}
+        )
+        single_table.put_item(
+            Item={'PK': f'LOCATION#{LOCATION_MOCK_VALUE}', 'SK': f'BOOKING#{RESOURCE_MOCK_VALUE}#booking-{i}'}
+        )
+    dynamodb.Table(RESOURCES_MOCK_TABLE_NAME).put_item(
+        Item={'resourceid': 'resource-other', 'locationid': 'location-other'}
+    )
+    dynamodb.Table(BOOKINGS_MOCK_TABLE_NAME).put_item(
+        Item={'bookingid': 'booking-other', 'resourceid': 'resource-other', 'starttimeepochtime': 1617278400}
+    )
+    return dynamodb
+
+
+@mock_dynamodb()
+@patch.dict(os.environ, ENVIRONMENT)
+def test_cascade_delete_location():
+    dynamodb = set_up_dynamodb()
+    from src.api import cascade
+    with open('./events/event-cascade-delete-location.json', 'r') as f:
+        stream_event = json.load(f)
+    ret = cascade.lambda_handler(stream_event, MockContext(60000))
+    assert ret == {'batchItemFailures': []}
+    resources = dynamodb.Table(RESOURCES_MOCK_TABLE_NAME).scan()['Items']
+    assert [item['resourceid'] for item in resources] == ['resource-other']
+    assert dynamodb.Table(SINGLE_TABLE_MOCK_NAME).scan()['Items'] == []
+
+
+@mock_dynamodb()
+@patch.dict(os.environ, ENVIRONMENT)
+def test_cascade_delete_resource():
+    dynamodb = set_up_dynamodb()
+    from src.api import cascade
+    with open('./events/event-cascade-delete-resource.json', 'r') as f:
+        stream_event = json.load(f)
+    ret = cascade.lambda_handler(stream_event, MockContext(60000))
+    assert ret == {'batchItemFailures': []}
+    bookings = dynamodb.Table(BOOKINGS_MOCK_TABLE_NAME).scan()['Items']
+    assert [item['bookingid'] for item in bookings] == ['booking-other']
+    # only the bookings of the resource are removed from the location partition
+    assert len(dynamodb.Table(SINGLE_TABLE_MOCK_NAME).scan()['Items']) == 31
+
+
+@mock_dynamodb()
+@patch.dict(os.environ, ENVIRONMENT)
+def test_cascade_delete_resumes_after_checkpoint():
+    dynamodb = set_up_dynamodb()
+    from src.api import cascade
+    with open('./events/event-cascade-delete-location.json', 'r') as f:
+        stream_event = json.load(f)
+    lambda_client = MagicMock()
+    with patch.object(cascade, 'CASCADE_DELETE_PAGE_SIZE', 10), patch.object(cascade, 'lambda_client', lambda_client):
+        # running out of time, the record continues in a new invocation and is not reported as failed
+        ret = cascade.lambda_handler(stream_event, MockContext(1000))
+        assert ret == {'batchItemFailures': []}
+        assert len(dynamodb.Table(RESOURCES_MOCK_TABLE_NAME).scan()['Items']) == 21
+        lambda_client.invoke.assert_called_once()
+        invoke_args = lambda_client.invoke.call_args.kwargs
+        assert invoke_args['FunctionName'] == 'arn:aws:lambda:us-east-1:123456789012:function:Cascade'
+        assert invoke_args['InvocationType'] == 'Event'
+        # the asynchronous invocation deletes the remaining resources
+        ret = cascade.lambda_handler(json.loads(invoke_args['Payload']), MockContext(60000))
+        assert ret == {'batchItemFailures': []}
+        assert len(dynamodb.Table(RESOURCES_MOCK_TABLE_NAME).scan()['Items']) == 1
@@ -0,0 +1,43 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import base64
+import gzip
+import json
+from unittest.mock import patch
+
+from src.api import compression
+
+BODY = json.dumps([{'locationid': f'location-{i}', 'description': 'Office building'} for i in range(100)])
+
+
+def response(body):
+    return {'statusCode': 200, 'body': body, 'headers': {'Content-Type': 'application/json'}}
+
+
+def event(accept_encoding=None):
+    return {'headers': {'accept-encoding': accept_encoding} if accept_encoding else {}}
+
+
+def test_accepted_encodings():
+    assert compression.accepted_encodings(event('gzip, deflate, br')) == {'gzip', 'deflate', 'br'}
+    assert compression.accepted_encodings(event('br;q=0, gzip;q=0.8')) == {'gzip'}
+    assert compression.accepted_encodings(event()) == set()
+
+
+@patch.object(compression, 'brotli', None)
+def test_compress_response_gzip():
+    ret = compression.compress_response(event('br, gzip'), response(BODY))
+    assert ret['isBase64Encoded']
+    assert ret['headers']['Content-Encoding'] == 'gzip'
+    assert ret['headers']['Vary'] == 'Accept-Encoding'
+    assert gzip.decompress(base64.b64decode(ret['body'])).decode('utf-8') == BODY
+
+
+def test_compress_response_skipped():
+    # small bodies and clients without a supported encoding get the body as is
+    assert compression.compress_response(event('gzip'), response('[]')) == response('[]')
+    ret = compression.compress_response(event('identity'), response(BODY))
+    assert ret['body'] == BODY
+    assert 'isBase64Encoded' not in ret
+    assert 'Content-Encoding' not in ret['headers']
@@ -12,6 +12,9 @@ from contextlib import contextmanager
 from unittest.mock import patch
 
 LOCATIONS_MOCK_TABLE_NAME = 'Locations'
+RESOURCES_MOCK_TABLE_NAME = 'Resources'
+BOOKINGS_MOCK_TABLE_NAME = 'Bookings'
+SINGLE_TABLE_MOCK_NAME = 'Single'
 UUID_MOCK_VALUE = 'f8216640-91a2-11eb-8ab9-57aa454facef'
 
 
@@ -99,7 +102,115 @@ def test_get_list_of_locations():
         ret = locations.lambda_handler(apigw_get_all_locations_event, '')
         assert ret['statusCode'] == 200
         data = json.loads(ret['body'])
-        assert data == expected_response
+        assert data == {'items': expected_response}
+
+
+def test_get_list_of_locations_fast_json():
+    with setup_test_environment():
+        from src.api import locations
+        with open('./events/event-get-all-locations.json', 'r') as f:
+            apigw_event = json.load(f)
+        expected = locations.lambda_handler(apigw_event, '')
+        with patch.object(locations, 'FAST_JSON_RESPONSES', True), \
+                patch.object(locations, 'ddb_client', boto3.client('dynamodb', region_name='us-east-1')):
+            ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert json.loads(ret['body']) == json.loads(expected['body'])
+        # pages of the fast path have the same tokens
+        apigw_event['queryStringParameters'] = {'limit': '1'}
+        expected = locations.lambda_handler(apigw_event, '')
+        with patch.object(locations, 'FAST_JSON_RESPONSES', True), \
+                patch.object(locations, 'ddb_client', boto3.client('dynamodb', region_name='us-east-1')):
+            ret = locations.lambda_handler(apigw_event, '')
+            assert json.loads(ret['body']) == json.loads(expected['body'])
+            apigw_event['queryStringParameters']['nextToken'] = json.loads(ret['body'])['nextToken']
+            ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert len(json.loads(ret['body'])['items']) == 1
+
+
+def test_get_list_of_locations_paginated():
+    with setup_test_environment():
+        from src.api import locations
+        with open('./events/event-get-all-locations.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'limit': '1'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        first_page = json.loads(ret['body'])
+        assert len(first_page['items']) == 1
+        assert 'nextToken' in first_page
+        # without a limit the first page has the default size
+        with patch.object(locations, 'DEFAULT_PAGE_SIZE', 1):
+            apigw_event['queryStringParameters'] = None
+            ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        first_page = json.loads(ret['body'])
+        assert len(first_page['items']) == 1
+        assert 'nextToken' in first_page
+        apigw_event['queryStringParameters'] = {'limit': '1', 'nextToken': first_page['nextToken']}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        second_page = json.loads(ret['body'])
+        assert len(second_page['items']) == 1
+        assert second_page['items'][0]['locationid'] != first_page['items'][0]['locationid']
+        apigw_event['queryStringParameters'] = {'nextToken': 'not-a-token'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
+
+def test_export_locations():
+    with setup_test_environment():
+        from src.api import locations
+        with open('./events/event-get-all-locations.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'export': 'true'}
+        apigw_event['requestContext']['authorizer'] = {'lambda': {'isAdmin': 'false'}}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 403
+        apigw_event['requestContext']['authorizer'] = {'lambda': {'isAdmin': 'true'}}
+        with patch.object(locations, 'EXPORT_SCAN_SEGMENTS', 1):
+            apigw_event['queryStringParameters'] = {'export': 'true', 'limit': '1'}
+            ret = locations.lambda_handler(apigw_event, '')
+            assert ret['statusCode'] == 200
+            data = json.loads(ret['body'])
+            assert len(data['items']) == 1
+            exported = data['items']
+            # follow the export tokens until every segment is finished
+            while 'nextToken' in data:
+                apigw_event['queryStringParameters'] = {'export': 'true', 'limit': '1', 'nextToken': data['nextToken']}
+                ret = locations.lambda_handler(apigw_event, '')
+                assert ret['statusCode'] == 200
+                data = json.loads(ret['body'])
+                exported.extend(data['items'])
+        assert sorted(item['locationid'] for item in exported) == [
+            '31a9f940-917b-11eb-9054-67837e2c40b0',
+            'f8216640-91a2-11eb-8ab9-57aa454facef'
+        ]
+        apigw_event['queryStringParameters'] = {'export': 'true', 'nextToken': 'not-a-token'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
+def test_get_locations_by_ids():
+    with setup_test_environment():
+        from src.api import locations
+        with open('./events/event-get-all-locations.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {
+            'ids': '31a9f940-917b-11eb-9054-67837e2c40b0, f8216640-91a2-11eb-8ab9-57aa454facef,31a9f940-917b-11eb-9054-67837e2c40b0'
+        }
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert [item['locationid'] for item in data['items']] == [
+            '31a9f940-917b-11eb-9054-67837e2c40b0',
+            'f8216640-91a2-11eb-8ab9-57aa454facef'
+        ]
+        assert data['items'][0]['name'] == 'Encore'
+        apigw_event['queryStringParameters'] = {'ids': ','}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
 
 
 def test_get_single_location():
@@ -130,6 +241,174 @@ def test_get_single_location_wrong_id():
         assert ret['statusCode'] == 200
         assert json.loads(ret['body']) == {}
 
+def test_get_single_location_not_modified():
+    with setup_test_environment():
+        from src.api import locations
+        with open('./events/event-get-location-by-id.json', 'r') as f:
+            apigw_event = json.load(f)
+        ret = locations.lambda_handler(apigw_event, '')
+        etag = ret['headers']['ETag']
+        assert etag.startswith('W/"')
+        # the same content gets the same tag, clients holding it get no body
+        apigw_event['headers'] = {'if-none-match': etag}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 304
+        assert ret['body'] == ''
+        assert ret['headers']['ETag'] == etag
+        apigw_event['headers'] = {'if-none-match': 'W/"outdated", ' + etag}
+        assert locations.lambda_handler(apigw_event, '')['statusCode'] == 304
+        apigw_event['headers'] = {'if-none-match': 'W/"outdated"'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert ret['headers']['ETag'] == etag
+
+
+def test_get_single_location_cached():
+    with setup_test_environment():
+        from src.api import locations
+        locations.location_cache.items.clear()
+        with open('./events/event-get-location-by-id.json', 'r') as f:
+            apigw_event = json.load(f)
+        with open('./events/event-put-location.json', 'r') as f:
+            put_event = json.load(f)
+        assert json.loads(locations.lambda_handler(apigw_event, '')['body'])['description'] == 'Las Vegas'
+        # changes made by other execution environments are seen once the cached item expires
+        boto3.resource('dynamodb', region_name='us-east-1').Table(LOCATIONS_MOCK_TABLE_NAME).update_item(
+            Key={'locationid': UUID_MOCK_VALUE},
+            UpdateExpression='SET description = :description',
+            ExpressionAttributeValues={':description': 'Macau'}
+        )
+        assert json.loads(locations.lambda_handler(apigw_event, '')['body'])['description'] == 'Las Vegas'
+        ret = locations.lambda_handler(dict(apigw_event, queryStringParameters={'fields': 'name'}), '')
+        assert json.loads(ret['body']) == {'locationid': UUID_MOCK_VALUE, 'name': 'The Venetian'}
+        # writes through this execution environment invalidate the cached item
+        put_event['body'] = json.dumps({'locationid': UUID_MOCK_VALUE, 'description': 'Macau', 'name': 'The Venetian'})
+        locations.lambda_handler(put_event, '')
+        assert json.loads(locations.lambda_handler(apigw_event, '')['body'])['description'] == 'Macau'
+
+
+def test_get_locations_sparse_fields():
+    with setup_test_environment():
+        from src.api import locations
+        with open('./events/event-get-all-locations.json', 'r') as f:
+            apigw_event = json.load(f)
+        # name and timestamp are DynamoDB reserved words
+        apigw_event['queryStringParameters'] = {'fields': 'name,timestamp'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = sorted(json.loads(ret['body'])['items'], key=lambda item: item['name'])
+        assert data == [
+            {'locationid': '31a9f940-917b-11eb-9054-67837e2c40b0', 'name': 'Encore', 'timestamp': '2021-03-30T17:13:06.516Z'},
+            {'locationid': 'f8216640-91a2-11eb-8ab9-57aa454facef', 'name': 'The Venetian', 'timestamp': '2021-03-30T21:57:49.860Z'}
+        ]
+        apigw_event['queryStringParameters'] = {'fields': 'name', 'limit': '1'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert [sorted(item.keys()) for item in json.loads(ret['body'])['items']] == [['locationid', 'name']]
+        with open('./events/event-get-location-by-id.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'fields': 'description'}
+        ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert sorted(json.loads(ret['body']).keys()) == ['description', 'locationid']
+
+def set_up_single_table_dynamodb():
+    return boto3.resource('dynamodb').create_table(
+        TableName=SINGLE_TABLE_MOCK_NAME,
+        KeySchema=[
+            {'AttributeName': 'PK', 'KeyType': 'HASH'},
+            {'AttributeName': 'SK', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'PK', 'AttributeType': 'S'},
+            {'AttributeName': 'SK', 'AttributeType': 'S'}
+        ],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+
+
+def test_get_location_expand_single_table():
+    with setup_test_environment():
+        from src.api import locations
+        single_table = set_up_single_table_dynamodb()
+        with patch.object(locations, 'single_table', single_table):
+            # location writes are mirrored to the single table
+            with open('./events/event-put-location.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['body'] = json.dumps({'locationid': 'location-1', 'name': 'The Venetian'})
+            locations.lambda_handler(apigw_event, '')
+            single_table.put_item(Item={'PK': 'LOCATION#location-1', 'SK': 'RESOURCE#resource-1', 'resourceid': 'resource-1'})
+            single_table.put_item(Item={'PK': 'LOCATION#location-1', 'SK': 'BOOKING#resource-1#booking-1',
+                                        'bookingid': 'booking-1', 'resourceid': 'resource-1', 'starttimeepochtime': 1617278400})
+            with open('./events/event-get-location-by-id.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['pathParameters']['locationid'] = 'location-1'
+            apigw_event['queryStringParameters'] = {'expand': 'resources'}
+            with patch.object(single_table, 'query', wraps=single_table.query) as mock_query:
+                ret = locations.lambda_handler(apigw_event, '')
+                assert mock_query.call_count == 1
+            assert ret['statusCode'] == 200
+            data = json.loads(ret['body'])
+            assert data['name'] == 'The Venetian'
+            assert data['resources'] == [{'resourceid': 'resource-1'}]
+            assert 'bookings' not in data
+            apigw_event['queryStringParameters'] = {'expand': 'resources,bookings'}
+            ret = locations.lambda_handler(apigw_event, '')
+            data = json.loads(ret['body'])
+            assert data['bookings'] == [{'bookingid': 'booking-1', 'resourceid': 'resource-1', 'starttimeepochtime': 1617278400}]
+            apigw_event['queryStringParameters'] = {'expand': 'users'}
+            ret = locations.lambda_handler(apigw_event, '')
+            assert ret['statusCode'] == 400
+            # deletes are mirrored as well
+            with open('./events/event-delete-location.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['pathParameters']['locationid'] = 'location-1'
+            locations.lambda_handler(apigw_event, '')
+            assert 'Item' not in single_table.get_item(Key={'PK': 'LOCATION#location-1', 'SK': 'LOCATION'})
+
+
+def test_get_location_expand_multiple_tables():
+    with setup_test_environment():
+        from src.api import locations
+        dynamodb = boto3.resource('dynamodb')
+        for table_name, key, index_key in [(RESOURCES_MOCK_TABLE_NAME, 'resourceid', 'locationid'),
+                                           (BOOKINGS_MOCK_TABLE_NAME, 'bookingid', 'resourceid')]:
+            dynamodb.create_table(
+                TableName=table_name,
+                KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+                AttributeDefinitions=[
+                    {'AttributeName': key, 'AttributeType': 'S'},
+                    {'AttributeName': index_key, 'AttributeType': 'S'}
+                ],
+                GlobalSecondaryIndexes=[
+                    {
+                        'IndexName': 'locationidGSI' if index_key == 'locationid' else 'bookingsByResourceByTimeGSI',
+                        'KeySchema': [{'AttributeName': index_key, 'KeyType': 'HASH'}],
+                        'Projection': {'ProjectionType': 'ALL'},
+                        'ProvisionedThroughput': {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+                    }
+                ],
+                ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+            )
+        dynamodb.Table(RESOURCES_MOCK_TABLE_NAME).put_item(
+            Item={'resourceid': 'resource-1', 'locationid': 'f8216640-91a2-11eb-8ab9-57aa454facef'}
+        )
+        dynamodb.Table(BOOKINGS_MOCK_TABLE_NAME).put_item(
+            Item={'bookingid': 'booking-1', 'resourceid': 'resource-1', 'starttimeepochtime': 1617278400}
+        )
+        with open('./events/event-get-location-by-id.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'expand': 'bookings'}
+        with patch.object(locations, 'RESOURCES_TABLE', RESOURCES_MOCK_TABLE_NAME), \
+                patch.object(locations, 'BOOKINGS_TABLE', BOOKINGS_MOCK_TABLE_NAME):
+            ret = locations.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert data['name'] == 'The Venetian'
+        assert 'resources' not in data
+        assert data['bookings'] == [{'bookingid': 'booking-1', 'resourceid': 'resource-1', 'starttimeepochtime': 1617278400}]
+
+
+
 
 @patch('uuid.uuid1', mock_uuid)
 @pytest.mark.freeze_time('2001-01-01')
@@ -0,0 +1,53 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import boto3
+from moto import mock_dynamodb
+
+from src.migration import migrate_to_single_table
+
+TABLE_KEYS = {
+    'Locations': 'locationid',
+    'Resources': 'resourceid',
+    'Bookings': 'bookingid'
+}
+
+
+def set_up_dynamodb():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    for table_name, key in TABLE_KEYS.items():
+        dynamodb.create_table(
+            TableName=table_name,
+            KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+            AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'}],
+            ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+        )
+    dynamodb.create_table(
+        TableName='Single',
+        KeySchema=[{'AttributeName': 'PK', 'KeyType': 'HASH'}, {'AttributeName': 'SK', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'PK', 'AttributeType': 'S'}, {'AttributeName': 'SK', 'AttributeType': 'S'}],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+    dynamodb.Table('Locations').put_item(Item={'locationid': 'location-1', 'name': 'The Venetian'})
+    for i in range(30):
+        dynamodb.Table('Resources').put_item(Item={'resourceid': f'resource-{i}', 'locationid': 'location-1'})
+        dynamodb.Table('Bookings').put_item(
+            Item={'bookingid': f'booking-{i}', 'resourceid': f'resource-{i}', 'starttimeepochtime': 1617278400}
+        )
+    dynamodb.Table('Bookings').put_item(Item={'bookingid': 'booking-orphan', 'resourceid': 'unknown-resource'})
+    return dynamodb
+
+
+@mock_dynamodb()
+def test_migrate_to_single_table():
+    dynamodb = set_up_dynamodb()
+    result = migrate_to_single_table.migrate('Locations', 'Resources', 'Bookings', 'Single', total_segments=1)
+    assert result == {'locations': 1, 'resources': 30, 'bookings': 30, 'skippedBookings': 1}
+    items = dynamodb.Table('Single').query(
+        KeyConditionExpression='PK = :pk',
+        ExpressionAttributeValues={':pk': 'LOCATION#location-1'}
+    )['Items']
+    assert len(items) == 61
+    assert items[0]['SK'].startswith('BOOKING#')
+    assert {'PK': 'LOCATION#location-1', 'SK': 'LOCATION', 'locationid': 'location-1', 'name': 'The Venetian'} in items
+    assert {'PK': 'LOCATION#location-1', 'SK': 'RESOURCE#resource-7', 'resourceid': 'resource-7', 'locationid': 'location-1'} in items
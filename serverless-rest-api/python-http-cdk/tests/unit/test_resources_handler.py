@@ -128,6 +128,51 @@ def test_get_resources_by_location():
         data = json.loads(ret['body'])
         assert data == expected_response
 
+def test_get_resources_by_location_fast_json():
+    with setup_test_environment():
+        from src.api import resources
+        with open('./events/event-get-resources-by-location.json', 'r') as f:
+            apigw_event = json.load(f)
+        expected = resources.lambda_handler(apigw_event, '')
+        with patch.object(resources, 'FAST_JSON_RESPONSES', True), \
+                patch.object(resources, 'ddb_client', boto3.client('dynamodb', region_name='us-east-1')):
+            ret = resources.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert json.loads(ret['body']) == json.loads(expected['body'])
+
+
+def test_get_resources_by_ids():
+    with setup_test_environment():
+        from src.api import resources
+        with open('./events/event-get-resources-by-location.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {
+            'ids': '246396e0-9308-11eb-87e3-8f538c287bfc,123456789,86f0b180-9be1-11eb-a305-35487c0301a7',
+            'fields': 'name'
+        }
+        ret = resources.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert data == {
+            'items': [
+                {
+                    'locationid': '6db6cd70-9bd8-11eb-a21c-434bdc25fe66',
+                    'resourceid': '246396e0-9308-11eb-87e3-8f538c287bfc',
+                    'name': 'Toscana 3606, Room'
+                },
+                {
+                    'locationid': '6db6cd70-9bd8-11eb-a21c-434bdc25fe66',
+                    'resourceid': '86f0b180-9be1-11eb-a305-35487c0301a7',
+                    'name': 'Titian 2205'
+                }
+            ]
+        }
+        # resources of other locations are not returned
+        apigw_event['pathParameters']['locationid'] = '123456789'
+        ret = resources.lambda_handler(apigw_event, '')
+        assert json.loads(ret['body']) == {'items': []}
+
+
 
 def test_get_single_resource():
     with setup_test_environment():
@@ -160,6 +205,27 @@ def test_get_single_resource_wrong_id():
         data = json.loads(ret['body'])
         assert data == expected_response
 
+def test_get_resources_sparse_fields():
+    with setup_test_environment():
+        from src.api import resources
+        with open('./events/event-get-resources-by-location.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'fields': 'name'}
+        ret = resources.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert [sorted(item.keys()) for item in json.loads(ret['body'])] == [['locationid', 'name', 'resourceid']] * 2
+        with open('./events/event-get-resource-by-id.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'fields': 'type'}
+        ret = resources.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert json.loads(ret['body']) == {
+            'locationid': '6db6cd70-9bd8-11eb-a21c-434bdc25fe66',
+            'resourceid': '86f0b180-9be1-11eb-a305-35487c0301a7',
+            'type': 'room'
+        }
+
+
 
 @patch('uuid.uuid1', mock_uuid)
 @pytest.mark.freeze_time('2001-01-01')
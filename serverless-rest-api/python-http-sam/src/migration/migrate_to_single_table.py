@@ -0,0 +1,117 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Copies locations, resources and bookings tables into the single-table layout.
+# Items of a location, its resources and bookings share the LOCATION#<locationid> partition key,
+# sort keys are LOCATION, RESOURCE#<resourceid> and BOOKING#<resourceid>#<bookingid>.
+# Run from the project root:
+#   python -m src.migration.migrate_to_single_table --locations-table <name> --resources-table <name> \
+#       --bookings-table <name> --single-table <name>
+import argparse
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_SCAN_SEGMENTS = 4
+
+
+def scan_segment_pages(client, table_name, segment, total_segments, **scan_args):
+    # Yield the items of one scan segment a page at a time
+    scan_args.update(TableName=table_name, Segment=segment, TotalSegments=total_segments)
+    while True:
+        ddb_response = client.scan(**scan_args)
+        yield ddb_response['Items']
+        if 'LastEvaluatedKey' not in ddb_response:
+            return
+        scan_args['ExclusiveStartKey'] = ddb_response['LastEvaluatedKey']
+
+
+def read_resource_locationids(client, resources_table, total_segments):
+    # Bookings are placed in the partition of their resource location, read only the keys needed for that
+    def read_segment(segment):
+        locationids = {}
+        for items in scan_segment_pages(client, resources_table, segment, total_segments,
+                                        ProjectionExpression='resourceid, locationid'):
+            locationids.update((item['resourceid'], item['locationid']) for item in items)
+        return locationids
+
+    locationids = {}
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        for segment_locationids in executor.map(read_segment, range(total_segments)):
+            locationids.update(segment_locationids)
+    return locationids
+
+
+def location_item(location, locationids):
+    return dict(location, PK=f"LOCATION#{location['locationid']}", SK='LOCATION')
+
+
+def resource_item(resource, locationids):
+    return dict(resource, PK=f"LOCATION#{resource['locationid']}", SK=f"RESOURCE#{resource['resourceid']}")
+
+
+def booking_item(booking, locationids):
+    # Bookings for unknown resources can't be placed, returns None for them
+    locationid = locationids.get(booking.get('resourceid'))
+    if locationid is None:
+        return None
+    return dict(
+        booking,
+        PK=f"LOCATION#{locationid}",
+        SK=f"BOOKING#{booking['resourceid']}#{booking['bookingid']}"
+    )
+
+
+def copy_segment(table_name, single_table, to_item, locationids, segment, total_segments):
+    # Scanned pages are written as they arrive, every worker has its own single table object and batch writer.
+    # Returns the number of copied and skipped items
+    copied = 0
+    skipped = 0
+    # batch writer sends BatchWriteItem requests of 25 items and resends unprocessed items
+    with single_table.batch_writer() as batch:
+        for items in scan_segment_pages(single_table.meta.client, table_name, segment, total_segments):
+            for item in items:
+                single_table_item = to_item(item, locationids)
+                if single_table_item is None:
+                    skipped += 1
+                    continue
+                batch.put_item(Item=single_table_item)
+                copied += 1
+    return copied, skipped
+
+
+def copy_table(dynamodb, table_name, single_table, to_item, locationids, total_segments):
+    # Resources aren't thread safe, the table objects are created here and share the thread safe client
+    single_tables = [dynamodb.Table(single_table) for _ in range(total_segments)]
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        counts = list(executor.map(
+            lambda segment: copy_segment(table_name, single_tables[segment], to_item, locationids,
+                                         segment, total_segments),
+            range(total_segments)
+        ))
+    return sum(copied for copied, _ in counts), sum(skipped for _, skipped in counts)
+
+
+def migrate(locations_table, resources_table, bookings_table, single_table, total_segments=DEFAULT_SCAN_SEGMENTS):
+    dynamodb = boto3.resource('dynamodb')
+    locationids = read_resource_locationids(dynamodb.meta.client, resources_table, total_segments)
+    locations, _ = copy_table(dynamodb, locations_table, single_table, location_item, locationids, total_segments)
+    resources, _ = copy_table(dynamodb, resources_table, single_table, resource_item, locationids, total_segments)
+    bookings, skipped = copy_table(dynamodb, bookings_table, single_table, booking_item, locationids, total_segments)
+    return {
+        'locations': locations,
+        'resources': resources,
+        'bookings': bookings,
+        'skippedBookings': skipped
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copy existing tables into the single-table layout')
+    parser.add_argument('--locations-table', required=True)
+    parser.add_argument('--resources-table', required=True)
+    parser.add_argument('--bookings-table', required=True)
+    parser.add_argument('--single-table', required=True)
+    parser.add_argument('--segments', type=int, default=DEFAULT_SCAN_SEGMENTS,
+                        help='number of parallel scan segments per table')
+    args = parser.parse_args()
+    print(migrate(args.locations_table, args.resources_table, args.bookings_table, args.single_table, args.segments))
@@ -0,0 +1,88 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Compares Lambda authorizer latency and response payload size for IAM policy and simple responses
+# Run from the project root: python -m tests.benchmark.benchmark_authorizer
+import contextlib
+import io
+import json
+import statistics
+import time
+from unittest.mock import MagicMock, patch
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from src.api import authorizer
+
+ITERATIONS = 1000
+APP_CLIENT_ID = 'benchmark-client-id'
+USER_ID = 'bf6dbddc-db2e-4f70-a892-1b165556dede'
+KID = 'benchmark-kid'
+
+private_key_pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+    encoding=serialization.Encoding.PEM,
+    format=serialization.PrivateFormat.PKCS8,
+    encryption_algorithm=serialization.NoEncryption()
+)
+public_jwk = dict(jwk.construct(private_key_pem, 'RS256').public_key().to_dict(), kid=KID, alg='RS256')
+jwks_response = MagicMock(status=200, data=json.dumps({'keys': [public_jwk]}).encode('utf-8'))
+
+
+def generate_token():
+    claims = {'sub': USER_ID, 'aud': APP_CLIENT_ID, 'exp': int(time.time()) + 3600}
+    return jwt.encode(claims, private_key_pem, algorithm='RS256', headers={'kid': KID})
+
+
+def generate_event(response_mode, token):
+    if response_mode == 'simple':
+        return {
+            'version': '2.0',
+            'type': 'REQUEST',
+            'routeArn': 'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/$default/GET/users/' + USER_ID + '/bookings',
+            'identitySource': [token],
+            'routeKey': 'GET /users/{userid}/bookings',
+            'headers': {'authorization': token},
+            'pathParameters': {'userid': USER_ID}
+        }
+    return {
+        'version': '1.0',
+        'type': 'REQUEST',
+        'methodArn': 'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/$default/GET/users/' + USER_ID + '/bookings',
+        'authorizationToken': token
+    }
+
+
+def run(response_mode, cached_tokens):
+    latencies = []
+    token = generate_token()
+    with patch.object(authorizer, 'response_mode', response_mode), \
+            patch.object(authorizer, 'app_client_id', APP_CLIENT_ID), \
+            patch.object(authorizer.http, 'request', return_value=jwks_response), \
+            contextlib.redirect_stdout(io.StringIO()):
+        authorizer.keys_fetched_at = 0
+        for i in range(ITERATIONS):
+            if not cached_tokens:
+                authorizer.verified_tokens.clear()
+            event = generate_event(response_mode, token)
+            start = time.perf_counter()
+            response = authorizer.lambda_handler(event, None)
+            latencies.append((time.perf_counter() - start) * 1000000)
+    latencies.sort()
+    return {
+        'mode': response_mode,
+        'token_cache': 'warm' if cached_tokens else 'cold',
+        'p50_us': round(statistics.median(latencies), 1),
+        'p99_us': round(latencies[int(len(latencies) * 0.99) - 1], 1),
+        'mean_us': round(statistics.mean(latencies), 1),
+        'payload_bytes': len(json.dumps(response))
+    }
+
+
+if __name__ == '__main__':
+    print(f"{'mode':<8}{'tokens':<8}{'p50 (us)':>12}{'p99 (us)':>12}{'mean (us)':>12}{'payload (B)':>14}")
+    for cached_tokens in [False, True]:
+        for response_mode in ['policy', 'simple']:
+            result = run(response_mode, cached_tokens)
+            print(f"{result['mode']:<8}{result['token_cache']:<8}{result['p50_us']:>12}{result['p99_us']:>12}"
+                  f"{result['mean_us']:>12}{result['payload_bytes']:>14}")
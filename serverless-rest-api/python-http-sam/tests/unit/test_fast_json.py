@@ -0,0 +1,35 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import decimal
+import json
+
+from src.api.fast_json import decimal_default_json, encode_item, encode_page
+
+
+def test_encode_item():
+    item = {
+        'name': {'S': 'Caf\u00e9 "Central"'},
+        'capacity': {'N': '12.5'},
+        'open': {'BOOL': True},
+        'manager': {'NULL': True},
+        'floors': {'L': [{'N': '1'}, {'M': {'rooms': {'SS': ['a', 'b']}}}]},
+        'badge': {'B': b'\x00\x01'}
+    }
+    assert json.loads(encode_item(item)) == {
+        'name': 'Caf\u00e9 "Central"',
+        'capacity': 12.5,
+        'open': True,
+        'manager': None,
+        'floors': [1, {'rooms': ['a', 'b']}],
+        'badge': 'AAE='
+    }
+
+
+def test_decimal_default_json():
+    assert json.dumps({'price': decimal.Decimal('12.5')}, default=decimal_default_json) == '{"price": 12.5}'
+
+
+def test_encode_page():
+    assert json.loads(encode_page('[{"id":"a"}]')) == {'items': [{'id': 'a'}]}
+    assert json.loads(encode_page('[]', 'eyJpZCI6ICJhIn0=')) == {'items': [], 'nextToken': 'eyJpZCI6ICJhIn0='}
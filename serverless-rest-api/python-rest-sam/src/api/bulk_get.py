@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Bulk get of the list routes, the ids query parameter lists the items to read with BatchGetItem
+import random
+import time
+
+# Bulk get limits, BatchGetItem accepts up to 100 keys per call
+MAX_BULK_GET_IDS = 500
+BATCH_GET_SIZE = 100
+BATCH_GET_MAX_RETRIES = 5
+BATCH_GET_BACKOFF_SECONDS = 0.05
+
+
+def get_ids(query_parameters):
+    # BatchGetItem rejects requests with duplicate keys, remove them keeping the requested order
+    ids = list(dict.fromkeys(i.strip() for i in query_parameters['ids'].split(',') if i.strip()))
+    if not ids or len(ids) > MAX_BULK_GET_IDS:
+        raise ValueError(f'ids must be a comma separated list of 1 to {MAX_BULK_GET_IDS} ids')
+    return ids
+
+
+def batch_get_items(dynamodb, table_name, key_attribute, ids, projection):
+    # Read items in chunks, retry unprocessed keys with exponential backoff and jitter.
+    # Returns items found in the requested order and the ids that could not be read
+    items = {}
+    unprocessed_ids = []
+    for i in range(0, len(ids), BATCH_GET_SIZE):
+        keys = [{key_attribute: item_id} for item_id in ids[i:i + BATCH_GET_SIZE]]
+        for attempt in range(BATCH_GET_MAX_RETRIES + 1):
+            ddb_response = dynamodb.batch_get_item(RequestItems={table_name: dict(projection, Keys=keys)})
+            for item in ddb_response['Responses'].get(table_name, []):
+                items[item[key_attribute]] = item
+            keys = ddb_response.get('UnprocessedKeys', {}).get(table_name, {}).get('Keys', [])
+            if not keys or attempt == BATCH_GET_MAX_RETRIES:
+                break
+            time.sleep(BATCH_GET_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1))
+        unprocessed_ids.extend(key[key_attribute] for key in keys)
+    return [items[item_id] for item_id in ids if item_id in items], unprocessed_ids
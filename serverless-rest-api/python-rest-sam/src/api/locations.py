@@ -2,100 +2,380 @@
 # SPDX-License-Identifier: MIT-0
 
 # Implementation of the API backend for locations
+import time
+
+# Module initialization time is measured from here, see Router.put_cold_start_metrics
+init_started = time.perf_counter()
+
+import base64
 import json
 import uuid
 import os
 import boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from aws_embedded_metrics import metric_scope
 
+# Handlers are imported from the src.api package or as top-level modules, depending on the deployment
+try:
+    from .bulk_get import batch_get_items, get_ids
+    from .cache import TTLCache
+    from .etag import conditional_get
+    from .fast_json import EncodedJSON, decimal_default_json, encode_page, scan_json
+    from .fields import get_projection, project_item
+    from .router import DynamoDBMetrics, Router, patch_libraries
+except ImportError:
+    from bulk_get import batch_get_items, get_ids
+    from cache import TTLCache
+    from etag import conditional_get
+    from fast_json import EncodedJSON, decimal_default_json, encode_page, scan_json
+    from fields import get_projection, project_item
+    from router import DynamoDBMetrics, Router, patch_libraries
+
 # Patch libraries to instrument downstream calls
-# See https://docs.aws.amazon.com/xray/latest/devguide/xray-sdk-python-patching.html for more details
-from aws_xray_sdk.core import patch_all
-patch_all()
+patch_libraries()
+router = Router(init_started)
 
 # Prepare DynamoDB client
 LOCATIONS_TABLE = os.getenv('LOCATIONS_TABLE', None)
 dynamodb = boto3.resource('dynamodb')
 ddbTable = dynamodb.Table(LOCATIONS_TABLE)
+RESOURCES_TABLE = os.getenv('RESOURCES_TABLE', None)
+BOOKINGS_TABLE = os.getenv('BOOKINGS_TABLE', None)
+# Optional single-table layout, a location, its resources and bookings share the partition key
+SINGLE_TABLE = os.getenv('SINGLE_TABLE') or None
+single_table = dynamodb.Table(SINGLE_TABLE) if SINGLE_TABLE else None
+# Optional fast path for list responses, the low-level client returns items in DynamoDB JSON
+# that is encoded to the response directly instead of being deserialized to Python types first
+FAST_JSON_RESPONSES = os.getenv('FAST_JSON_RESPONSES', 'false') == 'true'
+ddb_client = boto3.client('dynamodb') if FAST_JSON_RESPONSES else None
+# Measure the DynamoDB calls of every request
+ddb_metrics = DynamoDBMetrics()
+ddb_metrics.instrument(dynamodb.meta.client)
+if ddb_client:
+    ddb_metrics.instrument(ddb_client)
+
+# Page size limits for the list route
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+# Number of parallel scan segments used by the export mode
+EXPORT_SCAN_SEGMENTS = int(os.getenv('EXPORT_SCAN_SEGMENTS', '4'))
+# Related items returned by the expand query parameter of the single location route
+EXPAND_OPTIONS = ['resources', 'bookings']
+EXPAND_QUERY_WORKERS = 10
+# Read-through cache of single location lookups, writes of this execution environment invalidate it
+CACHE_MAX_ITEMS = int(os.getenv('CACHE_MAX_ITEMS', '1000'))
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '60'))
+location_cache = TTLCache(CACHE_MAX_ITEMS, CACHE_TTL_SECONDS)
+
+
+# Pagination tokens are opaque to the clients, they are base64 encoded DynamoDB LastEvaluatedKey values
+def encode_next_token(last_evaluated_key):
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode('utf-8')).decode('utf-8')
+
+
+def decode_next_token(next_token):
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(next_token.encode('utf-8')))
+    except ValueError:
+        raise ValueError('Invalid nextToken')
+    if not isinstance(start_key, dict) or list(start_key.keys()) != ['locationid']:
+        raise ValueError('Invalid nextToken')
+    return start_key
+
+
+def get_page_size(query_parameters):
+    try:
+        limit = int(query_parameters.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def scan_page(query_parameters, projection):
+    # Return a single page, of the default size if no limit is given, and a token to get the next one
+    scan_args = dict(projection, Limit=get_page_size(query_parameters))
+    if query_parameters.get('nextToken'):
+        scan_args['ExclusiveStartKey'] = decode_next_token(query_parameters['nextToken'])
+    if FAST_JSON_RESPONSES:
+        items_json, last_evaluated_key = scan_json(ddb_client, LOCATIONS_TABLE, **scan_args)
+        return encode_page(items_json, encode_next_token(last_evaluated_key) if last_evaluated_key else None)
+    ddb_response = ddbTable.scan(**scan_args)
+    page = {'items': ddb_response['Items']}
+    if 'LastEvaluatedKey' in ddb_response:
+        page['nextToken'] = encode_next_token(ddb_response['LastEvaluatedKey'])
+    return page
+
+
+def decode_export_token(next_token):
+    # Export tokens carry the number of scan segments and where every unfinished segment stopped
+    try:
+        token = json.loads(base64.urlsafe_b64decode(next_token.encode('utf-8')))
+        total_segments = token['segments']
+        start_keys = {int(segment): start_key for segment, start_key in token['startKeys'].items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValueError('Invalid nextToken')
+    if not isinstance(total_segments, int) or not start_keys or any(
+            not 0 <= segment < total_segments
+            or not isinstance(start_key, dict) or list(start_key.keys()) != ['locationid']
+            for segment, start_key in start_keys.items()):
+        raise ValueError('Invalid nextToken')
+    return total_segments, start_keys
+
+
+def scan_segment_page(segment, total_segments, start_key, projection, limit):
+    # Resources aren't thread safe, use the underlying client in worker threads
+    scan_args = dict(projection, TableName=LOCATIONS_TABLE, Segment=segment, TotalSegments=total_segments, Limit=limit)
+    if start_key:
+        scan_args['ExclusiveStartKey'] = start_key
+    ddb_response = dynamodb.meta.client.scan(**scan_args)
+    return ddb_response['Items'], ddb_response.get('LastEvaluatedKey')
+
+
+def export_page(query_parameters, projection):
+    # Scan one page of every unfinished segment in parallel, up to limit items per segment
+    if query_parameters.get('nextToken'):
+        total_segments, start_keys = decode_export_token(query_parameters['nextToken'])
+    else:
+        total_segments, start_keys = EXPORT_SCAN_SEGMENTS, dict.fromkeys(range(EXPORT_SCAN_SEGMENTS))
+    limit = get_page_size(query_parameters)
+    items = []
+    next_start_keys = {}
+    with ThreadPoolExecutor(max_workers=len(start_keys)) as executor:
+        futures = {
+            segment: executor.submit(scan_segment_page, segment, total_segments, start_key, projection, limit)
+            for segment, start_key in start_keys.items()
+        }
+        for segment, future in futures.items():
+            segment_items, last_evaluated_key = future.result()
+            items.extend(segment_items)
+            if last_evaluated_key:
+                next_start_keys[segment] = last_evaluated_key
+    page = {'items': items}
+    if next_start_keys:
+        page['nextToken'] = encode_next_token({'segments': total_segments, 'startKeys': next_start_keys})
+    return page
+
+
+def get_expand(query_parameters):
+    expand = [name.strip() for name in query_parameters.get('expand', '').split(',') if name.strip()]
+    if any(name not in EXPAND_OPTIONS for name in expand):
+        raise ValueError(f'expand must be a comma separated list of {", ".join(EXPAND_OPTIONS)}')
+    return expand
+
+
+def query_location_collection(locationid, expand):
+    # Location, its resources and bookings share the partition key and are read with a single query.
+    # Booking items sort before the location item, skip them when they are not requested
+    query_args = {
+        'KeyConditionExpression': 'PK = :pk',
+        'ExpressionAttributeValues': {':pk': f'LOCATION#{locationid}'}
+    }
+    if 'bookings' not in expand:
+        query_args['KeyConditionExpression'] += ' AND SK >= :sk'
+        query_args['ExpressionAttributeValues'][':sk'] = 'LOCATION'
+    location = None
+    children = {'resources': [], 'bookings': []}
+    while True:
+        ddb_response = single_table.query(**query_args)
+        for item in ddb_response['Items']:
+            item.pop('PK')
+            sort_key = item.pop('SK')
+            if sort_key == 'LOCATION':
+                location = item
+            elif sort_key.startswith('RESOURCE#'):
+                children['resources'].append(item)
+            else:
+                children['bookings'].append(item)
+        if 'LastEvaluatedKey' not in ddb_response:
+            break
+        query_args['ExclusiveStartKey'] = ddb_response['LastEvaluatedKey']
+    if location is None:
+        return {}
+    location.update({name: children[name] for name in expand})
+    return location
+
+
+def query_all(**query_args):
+    # Resources aren't thread safe, use the underlying client in worker threads
+    items = []
+    while True:
+        ddb_response = dynamodb.meta.client.query(**query_args)
+        items.extend(ddb_response['Items'])
+        if 'LastEvaluatedKey' not in ddb_response:
+            return items
+        query_args['ExclusiveStartKey'] = ddb_response['LastEvaluatedKey']
+
+
+def hydrate_location(location, expand):
+    # Without the single-table layout resources and their bookings are read from their own tables
+    resources = query_all(
+        TableName=RESOURCES_TABLE,
+        IndexName='locationidGSI',
+        KeyConditionExpression='locationid = :locationid',
+        ExpressionAttributeValues={':locationid': location['locationid']}
+    )
+    if 'resources' in expand:
+        location['resources'] = resources
+    if 'bookings' in expand:
+        with ThreadPoolExecutor(max_workers=EXPAND_QUERY_WORKERS) as executor:
+            resource_bookings = executor.map(
+                lambda resource: query_all(
+                    TableName=BOOKINGS_TABLE,
+                    IndexName='bookingsByResourceByTimeGSI',
+                    KeyConditionExpression='resourceid = :resourceid',
+                    ExpressionAttributeValues={':resourceid': resource['resourceid']}
+                ),
+                resources
+            )
+            location['bookings'] = [booking for bookings in resource_bookings for booking in bookings]
+    return location
+
+
+def is_admin_request(event):
+    authorizer_context = event['requestContext'].get('authorizer') or {}
+    # HTTP APIs pass Lambda authorizer context in a nested 'lambda' object
+    authorizer_context = authorizer_context.get('lambda') or authorizer_context
+    return authorizer_context.get('isAdmin') == 'true'
+
+
+# Get all locations
+@router.route('GET /locations')
+def get_locations(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    query_parameters = event.get('queryStringParameters') or {}
+    projection = get_projection(query_parameters, 'locationid')
+    if query_parameters.get('export') == 'true':
+        # export the table page by page using parallel scan, limited to administrative users
+        if is_admin_request(event):
+            response_body = export_page(query_parameters, projection)
+            status_code = 200
+        else:
+            response_body = {'Message': 'Export requires administrative privileges'}
+            status_code = 403
+    elif 'ids' in query_parameters:
+        items, unprocessed_ids = batch_get_items(
+            dynamodb, LOCATIONS_TABLE, 'locationid',
+            get_ids(query_parameters),
+            projection
+        )
+        response_body = {'items': items}
+        if unprocessed_ids:
+            response_body['unprocessedIds'] = unprocessed_ids
+        status_code = 200
+    else:
+        response_body = scan_page(query_parameters, projection)
+        status_code = 200
+    return status_code, response_body
+
+
+# Location CRUD operations
+@router.route('GET /locations/{locationid}')
+def get_location(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    query_parameters = event.get('queryStringParameters') or {}
+    expand = get_expand(query_parameters)
+    if expand and single_table:
+        # get the location and related items with one query
+        response_body = query_location_collection(event['pathParameters']['locationid'], expand)
+    else:
+        # read through the location cache, projections are applied to the cached item
+        locationid = event['pathParameters']['locationid']
+        item = location_cache.get(locationid)
+        if item is None:
+            item = ddbTable.get_item(Key={'locationid': locationid}).get('Item')
+            if item:
+                location_cache.put(locationid, item)
+        response_body = project_item(item, query_parameters, 'locationid') if item else {}
+        if expand and response_body:
+            response_body = hydrate_location(response_body, expand)
+    return 200, response_body
+
+
+@router.route('DELETE /locations/{locationid}')
+def delete_location(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'DELETE'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    # delete item in the database
+    ddbTable.delete_item(
+        Key={'locationid': event['pathParameters']['locationid']}
+    )
+    location_cache.invalidate(event['pathParameters']['locationid'])
+    if single_table:
+        single_table.delete_item(
+            Key={'PK': f"LOCATION#{event['pathParameters']['locationid']}", 'SK': 'LOCATION'}
+        )
+    response_body = {}
+    return 200, response_body
+
+
+@router.route('PUT /locations')
+def put_location(event, metric_payload):
+    request_json = json.loads(event['body'])
+    request_json['timestamp'] = datetime.now().isoformat()
+    # generate unique id if it isn't present in the request
+    if 'locationid' not in request_json:
+        request_json['locationid'] = str(uuid.uuid1())
+    # generate business metrics for the route
+    metric_payload['operation'] = 'PUT'
+    metric_payload['locationid'] = request_json['locationid']
+    # update the database
+    ddbTable.put_item(
+        Item=request_json
+    )
+    location_cache.invalidate(request_json['locationid'])
+    if single_table:
+        single_table.put_item(
+            Item=dict(request_json, PK=f"LOCATION#{request_json['locationid']}", SK='LOCATION')
+        )
+    response_body = request_json
+    return 200, response_body
 
 
 @metric_scope
 def lambda_handler(event, context, metrics):
     route_key = f"{event['httpMethod']} {event['resource']}"
 
-    # Set default response, override with data from DynamoDB if any
-    response_body = {'Message': 'Unsupported route'}
-    status_code = 400
     headers = {
         'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*'
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag'
         }
 
     # Initialize putting common business metrics using EMF
     metric_payload = {}
     metrics.put_dimensions({'Service': 'Locations'})
+    metrics.put_dimensions({'Service': 'Locations', 'RouteKey': route_key})
     metrics.put_metric('ProcessedLocations', 1, 'Count')
     metrics.set_property('requestId', event['requestContext']['requestId'])
     metrics.set_property('routeKey', route_key)
+    router.put_cold_start_metrics(metrics)
 
+    ddb_metrics.reset()
+    started = time.perf_counter()
     try:
-        # Get all locations
-        if route_key == 'GET /locations':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'GET'
-            ddb_response = ddbTable.scan(Select='ALL_ATTRIBUTES')
-            # return list of items instead of full DynamoDB response
-            response_body = ddb_response['Items']
-            status_code = 200
-        # Location CRUD operations
-        if route_key == 'GET /locations/{locationid}':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'GET'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            # get data from the database
-            ddb_response = ddbTable.get_item(
-                Key={'locationid': event['pathParameters']['locationid']}
-            )
-            # return list of items instead of full DynamoDB response
-            if 'Item' in ddb_response:
-                response_body = ddb_response['Item']
-            else:
-                response_body = {}
-            status_code = 200
-        if route_key == 'DELETE /locations/{locationid}':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'DELETE'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            # delete item in the database
-            ddbTable.delete_item(
-                Key={'locationid': event['pathParameters']['locationid']}
-            )
-            response_body = {}
-            status_code = 200
-        if route_key == 'PUT /locations':
-            request_json = json.loads(event['body'])
-            request_json['timestamp'] = datetime.now().isoformat()
-            # generate unique id if it isn't present in the request
-            if 'locationid' not in request_json:
-                request_json['locationid'] = str(uuid.uuid1())
-            # generate business metrics for the route
-            metric_payload['operation'] = 'PUT'
-            metric_payload['locationid'] = request_json['locationid']
-            # update the database
-            ddbTable.put_item(
-                Item=request_json
-            )
-            response_body = request_json
-            status_code = 200
+        status_code, response_body = router.dispatch(route_key, event, metric_payload)
     except Exception as err:
         status_code = 400
         response_body = {'Error:': str(err)}
         print(str(err))
+    # Add route and DynamoDB performance metrics
+    metrics.put_metric('Latency', (time.perf_counter() - started) * 1000, 'Milliseconds')
+    ddb_metrics.put_metrics(metrics)
+    location_cache.put_metrics(metrics)
     # Add route specific business metrics
     metrics.set_property("Payload", metric_payload)
-    return {
+    response = {
         'statusCode': status_code,
-        'body': json.dumps(response_body),
+        'body': response_body if isinstance(response_body, EncodedJSON)
+        else json.dumps(response_body, default=decimal_default_json),
         'headers': headers
     }
+    # Let clients revalidate unchanged entities with If-None-Match
+    if route_key.startswith('GET '):
+        response = conditional_get(event, response)
+    return response
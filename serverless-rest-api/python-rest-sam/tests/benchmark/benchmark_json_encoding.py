@@ -0,0 +1,64 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Compares the resource path (deserialize to Python types, then json.dumps) with the low-level client
+# fast path (encode DynamoDB JSON directly) for list responses of bookings
+# Run from the project root: python -m tests.benchmark.benchmark_json_encoding
+import json
+import statistics
+import time
+from boto3.dynamodb.types import TypeDeserializer
+
+from src.api.fast_json import decimal_default_json, encode_item
+
+ITERATIONS = 20
+ITEM_COUNTS = [1000, 10000]
+
+deserializer = TypeDeserializer()
+
+
+def generate_items(count):
+    # Items as returned by the low-level client, the same shape the resource deserializes
+    return [
+        {
+            'bookingid': {'S': f'1f290bf0-9be2-11eb-9326-{i:012d}'},
+            'resourceid': {'S': 'f8216640-91a2-11eb-8ab9-57aa454facef'},
+            'userid': {'S': 'bf6dbddc-db2e-4f70-a892-1b165556dede'},
+            'timestamp': {'S': '2021-03-30T21:57:49.860Z'},
+            'starttimeepochtime': {'N': str(1617278400 + i * 3600)}
+        }
+        for i in range(count)
+    ]
+
+
+def resource_path(items):
+    deserialized = [{name: deserializer.deserialize(value) for name, value in item.items()} for item in items]
+    return json.dumps(deserialized, default=decimal_default_json)
+
+
+def fast_path(items):
+    return '[' + ','.join([encode_item(item) for item in items]) + ']'
+
+
+def run(path, items):
+    latencies = []
+    for i in range(ITERATIONS):
+        start = time.perf_counter()
+        body = path(items)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(statistics.median(latencies), 2),
+        'max_ms': round(latencies[-1], 2),
+        'body_bytes': len(body)
+    }
+
+
+if __name__ == '__main__':
+    print(f"{'items':<8}{'path':<10}{'p50 (ms)':>12}{'max (ms)':>12}{'body (B)':>12}")
+    for count in ITEM_COUNTS:
+        items = generate_items(count)
+        assert json.loads(resource_path(items)) == json.loads(fast_path(items))
+        for name, path in [('resource', resource_path), ('fast', fast_path)]:
+            result = run(path, items)
+            print(f"{count:<8}{name:<10}{result['p50_ms']:>12}{result['max_ms']:>12}{result['body_bytes']:>12}")
@@ -0,0 +1,168 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import json
+import time
+from unittest.mock import MagicMock, patch
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+APP_CLIENT_ID = 'mock-client-id'
+ADMIN_GROUP_NAME = 'apiAdmins'
+USER_ID = 'bf6dbddc-db2e-4f70-a892-1b165556dede'
+KID = 'mock-kid'
+METHOD_ARN = 'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/GET/locations'
+
+private_key_pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+    encoding=serialization.Encoding.PEM,
+    format=serialization.PrivateFormat.PKCS8,
+    encryption_algorithm=serialization.NoEncryption()
+)
+public_jwk = dict(jwk.construct(private_key_pem, 'RS256').public_key().to_dict(), kid=KID, alg='RS256')
+
+
+def mock_jwks_response(jwks_keys):
+    return MagicMock(status=200, data=json.dumps({'keys': jwks_keys}).encode('utf-8'))
+
+
+def generate_token(groups=None, expires_in=3600, kid=KID):
+    claims = {'sub': USER_ID, 'aud': APP_CLIENT_ID, 'exp': int(time.time()) + expires_in}
+    if groups:
+        claims['cognito:groups'] = groups
+    return jwt.encode(claims, private_key_pem, algorithm='RS256', headers={'kid': kid})
+
+
+def generate_event(token):
+    return {'type': 'TOKEN', 'authorizationToken': token, 'methodArn': METHOD_ARN}
+
+
+@pytest.fixture
+def authorizer():
+    from src.api import authorizer
+    with patch.object(authorizer, 'app_client_id', APP_CLIENT_ID), \
+            patch.object(authorizer, 'admin_group_name', ADMIN_GROUP_NAME), \
+            patch.object(authorizer.http, 'request', return_value=mock_jwks_response([public_jwk])):
+        authorizer.keys = {}
+        authorizer.keys_fetched_at = 0
+        authorizer.keys_fetch_attempted_at = 0
+        authorizer.unknown_kids.clear()
+        authorizer.verified_tokens.clear()
+        yield authorizer
+
+
+def test_user_policy(authorizer):
+    ret = authorizer.lambda_handler(generate_event(generate_token()), '')
+    assert ret['principalId'] == USER_ID
+    assert ret['context']['isAdmin'] == 'false'
+    resources = ret['policyDocument']['Statement'][0]['Resource']
+    assert f'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/GET/users/{USER_ID}/bookings' in resources
+    assert 'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/PUT/locations' not in resources
+
+
+def test_admin_policy(authorizer):
+    ret = authorizer.lambda_handler(generate_event(generate_token(groups=[ADMIN_GROUP_NAME])), '')
+    assert ret['context']['isAdmin'] == 'true'
+    resources = ret['policyDocument']['Statement'][0]['Resource']
+    assert 'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/PUT/locations' in resources
+
+
+def test_invalid_token(authorizer):
+    token = generate_token()
+    # tamper with the payload, signature no longer matches
+    header, payload, signature = token.split('.')
+    with pytest.raises(Exception, match='Unauthorized'):
+        authorizer.lambda_handler(generate_event(f'{header}.{payload}x.{signature}'), '')
+    with pytest.raises(Exception, match='Unauthorized'):
+        authorizer.lambda_handler(generate_event(generate_token(expires_in=-10)), '')
+
+
+def test_verified_token_cache(authorizer):
+    token = generate_token()
+    authorizer.lambda_handler(generate_event(token), '')
+    assert len(authorizer.verified_tokens) == 1
+    # cached tokens are not verified again
+    with patch.object(authorizer.keys[KID], 'verify') as mock_verify:
+        authorizer.lambda_handler(generate_event(token), '')
+        mock_verify.assert_not_called()
+    # cached tokens are evicted once expired
+    with patch('time.time', return_value=time.time() + 7200):
+        with pytest.raises(Exception, match='Unauthorized'):
+            authorizer.lambda_handler(generate_event(token), '')
+    assert len(authorizer.verified_tokens) == 0
+
+
+def test_verified_token_cache_size(authorizer):
+    with patch.object(authorizer, 'token_cache_size', 2):
+        tokens = [generate_token(expires_in=3600 + i) for i in range(3)]
+        for token in tokens:
+            authorizer.lambda_handler(generate_event(token), '')
+        assert len(authorizer.verified_tokens) == 2
+
+
+def test_keys_refreshed_after_ttl(authorizer):
+    authorizer.lambda_handler(generate_event(generate_token()), '')
+    authorizer.lambda_handler(generate_event(generate_token(expires_in=3601)), '')
+    assert authorizer.http.request.call_count == 1
+    with patch('time.time', return_value=time.time() + authorizer.jwks_ttl + 1):
+        authorizer.lambda_handler(generate_event(generate_token(expires_in=7200)), '')
+    assert authorizer.http.request.call_count == 2
+
+
+def test_unknown_kid_refetch(authorizer):
+    authorizer.lambda_handler(generate_event(generate_token()), '')
+    # key was rotated after the keys were downloaded
+    rotated_jwk = dict(public_jwk, kid='rotated-kid')
+    authorizer.http.request.return_value = mock_jwks_response([public_jwk, rotated_jwk])
+    with patch('time.time', return_value=time.time() + authorizer.jwks_refetch_interval + 1):
+        ret = authorizer.lambda_handler(generate_event(generate_token(kid='rotated-kid', expires_in=3700)), '')
+    assert ret['principalId'] == USER_ID
+    assert authorizer.http.request.call_count == 2
+
+
+def test_unknown_kid_negative_cache(authorizer):
+    authorizer.lambda_handler(generate_event(generate_token()), '')
+    later = time.time() + authorizer.jwks_refetch_interval + 1
+    with patch('time.time', return_value=later):
+        for i in range(5):
+            with pytest.raises(Exception, match='Unauthorized'):
+                authorizer.lambda_handler(generate_event(generate_token(kid='bad-kid', expires_in=3700 + i)), '')
+    # a flood of tokens with unknown kid results in a single refetch
+    assert authorizer.http.request.call_count == 2
+    assert 'bad-kid' in authorizer.unknown_kids
+
+
+def test_failed_refresh_throttled(authorizer):
+    authorizer.lambda_handler(generate_event(generate_token()), '')
+    authorizer.http.request.return_value = MagicMock(status=500, data=b'')
+    later = time.time() + authorizer.jwks_ttl + 1
+    with patch('time.time', return_value=later):
+        # previously downloaded keys are used when the refresh fails
+        ret = authorizer.lambda_handler(generate_event(generate_token(expires_in=7200)), '')
+        assert ret['principalId'] == USER_ID
+        assert authorizer.http.request.call_count == 2
+    with patch('time.time', return_value=later + authorizer.jwks_refetch_interval - 1):
+        authorizer.lambda_handler(generate_event(generate_token(expires_in=7201)), '')
+        with pytest.raises(Exception, match='Unauthorized'):
+            authorizer.lambda_handler(generate_event(generate_token(kid='random-kid', expires_in=7202)), '')
+    # neither the TTL refresh nor the unknown kid retry the download within the interval
+    assert authorizer.http.request.call_count == 2
+
+
+def test_principal_policy(authorizer):
+    with patch.object(authorizer, 'policy_mode', 'principal'):
+        authorizer.principal_policies.clear()
+        ret = authorizer.lambda_handler(generate_event(generate_token()), '')
+        resources = ret['policyDocument']['Statement'][0]['Resource']
+        assert resources == [
+            'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/GET/locations',
+            'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/GET/locations/*',
+            f'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/*/users/{USER_ID}/*'
+        ]
+        # policy is built once per principal and group membership
+        assert authorizer.lambda_handler(generate_event(generate_token(expires_in=3601)), '') is ret
+        ret = authorizer.lambda_handler(generate_event(generate_token(groups=[ADMIN_GROUP_NAME])), '')
+        assert ret['context']['isAdmin'] == 'true'
+        assert 'arn:aws:execute-api:us-east-1:123456789012:abcdef1234/Prod/*/locations/*' in ret['policyDocument']['Statement'][0]['Resource']
+        assert len(authorizer.principal_policies) == 2
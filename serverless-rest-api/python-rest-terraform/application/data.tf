@@ -33,13 +33,52 @@ data "aws_iam_policy_document" "lambda_role_policy_document" {
       "dynamodb:ConditionCheckItem"
     ]
 
-    resources = [
+    resources = concat([
       "${aws_dynamodb_table.locations_table.arn}",
       "${aws_dynamodb_table.locations_table.arn}/index/*",
       "${aws_dynamodb_table.resources_table.arn}",
       "${aws_dynamodb_table.resources_table.arn}/index/*",
       "${aws_dynamodb_table.bookings_table.arn}",
       "${aws_dynamodb_table.bookings_table.arn}/index/*"
+    ], aws_dynamodb_table.single_table[*].arn)
+  }
+  statement {
+    sid = "lambdarolestreamspolicydocument"
+
+    actions = [
+      "dynamodb:DescribeStream",
+      "dynamodb:GetRecords",
+      "dynamodb:GetShardIterator",
+      "dynamodb:ListStreams"
+    ]
+
+    resources = [
+      "${aws_dynamodb_table.locations_table.stream_arn}",
+      "${aws_dynamodb_table.resources_table.stream_arn}"
+    ]
+  }
+  statement {
+    sid = "lambdarolecascadepolicydocument"
+
+    # the cascade function continues unfinished cascades in asynchronous invocations of itself
+    actions = [
+      "lambda:InvokeFunction"
+    ]
+
+    resources = [
+      "arn:aws:lambda:${local.region}:${local.account_id}:function:${local.resource_name_prefix}-cascade-lambda-function",
+      "arn:aws:lambda:${local.region}:${local.account_id}:function:${local.resource_name_prefix}-cascade-lambda-function:*"
+    ]
+  }
+  statement {
+    sid = "lambdarolecascadedlqpolicydocument"
+
+    actions = [
+      "sqs:SendMessage"
+    ]
+
+    resources = [
+      aws_sqs_queue.cascade_dead_letter_queue.arn
     ]
   }
 }
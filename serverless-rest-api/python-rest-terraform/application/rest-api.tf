@@ -4,7 +4,7 @@
 locals {
   account_id           = data.aws_caller_identity.current.account_id
   region               = data.aws_region.current.name
-  lambda_functions_set = toset(["locations", "bookings", "resources", "authorizer"])
+  lambda_functions_set = toset(["locations", "bookings", "resources", "authorizer", "cascade"])
   resource_name_prefix = "${var.serverless_application_name}-${random_pet.this.id}"
   dynamodb_details = tomap({
     "locations" = {
@@ -155,12 +155,15 @@ module "lambda_functions" {
     LOCATIONS_TABLE          = aws_dynamodb_table.locations_table.name
     RESOURCES_TABLE          = aws_dynamodb_table.resources_table.name
     BOOKINGS_TABLE           = aws_dynamodb_table.bookings_table.name
+    SINGLE_TABLE             = var.single_table_layout ? aws_dynamodb_table.single_table[0].name : ""
+    FAST_JSON_RESPONSES      = var.fast_json_responses ? "true" : "false"
     AWS_EMF_NAMESPACE        = var.serverless_application_name
     AWS_XRAY_TRACING_NAME    = var.serverless_application_name
     AWS_XRAY_CONTEXT_MISSING = "LOG_ERROR"
     USER_POOL_ID             = data.aws_cloudformation_stack.cognito_stack.outputs["UserPool"]
     APPLICATION_CLIENT_ID    = data.aws_cloudformation_stack.cognito_stack.outputs["UserPoolClient"]
     ADMIN_GROUP_NAME         = data.aws_cloudformation_stack.cognito_stack.outputs["UserPoolAdminGroupName"]
+    POLICY_MODE              = var.authorizer_policy_mode
   }
 
   logging_log_group                 = "${local.resource_name_prefix}/lambda/${each.key}"
@@ -182,6 +185,9 @@ resource "aws_dynamodb_table" "locations_table" {
   read_capacity  = 2
   write_capacity = 2
   hash_key       = "locationid"
+  # removed locations are streamed to the cascade function
+  stream_enabled   = true
+  stream_view_type = "KEYS_ONLY"
 
   attribute {
     name = "locationid"
@@ -199,6 +205,9 @@ resource "aws_dynamodb_table" "resources_table" {
   read_capacity  = 2
   write_capacity = 2
   hash_key       = "resourceid"
+  # removed resources are streamed to the cascade function
+  stream_enabled   = true
+  stream_view_type = "OLD_IMAGE"
 
   attribute {
     name = "resourceid"
@@ -273,6 +282,78 @@ resource "aws_dynamodb_table" "bookings_table" {
 }
 
 
+resource "aws_dynamodb_table" "single_table" {
+  count          = var.single_table_layout ? 1 : 0
+  name           = "${local.resource_name_prefix}-single-table"
+  billing_mode   = "PROVISIONED"
+  read_capacity  = 2
+  write_capacity = 2
+  hash_key       = "PK"
+  range_key      = "SK"
+
+  attribute {
+    name = "PK"
+    type = "S"
+  }
+  attribute {
+    name = "SK"
+    type = "S"
+  }
+  point_in_time_recovery {
+    enabled = true
+  }
+}
+
+
+# Delete resources and bookings of removed locations and resources asynchronously
+resource "aws_lambda_event_source_mapping" "cascade" {
+  for_each = {
+    locations = aws_dynamodb_table.locations_table.stream_arn
+    resources = aws_dynamodb_table.resources_table.stream_arn
+  }
+
+  event_source_arn        = each.value
+  function_name           = module.lambda_functions["cascade"].lambda_function_arn
+  starting_position       = "TRIM_HORIZON"
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
+
+  # bisect failing batches, retry a bounded number of times and keep the failed records in a queue
+  bisect_batch_on_function_error = true
+  maximum_retry_attempts         = 3
+
+  destination_config {
+    on_failure {
+      destination_arn = aws_sqs_queue.cascade_dead_letter_queue.arn
+    }
+  }
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({ eventName = ["REMOVE"] })
+    }
+  }
+}
+
+# Cascades that run out of time continue in asynchronous invocations of the function
+resource "aws_lambda_function_event_invoke_config" "cascade" {
+  function_name          = module.lambda_functions["cascade"].lambda_function_name
+  maximum_retry_attempts = 2
+
+  destination_config {
+    on_failure {
+      destination = aws_sqs_queue.cascade_dead_letter_queue.arn
+    }
+  }
+}
+
+resource "aws_sqs_queue" "cascade_dead_letter_queue" {
+  name                      = "${local.resource_name_prefix}-cascade-dlq"
+  message_retention_seconds = 1209600
+  sqs_managed_sse_enabled   = true
+}
+
+
 # API Gateway configurations
 resource "aws_cloudwatch_log_group" "rest_api_access_logs" {
   name              = "${local.resource_name_prefix}/api/${aws_api_gateway_rest_api.application_api.id}"
@@ -287,7 +368,8 @@ resource "aws_api_gateway_rest_api" "application_api" {
     ResourcesFunction    = module.lambda_functions["resources"].lambda_function_arn,
     BookingsFunction     = module.lambda_functions["bookings"].lambda_function_arn,
     AuthorizerFunction   = module.lambda_functions["authorizer"].lambda_function_arn,
-    AuthorizerLambdaRole = aws_iam_role.authorizer_function_execution_role.arn
+    AuthorizerLambdaRole = aws_iam_role.authorizer_function_execution_role.arn,
+    AuthorizerResultTtl  = var.authorizer_result_ttl
   })
   name             = "${local.resource_name_prefix}-api"
   fail_on_warnings = true
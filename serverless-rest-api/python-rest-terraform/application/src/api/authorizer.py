@@ -8,40 +8,107 @@ import os
 import re
 import json
 import time
-import urllib.request
+import hashlib
+import urllib3
+from collections import OrderedDict
 from jose import jwk, jwt
 from jose.utils import base64url_decode
 
-is_cold_start = True
+# public keys indexed by kid, constructed once when keys are downloaded
 keys = {}
+keys_fetched_at = 0
+# time of the last download attempt, successful or not, downloads are at most one per jwks_refetch_interval
+keys_fetch_attempted_at = 0
+# kids that were not found in freshly downloaded keys, with negative cache expiration time
+unknown_kids = OrderedDict()
+# claims of already verified tokens indexed by token hash, in least recently used order
+verified_tokens = OrderedDict()
+token_cache_size = int(os.getenv('TOKEN_CACHE_SIZE', '1000'))
+# 'route' policies list allowed routes explicitly, 'principal' policies use wildcards scoped to the principal
+policy_mode = os.getenv('POLICY_MODE', 'route')
+# principal policies indexed by principal, group membership and API, in least recently used order
+principal_policies = OrderedDict()
+jwks_ttl = int(os.getenv('JWKS_TTL_SECONDS', '3600'))
+jwks_refetch_interval = int(os.getenv('JWKS_REFETCH_INTERVAL_SECONDS', '60'))
 user_pool_id = os.getenv('USER_POOL_ID', None)
 app_client_id = os.getenv('APPLICATION_CLIENT_ID', None)
 admin_group_name = os.getenv('ADMIN_GROUP_NAME', None)
+# reuse connections to Cognito across key downloads
+http = urllib3.PoolManager(timeout=urllib3.Timeout(connect=2.0, read=2.0), retries=urllib3.Retry(2))
+
+
+def fetch_keys(region):
+    global keys, keys_fetched_at, keys_fetch_attempted_at
+    # recorded before the download, a failing or slow Cognito endpoint is not called again on every request
+    keys_fetch_attempted_at = time.time()
+    keys_url = f'https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json'
+    response = http.request('GET', keys_url)
+    if response.status != 200:
+        raise Exception(f'Failed to download jwks.json, status code {response.status}')
+    keys = {key['kid']: jwk.construct(key) for key in json.loads(response.data.decode('utf-8'))['keys']}
+    keys_fetched_at = time.time()
+
+
+def get_public_key(kid, region):
+    now = time.time()
+    # refresh keys periodically to pick up Cognito key rotation
+    if now - keys_fetched_at > jwks_ttl and now - keys_fetch_attempted_at >= jwks_refetch_interval:
+        try:
+            fetch_keys(region)
+        except Exception as err:
+            # keep using previously downloaded keys if there are any
+            if not keys:
+                raise
+            print(f'Failed to refresh jwks.json: {err}')
+    if kid in keys:
+        return keys[kid]
+    # unknown kid might have been rotated in after the last download, refetch keys
+    # unless this kid was recently confirmed missing or keys were just downloaded or failed to download
+    if unknown_kids.get(kid, 0) > now or now - keys_fetch_attempted_at < jwks_refetch_interval:
+        return None
+    try:
+        fetch_keys(region)
+    except Exception as err:
+        print(f'Failed to refresh jwks.json: {err}')
+    if kid not in keys:
+        unknown_kids[kid] = now + jwks_refetch_interval
+        while len(unknown_kids) > token_cache_size:
+            unknown_kids.popitem(last=False)
+    return keys.get(kid)
+
+
+def get_verified_claims(token_hash):
+    claims = verified_tokens.get(token_hash)
+    if claims is None:
+        return None
+    # evict tokens that expired since they were verified
+    if time.time() > claims['exp']:
+        del verified_tokens[token_hash]
+        return None
+    verified_tokens.move_to_end(token_hash)
+    return claims
 
 
-def validate_token(token, region):
-    global keys, is_cold_start, user_pool_id, app_client_id
-    if is_cold_start:
-        keys_url = f'https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json'
-        with urllib.request.urlopen(keys_url) as f:
-            response = f.read()
-        keys = json.loads(response.decode('utf-8'))['keys']
-        is_cold_start = False
+def put_verified_claims(token_hash, claims):
+    verified_tokens[token_hash] = claims
+    verified_tokens.move_to_end(token_hash)
+    while len(verified_tokens) > token_cache_size:
+        verified_tokens.popitem(last=False)
+
 
+def validate_token(token, region):
+    # skip signature verification for tokens that were already verified by this container
+    token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    claims = get_verified_claims(token_hash)
+    if claims is not None:
+        return claims
     # get the kid from the headers prior to verification
     headers = jwt.get_unverified_headers(token)
-    kid = headers['kid']
     # search for the kid in the downloaded public keys
-    key_index = -1
-    for i in range(len(keys)):
-        if kid == keys[i]['kid']:
-            key_index = i
-            break
-    if key_index == -1:
+    public_key = get_public_key(headers['kid'], region)
+    if public_key is None:
         print('Public key not found in jwks.json')
         return False
-    # construct the public key
-    public_key = jwk.construct(keys[key_index])
     # get the last two sections of the token,
     # message and signature (encoded in base64)
     message, encoded_signature = str(token).rsplit('.', 1)
@@ -63,8 +130,29 @@ def validate_token(token, region):
     if claims['aud'] != app_client_id:
         print('Token was not issued for this audience')
         return False
-    decoded_jwt = jwt.decode(token, key=keys[key_index], audience=app_client_id)
-    return decoded_jwt
+    put_verified_claims(token_hash, claims)
+    return claims
+
+
+def build_principal_policy(principal_id, is_admin, aws_account_id, region, rest_api_id, stage):
+    # the policy doesn't depend on the route being called, so API Gateway can reuse
+    # cached authorizer result for any route this principal calls next
+    policy = AuthPolicy(principal_id, aws_account_id)
+    policy.restApiId = rest_api_id
+    policy.region = region
+    policy.stage = stage
+    # allow all public resources/methods
+    policy.allow_method(HttpVerb.GET, "locations")
+    policy.allow_method(HttpVerb.GET, "locations/*")
+    # allow all user specific resources/methods
+    policy.allow_method(HttpVerb.ALL, f"/users/{principal_id}/*")
+    if is_admin:
+        # add administrative privileges
+        policy.allow_method(HttpVerb.ALL, "locations")
+        policy.allow_method(HttpVerb.ALL, "locations/*")
+    auth_response = policy.build()
+    auth_response['context'] = {'isAdmin': 'true' if is_admin else 'false'}
+    return auth_response
 
 
 def lambda_handler(event, context):
@@ -81,6 +169,21 @@ def lambda_handler(event, context):
     if not validated_decoded_token:
         raise Exception('Unauthorized')
     principal_id = validated_decoded_token['sub']
+    # Check the Cognito group entry for Admin.
+    # Assuming here that the Admin group has always higher /precedence
+    is_admin = 'cognito:groups' in validated_decoded_token and validated_decoded_token['cognito:groups'][0] == admin_group_name
+    if policy_mode == 'principal':
+        # build policy once per principal and group membership
+        policy_key = (principal_id, is_admin, region, aws_account_id, api_gateway_arn_tmp[0], api_gateway_arn_tmp[1])
+        auth_response = principal_policies.get(policy_key)
+        if auth_response is None:
+            auth_response = build_principal_policy(principal_id, is_admin, aws_account_id, region,
+                                                   api_gateway_arn_tmp[0], api_gateway_arn_tmp[1])
+            principal_policies[policy_key] = auth_response
+            while len(principal_policies) > token_cache_size:
+                principal_policies.popitem(last=False)
+        principal_policies.move_to_end(policy_key)
+        return auth_response
     # initialize the policy
     policy = AuthPolicy(principal_id, aws_account_id)
     policy.restApiId = api_gateway_arn_tmp[0]
@@ -95,10 +198,9 @@ def lambda_handler(event, context):
     policy.allow_method(HttpVerb.GET, f"/users/{principal_id}/bookings")
     policy.allow_method(HttpVerb.GET, f"/users/{principal_id}/bookings/*")
     policy.allow_method(HttpVerb.PUT, f"/users/{principal_id}/bookings")
+    policy.allow_method(HttpVerb.PUT, f"/users/{principal_id}/bookings/batch")
     policy.allow_method(HttpVerb.DELETE, f"/users/{principal_id}/bookings/*")
-    # Check the Cognito group entry for Admin.
-    # Assuming here that the Admin group has always higher /precedence
-    if 'cognito:groups' in validated_decoded_token and validated_decoded_token['cognito:groups'][0] == admin_group_name:
+    if is_admin:
         # add administrative privileges
         policy.allow_method(HttpVerb.DELETE, "locations")
         policy.allow_method(HttpVerb.DELETE, "locations/*")
@@ -106,6 +208,8 @@ def lambda_handler(event, context):
         policy.allow_method(HttpVerb.PUT, "locations/*")
     # Finally, build the policy
     auth_response = policy.build()
+    # let backend handlers know about administrative privileges, e.g. for locations export
+    auth_response['context'] = {'isAdmin': 'true' if is_admin else 'false'}
     return auth_response
 
 
@@ -129,6 +233,10 @@ class AuthPolicy(object):
     """The policy version used for the evaluation. This should always be '2012-10-17'"""
     pathRegex = "^[/.a-zA-Z0-9-\*]+$"
     """The regular expression used to validate resource paths for the policy"""
+    pathPattern = re.compile(pathRegex)
+    """Compiled version of the pathRegex, compiled once instead of on every method added"""
+    arnTemplate = "arn:aws:execute-api:{region}:{awsAccountId}:{restApiId}/{stage}/{verb}/{resource}"
+    """The template used to generate method ARNs"""
 
     """these are the internal lists of allowed and denied methods. These are lists
     of objects and each object has 2 properties: A resource ARN and a nullable
@@ -165,20 +273,15 @@ class AuthPolicy(object):
         statement can be null."""
         if verb != "*" and not hasattr(HttpVerb, verb):
             raise NameError("Invalid HTTP verb " + verb + ". Allowed verbs in HttpVerb class")
-        resource_pattern = re.compile(self.pathRegex)
-        if not resource_pattern.match(resource):
+        if not self.pathPattern.match(resource):
             raise NameError("Invalid resource path: " + resource + ". Path should match " + self.pathRegex)
 
         if resource[:1] == "/":
             resource = resource[1:]
 
-        resource_arn = ("arn:aws:execute-api:" +
-                        self.region + ":" +
-                        self.awsAccountId + ":" +
-                        self.restApiId + "/" +
-                        self.stage + "/" +
-                        verb + "/" +
-                        resource)
+        resource_arn = self.arnTemplate.format(region=self.region, awsAccountId=self.awsAccountId,
+                                               restApiId=self.restApiId, stage=self.stage,
+                                               verb=verb, resource=resource)
 
         if effect.lower() == "allow":
             self.allowMethods.append({
@@ -2,41 +2,480 @@
 # SPDX-License-Identifier: MIT-0
 
 # Implementation of the API backend for bookings
+import time
+
+# Module initialization time is measured from here, see Router.put_cold_start_metrics
+init_started = time.perf_counter()
+
+import base64
+import bisect
 import boto3
 import decimal
 import json
 import os
+import random
 import uuid
-from datetime import datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 from aws_embedded_metrics import metric_scope
 
+# Handlers are imported from the src.api package or as top-level modules, depending on the deployment
+try:
+    from .bulk_get import batch_get_items, get_ids
+    from .fast_json import EncodedJSON, decimal_default_json, encode_page, query_json
+    from .fields import get_projection
+    from .router import DynamoDBMetrics, Router, patch_libraries
+except ImportError:
+    from bulk_get import batch_get_items, get_ids
+    from fast_json import EncodedJSON, decimal_default_json, encode_page, query_json
+    from fields import get_projection
+    from router import DynamoDBMetrics, Router, patch_libraries
+
 # Patch libraries to instrument downstream calls
-# See https://docs.aws.amazon.com/xray/latest/devguide/xray-sdk-python-patching.html for more details
-from aws_xray_sdk.core import patch_all
-patch_all()
+patch_libraries()
+router = Router(init_started)
 
 # Prepare DynamoDB client
 BOOKINGS_TABLE = os.getenv('BOOKINGS_TABLE', None)
+RESOURCES_TABLE = os.getenv('RESOURCES_TABLE', None)
+# Optional single-table layout, a location, its resources and bookings share the partition key
+SINGLE_TABLE = os.getenv('SINGLE_TABLE') or None
 dynamodb = boto3.resource('dynamodb')
 ddbTable = dynamodb.Table(BOOKINGS_TABLE)
+single_table = dynamodb.Table(SINGLE_TABLE) if SINGLE_TABLE else None
+# Optional fast path for list responses, the low-level client returns items in DynamoDB JSON
+# that is encoded to the response directly instead of being deserialized to Python types first
+FAST_JSON_RESPONSES = os.getenv('FAST_JSON_RESPONSES', 'false') == 'true'
+ddb_client = boto3.client('dynamodb') if FAST_JSON_RESPONSES else None
+# Measure the DynamoDB calls of every request
+ddb_metrics = DynamoDBMetrics()
+ddb_metrics.instrument(dynamodb.meta.client)
+if ddb_client:
+    ddb_metrics.instrument(ddb_client)
+
+# Page size limits for the list routes
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+# Batch booking creation limits, BatchWriteItem accepts up to 25 items per call
+MAX_BATCH_BOOKINGS = 100
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_RETRIES = 5
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+# Bookings have a start time only, availability search assumes every booking takes a fixed time slot
+BOOKING_DURATION_SECONDS = int(os.getenv('BOOKING_DURATION_SECONDS', '3600'))
+# Availability interval indexes cover whole days and are cached per location in warm containers
+AVAILABILITY_INDEX_WINDOW_SECONDS = 86400
+AVAILABILITY_INDEX_TTL_SECONDS = int(os.getenv('AVAILABILITY_INDEX_TTL_SECONDS', '60'))
+AVAILABILITY_INDEX_CACHE_SIZE = 100
+AVAILABILITY_MAX_WINDOW_SECONDS = 31 * 86400
+AVAILABILITY_QUERY_WORKERS = 10
+
+# Availability interval indexes by location id, least recently used first
+availability_indexes = OrderedDict()
+
+
+# Pagination tokens are opaque to the clients, they are base64 encoded DynamoDB LastEvaluatedKey values
+def encode_next_token(last_evaluated_key):
+    token_json = json.dumps(last_evaluated_key, default=decimal_default_json)
+    return base64.urlsafe_b64encode(token_json.encode('utf-8')).decode('utf-8')
+
+
+def decode_next_token(next_token, partition_key):
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(next_token.encode('utf-8')),
+                               parse_float=decimal.Decimal, parse_int=decimal.Decimal)
+    except ValueError:
+        raise ValueError('Invalid nextToken')
+    # make sure token was issued for the same query and can't be used to read other partitions
+    if not isinstance(start_key, dict) or any(start_key.get(k) != v for k, v in partition_key.items()):
+        raise ValueError('Invalid nextToken')
+    return start_key
+
+
+def get_page_size(query_parameters):
+    try:
+        limit = int(query_parameters.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('Invalid limit')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def query_bookings(query_parameters, partition_key, **query_args):
+    # Return a single page, of the default size if no limit is given, and a token to get the next one
+    query_args.update(get_projection(query_parameters, 'bookingid'))
+    query_args['Limit'] = get_page_size(query_parameters)
+    if query_parameters.get('nextToken'):
+        query_args['ExclusiveStartKey'] = decode_next_token(query_parameters['nextToken'], partition_key)
+    if FAST_JSON_RESPONSES:
+        items_json, last_evaluated_key = query_json(ddb_client, BOOKINGS_TABLE, **query_args)
+        return encode_page(items_json, encode_next_token(last_evaluated_key) if last_evaluated_key else None)
+    ddb_response = ddbTable.query(**query_args)
+    page = {'items': ddb_response['Items']}
+    if 'LastEvaluatedKey' in ddb_response:
+        page['nextToken'] = encode_next_token(ddb_response['LastEvaluatedKey'])
+    return page
+
+
+def parse_time(value):
+    # Accept epoch seconds or ISO 8601 timestamps, timestamps without offset are treated as UTC
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f'Invalid time {value}')
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp())
+
+
+def resource_bookings_query_args(query_parameters, resourceid):
+    # Narrow the query to a time window using the starttimeepochtime sort key of the GSI
+    key_condition = 'resourceid = :resourceid'
+    expression_values = {':resourceid': resourceid}
+    start = parse_time(query_parameters['from']) if query_parameters.get('from') else None
+    end = parse_time(query_parameters['to']) if query_parameters.get('to') else None
+    if start is not None and end is not None:
+        if start > end:
+            raise ValueError('Invalid time range')
+        key_condition += ' AND starttimeepochtime BETWEEN :from AND :to'
+        expression_values.update({':from': start, ':to': end})
+    elif start is not None:
+        key_condition += ' AND starttimeepochtime >= :from'
+        expression_values[':from'] = start
+    elif end is not None:
+        key_condition += ' AND starttimeepochtime <= :to'
+        expression_values[':to'] = end
+    order = query_parameters.get('order', 'asc')
+    if order not in ['asc', 'desc']:
+        raise ValueError('Invalid order')
+    return {
+        'IndexName': 'bookingsByResourceByTimeGSI',
+        'KeyConditionExpression': key_condition,
+        'ExpressionAttributeValues': expression_values,
+        'ScanIndexForward': order == 'asc'
+    }
+
+
+def batch_write_bookings(bookings):
+    # Write bookings in chunks, retry unprocessed items with exponential backoff and jitter.
+    # Returns errors for the bookings that could not be written, indexed by booking id
+    errors = {}
+    for i in range(0, len(bookings), BATCH_WRITE_SIZE):
+        request_items = [{'PutRequest': {'Item': booking}} for booking in bookings[i:i + BATCH_WRITE_SIZE]]
+        try:
+            for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+                ddb_response = dynamodb.batch_write_item(RequestItems={BOOKINGS_TABLE: request_items})
+                request_items = ddb_response.get('UnprocessedItems', {}).get(BOOKINGS_TABLE, [])
+                if not request_items or attempt == BATCH_WRITE_MAX_RETRIES:
+                    break
+                time.sleep(BATCH_WRITE_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1))
+            for request_item in request_items:
+                errors[request_item['PutRequest']['Item']['bookingid']] = 'Booking was not processed, retry later'
+        except Exception as err:
+            for request_item in request_items:
+                errors[request_item['PutRequest']['Item']['bookingid']] = str(err)
+    return errors
+
+
+def query_all(**query_args):
+    # Resources aren't thread safe, use the underlying client in worker threads
+    items = []
+    while True:
+        ddb_response = dynamodb.meta.client.query(**query_args)
+        items.extend(ddb_response['Items'])
+        if 'LastEvaluatedKey' not in ddb_response:
+            return items
+        query_args['ExclusiveStartKey'] = ddb_response['LastEvaluatedKey']
+
+
+def query_booking_start_times(resourceid, window_start, window_end):
+    # Start times of the resource bookings overlapping the window, sorted by the GSI sort key
+    bookings = query_all(
+        TableName=BOOKINGS_TABLE,
+        IndexName='bookingsByResourceByTimeGSI',
+        KeyConditionExpression='resourceid = :resourceid AND starttimeepochtime BETWEEN :from AND :to',
+        ExpressionAttributeValues={
+            ':resourceid': resourceid,
+            ':from': window_start - BOOKING_DURATION_SECONDS + 1,
+            ':to': window_end - 1
+        },
+        ProjectionExpression='starttimeepochtime'
+    )
+    return [int(booking['starttimeepochtime']) for booking in bookings]
+
+
+def build_availability_index(locationid, window_start, window_end):
+    resources = query_all(
+        TableName=RESOURCES_TABLE,
+        IndexName='locationidGSI',
+        KeyConditionExpression='locationid = :locationid',
+        ExpressionAttributeValues={':locationid': locationid}
+    )
+    # fan out bookings queries for all resources of the location
+    with ThreadPoolExecutor(max_workers=AVAILABILITY_QUERY_WORKERS) as executor:
+        start_times = executor.map(
+            lambda resource: query_booking_start_times(resource['resourceid'], window_start, window_end),
+            resources
+        )
+        return {
+            'built_at': time.time(),
+            'window_start': window_start,
+            'window_end': window_end,
+            'resources': resources,
+            'start_times': dict(zip([resource['resourceid'] for resource in resources], start_times))
+        }
+
+
+def get_availability_index(locationid, start, end):
+    index = availability_indexes.get(locationid)
+    if index is None or time.time() - index['built_at'] > AVAILABILITY_INDEX_TTL_SECONDS \
+            or start < index['window_start'] or end > index['window_end']:
+        index = build_availability_index(
+            locationid,
+            start - start % AVAILABILITY_INDEX_WINDOW_SECONDS,
+            end + -end % AVAILABILITY_INDEX_WINDOW_SECONDS
+        )
+        availability_indexes[locationid] = index
+    availability_indexes.move_to_end(locationid)
+    while len(availability_indexes) > AVAILABILITY_INDEX_CACHE_SIZE:
+        availability_indexes.popitem(last=False)
+    return index
+
+
+def invalidate_availability_indexes(resourceid):
+    # Drop cached indexes of the location the resource belongs to once its bookings change
+    for locationid, index in list(availability_indexes.items()):
+        if resourceid in index['start_times']:
+            del availability_indexes[locationid]
+
+
+def is_available(start_times, start, end):
+    # The first booking that ends after the interval start must not start before the interval end
+    i = bisect.bisect_right(start_times, start - BOOKING_DURATION_SECONDS)
+    return i == len(start_times) or start_times[i] >= end
+
+
+def get_resource_locationid(resourceid):
+    ddb_response = dynamodb.Table(RESOURCES_TABLE).get_item(
+        Key={'resourceid': resourceid},
+        ProjectionExpression='locationid'
+    )
+    return ddb_response.get('Item', {}).get('locationid')
+
+
+def put_single_table_bookings(bookings):
+    # Bookings are stored in the item collection of the resource location,
+    # bookings without a resource or for unknown resources can't be placed and are skipped
+    locationids = {}
+    with single_table.batch_writer() as batch:
+        for booking in bookings:
+            resourceid = booking.get('resourceid')
+            if not resourceid:
+                continue
+            if resourceid not in locationids:
+                locationids[resourceid] = get_resource_locationid(resourceid)
+            if locationids[resourceid]:
+                batch.put_item(Item=dict(
+                    booking,
+                    PK=f"LOCATION#{locationids[resourceid]}",
+                    SK=f"BOOKING#{resourceid}#{booking['bookingid']}"
+                ))
+
+
+def delete_single_table_booking(booking):
+    if not booking.get('resourceid'):
+        return
+    locationid = get_resource_locationid(booking['resourceid'])
+    if locationid:
+        single_table.delete_item(
+            Key={'PK': f'LOCATION#{locationid}', 'SK': f"BOOKING#{booking['resourceid']}#{booking['bookingid']}"}
+        )
+
+
+# Get bookings for resource
+@router.route('GET /locations/{locationid}/resources/{resourceid}/bookings')
+def get_resource_bookings(event, metric_payload):
+    # add business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = event['pathParameters']['resourceid']
+    # get data from the database
+    query_parameters = event.get('queryStringParameters') or {}
+    response_body = query_bookings(
+        query_parameters,
+        {'resourceid': event['pathParameters']['resourceid']},
+        **resource_bookings_query_args(query_parameters, event['pathParameters']['resourceid'])
+    )
+    return 200, response_body
+
+
+# Search for resources available at the location
+@router.route('GET /locations/{locationid}/availability')
+def get_availability(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    query_parameters = event.get('queryStringParameters') or {}
+    if not query_parameters.get('from') or not query_parameters.get('to'):
+        raise ValueError('from and to query parameters are required')
+    start = parse_time(query_parameters['from'])
+    end = parse_time(query_parameters['to'])
+    if start >= end or end - start > AVAILABILITY_MAX_WINDOW_SECONDS:
+        raise ValueError('Invalid time range')
+    # get data from the database or the cached index
+    index = get_availability_index(event['pathParameters']['locationid'], start, end)
+    response_body = [
+        resource for resource in index['resources']
+        if is_available(index['start_times'][resource['resourceid']], start, end)
+    ]
+    return 200, response_body
+
+
+# Get bookings for user
+@router.route('GET /users/{userid}/bookings')
+def get_user_bookings(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['userid'] = event['pathParameters']['userid']
+    query_parameters = event.get('queryStringParameters') or {}
+    if 'ids' in query_parameters:
+        # get requested bookings from the database, return only the ones that belong to the user
+        items, unprocessed_ids = batch_get_items(
+            dynamodb, BOOKINGS_TABLE, 'bookingid',
+            get_ids(query_parameters),
+            get_projection(query_parameters, 'bookingid', 'userid')
+        )
+        response_body = {'items': [item for item in items
+                                   if item['userid'] == event['pathParameters']['userid']]}
+        if unprocessed_ids:
+            response_body['unprocessedIds'] = unprocessed_ids
+    else:
+        # get data from the database
+        response_body = query_bookings(
+            query_parameters,
+            {'userid': event['pathParameters']['userid']},
+            IndexName='useridGSI',
+            KeyConditionExpression='userid = :userid',
+            ExpressionAttributeValues={
+                ':userid': event['pathParameters']['userid']
+            }
+        )
+    return 200, response_body
+
+
+# Booking CRUD operations
+@router.route('GET /users/{userid}/bookings/{bookingid}')
+def get_booking(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['bookingid'] = event['pathParameters']['bookingid']
+    metric_payload['userid'] = event['pathParameters']['userid']
+    # get data from the database
+    ddb_response = ddbTable.get_item(
+        Key={'bookingid': event['pathParameters']['bookingid']},
+        **get_projection(event.get('queryStringParameters') or {}, 'bookingid')
+    )
+    # return list of items instead of full DynamoDB response
+    if 'Item' in ddb_response:
+        response_body = ddb_response['Item']
+    else:
+        response_body = {}
+    return 200, response_body
+
+
+@router.route('DELETE /users/{userid}/bookings/{bookingid}')
+def delete_booking(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'DELETE'
+    metric_payload['bookingid'] = event['pathParameters']['bookingid']
+    metric_payload['userid'] = event['pathParameters']['userid']
+    # delete item in the database
+    ddb_response = ddbTable.delete_item(
+        Key={'bookingid': event['pathParameters']['bookingid']},
+        ReturnValues='ALL_OLD'
+    )
+    invalidate_availability_indexes(ddb_response.get('Attributes', {}).get('resourceid'))
+    if single_table and 'Attributes' in ddb_response:
+        delete_single_table_booking(ddb_response['Attributes'])
+    response_body = {}
+    return 200, response_body
+
+
+@router.route('PUT /users/{userid}/bookings')
+def put_booking(event, metric_payload):
+    request_json = json.loads(event['body'])
+    request_json['userid'] = event['pathParameters']['userid']
+    request_json['timestamp'] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    # generate unique id if it isn't present in the request
+    if 'bookingid' not in request_json:
+        request_json['bookingid'] = str(uuid.uuid1())
+    # generate business metrics for the route
+    metric_payload['operation'] = 'PUT'
+    metric_payload['bookingid'] = request_json['bookingid']
+    metric_payload['userid'] = event['pathParameters']['userid']
+    # update the database
+    ddbTable.put_item(
+        Item=request_json
+    )
+    invalidate_availability_indexes(request_json.get('resourceid'))
+    if single_table:
+        put_single_table_bookings([request_json])
+    response_body = request_json
+    return 200, response_body
 
 
-# JSON serializer fix, 
-# based on https://stackoverflow.com/questions/1960516/python-json-serialize-a-decimal-object
-def decimal_default_json(obj):
-    if isinstance(obj, decimal.Decimal):
-        return float(obj)
-    raise TypeError
+@router.route('PUT /users/{userid}/bookings/batch')
+def put_bookings_batch(event, metric_payload):
+    request_json = json.loads(event['body'], parse_float=decimal.Decimal)
+    if not isinstance(request_json, list) or len(request_json) > MAX_BATCH_BOOKINGS:
+        raise ValueError(f'Request body must be a list of up to {MAX_BATCH_BOOKINGS} bookings')
+    timestamp = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    results = []
+    bookings = []
+    bookingids = set()
+    for booking in request_json:
+        if not isinstance(booking, dict) or 'resourceid' not in booking or 'starttimeepochtime' not in booking:
+            results.append({'status': 'failed', 'error': 'Invalid booking', 'booking': booking})
+            continue
+        booking['userid'] = event['pathParameters']['userid']
+        booking['timestamp'] = timestamp
+        # generate unique id if it isn't present in the request
+        if 'bookingid' not in booking:
+            booking['bookingid'] = str(uuid.uuid1())
+        # BatchWriteItem rejects the whole chunk if it contains duplicate keys
+        if booking['bookingid'] in bookingids:
+            results.append({'status': 'failed', 'error': 'Duplicate bookingid', 'booking': booking})
+            continue
+        results.append({'status': 'created', 'booking': booking})
+        bookings.append(booking)
+        bookingids.add(booking['bookingid'])
+    # generate business metrics for the route
+    metric_payload['operation'] = 'PUT'
+    metric_payload['userid'] = event['pathParameters']['userid']
+    metric_payload['bookings'] = len(bookings)
+    # update the database
+    errors = batch_write_bookings(bookings)
+    for resourceid in set(booking['resourceid'] for booking in bookings):
+        invalidate_availability_indexes(resourceid)
+    if single_table:
+        put_single_table_bookings([booking for booking in bookings if booking['bookingid'] not in errors])
+    for result in results:
+        if result['status'] == 'created' and result['booking']['bookingid'] in errors:
+            result['status'] = 'failed'
+            result['error'] = errors[result['booking']['bookingid']]
+    response_body = {'items': results}
+    return 200, response_body
 
 
 @metric_scope
 def lambda_handler(event, context, metrics):
     route_key = f"{event['httpMethod']} {event['resource']}"
 
-    # Set default response, override with data from DynamoDB if any
-    response_body = {'Message': 'Unsupported route'}
-    status_code = 400
     headers = {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*'
@@ -45,96 +484,28 @@ def lambda_handler(event, context, metrics):
     # Initialize putting common business metrics using EMF
     metric_payload = {}
     metrics.put_dimensions({'Service': 'Bookings'})
+    metrics.put_dimensions({'Service': 'Bookings', 'RouteKey': route_key})
     metrics.put_metric('ProcessedBookings', 1, 'Count')
     metrics.set_property('requestId', event['requestContext']['requestId'])
     metrics.set_property('routeKey', route_key)
+    router.put_cold_start_metrics(metrics)
 
+    ddb_metrics.reset()
+    started = time.perf_counter()
     try:
-        # Get bookings for resource
-        if route_key == 'GET /locations/{locationid}/resources/{resourceid}/bookings':
-            # add business metrics for the route
-            metric_payload['operation'] = 'GET'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = event['pathParameters']['resourceid']
-            # get data from the database
-            ddb_response = ddbTable.query(
-                IndexName='bookingsByResourceByTimeGSI',
-                KeyConditionExpression='resourceid = :resourceid',
-                ExpressionAttributeValues={
-                    ':resourceid': event['pathParameters']['resourceid']
-                }
-            )
-            # return list of items instead of full DynamoDB response
-            response_body = ddb_response['Items']
-            status_code = 200
-        # Get bookings for user
-        if route_key == 'GET /users/{userid}/bookings':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'GET'
-            metric_payload['userid'] = event['pathParameters']['userid']
-            # get data from the database
-            ddb_response = ddbTable.query(
-                IndexName='useridGSI',
-                KeyConditionExpression='userid = :userid',
-                ExpressionAttributeValues={
-                    ':userid': event['pathParameters']['userid']
-                }
-            )
-            # return list of items instead of full DynamoDB response
-            response_body = ddb_response['Items']
-            status_code = 200
-        # Booking CRUD operations
-        if route_key == 'GET /users/{userid}/bookings/{bookingid}':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'GET'
-            metric_payload['bookingid'] = event['pathParameters']['bookingid']
-            metric_payload['userid'] = event['pathParameters']['userid']
-            # get data from the database
-            ddb_response = ddbTable.get_item(
-                Key={'bookingid': event['pathParameters']['bookingid']}
-            )
-            # return list of items instead of full DynamoDB response
-            if 'Item' in ddb_response:
-                response_body = ddb_response['Item']
-            else:
-                response_body = {}
-            status_code = 200
-        if route_key == 'DELETE /users/{userid}/bookings/{bookingid}':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'DELETE'
-            metric_payload['bookingid'] = event['pathParameters']['bookingid']
-            metric_payload['userid'] = event['pathParameters']['userid']
-            # delete item in the database
-            ddbTable.delete_item(
-                Key={'bookingid': event['pathParameters']['bookingid']}
-            )
-            response_body = {}
-            status_code = 200
-        if route_key == 'PUT /users/{userid}/bookings':
-            request_json = json.loads(event['body'])
-            request_json['userid'] = event['pathParameters']['userid']
-            request_json['timestamp'] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-            # generate unique id if it isn't present in the request
-            if 'bookingid' not in request_json:
-                request_json['bookingid'] = str(uuid.uuid1())
-            # generate business metrics for the route
-            metric_payload['operation'] = 'PUT'
-            metric_payload['bookingid'] = request_json['bookingid']
-            metric_payload['userid'] = event['pathParameters']['userid']
-            # update the database
-            ddbTable.put_item(
-                Item=request_json
-            )
-            response_body = request_json
-            status_code = 200
+        status_code, response_body = router.dispatch(route_key, event, metric_payload)
     except Exception as err:
         status_code = 400
         response_body = {'Error:': str(err)}
         print(str(err))
+    # Add route and DynamoDB performance metrics
+    metrics.put_metric('Latency', (time.perf_counter() - started) * 1000, 'Milliseconds')
+    ddb_metrics.put_metrics(metrics)
     # Add route specific business metrics
     metrics.set_property("Payload", metric_payload)
     return {
         'statusCode': status_code,
-        'body': json.dumps(response_body, default=decimal_default_json),
+        'body': response_body if isinstance(response_body, EncodedJSON)
+        else json.dumps(response_body, default=decimal_default_json),
         'headers': headers
     }
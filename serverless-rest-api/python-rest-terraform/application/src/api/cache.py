@@ -0,0 +1,46 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# In-memory read-through cache of DynamoDB items, kept at module scope to survive warm invocations
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    # Least recently used items are evicted above max_size, items expire ttl_seconds after they were read.
+    # Other execution environments don't see the invalidations of this one, the TTL bounds their staleness
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.items.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.items.pop(key, None)
+            self.misses += 1
+            return None
+        self.items.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, item):
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        self.items[key] = (time.monotonic() + self.ttl_seconds, item)
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    def invalidate(self, key):
+        self.items.pop(key, None)
+
+    def put_metrics(self, metrics):
+        # Hits and misses since the previous call, that is of the current request
+        if self.hits or self.misses:
+            metrics.put_metric('CacheHits', self.hits, 'Count')
+            metrics.put_metric('CacheMisses', self.misses, 'Count')
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,136 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Cascading delete of location and resource children, triggered by the tables' DynamoDB streams
+import boto3
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from aws_embedded_metrics import metric_scope
+
+# Handlers are imported from the src.api package or as top-level modules, depending on the deployment
+try:
+    from .router import patch_libraries
+except ImportError:
+    from router import patch_libraries
+
+# Patch libraries to instrument downstream calls
+patch_libraries()
+
+# Prepare DynamoDB client
+RESOURCES_TABLE = os.getenv('RESOURCES_TABLE', None)
+BOOKINGS_TABLE = os.getenv('BOOKINGS_TABLE', None)
+# Optional single-table layout, a location, its resources and bookings share the partition key
+SINGLE_TABLE = os.getenv('SINGLE_TABLE') or None
+dynamodb = boto3.resource('dynamodb')
+lambda_client = boto3.client('lambda')
+
+# Children are read a page at a time and deleted in BatchWriteItem calls of up to 25 items
+CASCADE_DELETE_PAGE_SIZE = 500
+CASCADE_DELETE_WORKERS = int(os.getenv('CASCADE_DELETE_WORKERS', '4'))
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_RETRIES = 5
+BATCH_WRITE_BACKOFF_SECONDS = 0.05
+# Stop before the function times out, remaining children are deleted by a new asynchronous invocation
+CASCADE_DELETE_TIME_MARGIN_MILLIS = 10000
+
+
+def batch_delete(table_name, keys):
+    # Delete items in one BatchWriteItem call, retry unprocessed items with exponential backoff and jitter.
+    # Returns the number of deleted items
+    request_items = [{'DeleteRequest': {'Key': key}} for key in keys]
+    for attempt in range(BATCH_WRITE_MAX_RETRIES + 1):
+        # the low level client is thread safe, resource objects are not
+        ddb_response = dynamodb.meta.client.batch_write_item(RequestItems={table_name: request_items})
+        request_items = ddb_response.get('UnprocessedItems', {}).get(table_name, [])
+        if not request_items:
+            return len(keys)
+        if attempt < BATCH_WRITE_MAX_RETRIES:
+            time.sleep(BATCH_WRITE_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1))
+    raise RuntimeError(f'{len(request_items)} items were not deleted from {table_name}')
+
+
+def delete_children(table_name, key_names, context, **query_args):
+    # Find children page by page and delete them with bounded concurrency.
+    # Deleted items are not found again, so an interrupted cascade resumes where it stopped.
+    # Returns the number of deleted items and whether all children were deleted
+    deleted = 0
+    query_args['ProjectionExpression'] = ', '.join(key_names)
+    with ThreadPoolExecutor(max_workers=CASCADE_DELETE_WORKERS) as executor:
+        while True:
+            ddb_response = dynamodb.meta.client.query(TableName=table_name, Limit=CASCADE_DELETE_PAGE_SIZE,
+                                                      **query_args)
+            keys = [{name: item[name] for name in key_names} for item in ddb_response['Items']]
+            chunks = [keys[i:i + BATCH_WRITE_SIZE] for i in range(0, len(keys), BATCH_WRITE_SIZE)]
+            deleted += sum(executor.map(lambda chunk: batch_delete(table_name, chunk), chunks))
+            if 'LastEvaluatedKey' not in ddb_response:
+                return deleted, True
+            print(f'Deleted {deleted} items from {table_name}, continuing')
+            if context.get_remaining_time_in_millis() < CASCADE_DELETE_TIME_MARGIN_MILLIS:
+                return deleted, False
+            query_args['ExclusiveStartKey'] = ddb_response['LastEvaluatedKey']
+
+
+def delete_location_children(locationid, context, metrics):
+    # Resources are deleted here, their removal is streamed back to this function to delete their bookings
+    deleted, completed = delete_children(
+        RESOURCES_TABLE, ['resourceid'], context,
+        IndexName='locationidGSI',
+        KeyConditionExpression='locationid = :locationid',
+        ExpressionAttributeValues={':locationid': locationid}
+    )
+    metrics.put_metric('CascadeDeletedResources', deleted, 'Count')
+    print(f'Deleted {deleted} resources of location {locationid}')
+    if completed and SINGLE_TABLE:
+        deleted, completed = delete_children(
+            SINGLE_TABLE, ['PK', 'SK'], context,
+            KeyConditionExpression='PK = :pk',
+            ExpressionAttributeValues={':pk': f'LOCATION#{locationid}'}
+        )
+        print(f'Deleted {deleted} single table items of location {locationid}')
+    return completed
+
+
+def delete_resource_children(resourceid, locationid, context, metrics):
+    deleted, completed = delete_children(
+        BOOKINGS_TABLE, ['bookingid'], context,
+        IndexName='bookingsByResourceByTimeGSI',
+        KeyConditionExpression='resourceid = :resourceid',
+        ExpressionAttributeValues={':resourceid': resourceid}
+    )
+    metrics.put_metric('CascadeDeletedBookings', deleted, 'Count')
+    print(f'Deleted {deleted} bookings of resource {resourceid}')
+    if completed and SINGLE_TABLE and locationid:
+        deleted, completed = delete_children(
+            SINGLE_TABLE, ['PK', 'SK'], context,
+            KeyConditionExpression='PK = :pk AND begins_with(SK, :sk)',
+            ExpressionAttributeValues={':pk': f'LOCATION#{locationid}', ':sk': f'BOOKING#{resourceid}#'}
+        )
+        print(f'Deleted {deleted} single table items of resource {resourceid}')
+    return completed
+
+
+@metric_scope
+def lambda_handler(event, context, metrics):
+    metrics.put_dimensions({'Service': 'Cascade'})
+    for index, record in enumerate(event['Records']):
+        if record['eventName'] != 'REMOVE':
+            continue
+        keys = record['dynamodb']['Keys']
+        if 'resourceid' in keys:
+            old_image = record['dynamodb'].get('OldImage', {})
+            completed = delete_resource_children(keys['resourceid']['S'],
+                                                 old_image.get('locationid', {}).get('S'), context, metrics)
+        else:
+            completed = delete_location_children(keys['locationid']['S'], context, metrics)
+        if not completed:
+            # continue with this and the following records in a new invocation. Stopping in time is not
+            # a failure, it must not use up the retry attempts of the stream, those are left for errors
+            print(f"Cascade stopped at record {record['dynamodb']['SequenceNumber']}, continuing asynchronously")
+            lambda_client.invoke(FunctionName=context.invoked_function_arn, InvocationType='Event',
+                                 Payload=json.dumps({'Records': event['Records'][index:]}))
+            return {'batchItemFailures': []}
+    return {'batchItemFailures': []}
@@ -0,0 +1,102 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# JSON encoding of responses. The optional fast path of the list routes reads items with the low-level client,
+# in DynamoDB JSON, and encodes them to the response directly instead of deserializing them to Python types first
+import base64
+import decimal
+import json
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+# JSON serializer fix,
+# based on https://stackoverflow.com/questions/1960516/python-json-serialize-a-decimal-object
+def decimal_default_json(obj):
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    raise TypeError
+
+
+class EncodedJSON(str):
+    # Response body that is already encoded as JSON
+    pass
+
+
+encode_json_string = json.encoder.encode_basestring_ascii
+
+
+def encode_attribute_value(value):
+    # Encode a DynamoDB AttributeValue as JSON, numbers are copied as sent by DynamoDB
+    (data_type, data), = value.items()
+    if data_type == 'S':
+        return encode_json_string(data)
+    if data_type == 'N':
+        return data
+    if data_type == 'M':
+        return encode_item(data)
+    if data_type == 'L':
+        return '[' + ','.join([encode_attribute_value(element) for element in data]) + ']'
+    if data_type == 'BOOL':
+        return 'true' if data else 'false'
+    if data_type == 'NULL':
+        return 'null'
+    if data_type == 'SS':
+        return '[' + ','.join([encode_json_string(element) for element in data]) + ']'
+    if data_type == 'NS':
+        return '[' + ','.join(data) + ']'
+    # binary values are returned as base64 encoded strings
+    if data_type == 'B':
+        return '"' + base64.b64encode(data).decode('ascii') + '"'
+    if data_type == 'BS':
+        return '[' + ','.join(['"' + base64.b64encode(element).decode('ascii') + '"' for element in data]) + ']'
+    raise TypeError(f'Unsupported attribute type {data_type}')
+
+
+def encode_item(item):
+    return '{' + ','.join([encode_json_string(name) + ':' + encode_attribute_value(value)
+                           for name, value in item.items()]) + '}'
+
+
+def serialize_item(item):
+    return {name: serializer.serialize(value) for name, value in item.items()}
+
+
+def deserialize_item(item):
+    return {name: deserializer.deserialize(value) for name, value in item.items()}
+
+
+def encode_page(items_json, next_token=None):
+    # Encode a page of the paginated list routes, items_json is the page items encoded as a JSON list
+    if next_token is None:
+        return EncodedJSON('{"items":' + items_json + '}')
+    return EncodedJSON('{"items":' + items_json + ',"nextToken":' + encode_json_string(next_token) + '}')
+
+
+def query_json(ddb_client, table_name, **query_args):
+    # Low-level client version of a single page query, returns the items encoded as a JSON list and the
+    # LastEvaluatedKey of the page, or None if it is the last one. Keys are passed and returned as Python types
+    query_args['TableName'] = table_name
+    query_args['ExpressionAttributeValues'] = serialize_item(query_args['ExpressionAttributeValues'])
+    if 'ExclusiveStartKey' in query_args:
+        query_args['ExclusiveStartKey'] = serialize_item(query_args['ExclusiveStartKey'])
+    ddb_response = ddb_client.query(**query_args)
+    items_json = EncodedJSON('[' + ','.join([encode_item(item) for item in ddb_response['Items']]) + ']')
+    if 'LastEvaluatedKey' not in ddb_response:
+        return items_json, None
+    return items_json, deserialize_item(ddb_response['LastEvaluatedKey'])
+
+
+def scan_json(ddb_client, table_name, **scan_args):
+    # Low-level client version of a single page scan, returns the same values as query_json
+    scan_args['TableName'] = table_name
+    if 'ExclusiveStartKey' in scan_args:
+        scan_args['ExclusiveStartKey'] = serialize_item(scan_args['ExclusiveStartKey'])
+    ddb_response = ddb_client.scan(**scan_args)
+    items_json = EncodedJSON('[' + ','.join([encode_item(item) for item in ddb_response['Items']]) + ']')
+    if 'LastEvaluatedKey' not in ddb_response:
+        return items_json, None
+    return items_json, deserialize_item(ddb_response['LastEvaluatedKey'])
@@ -0,0 +1,25 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Sparse fieldsets of the GET routes, the fields query parameter lists the attributes to return
+
+
+def get_projection(query_parameters, *required_fields):
+    # Return only the requested fields, key attributes are always included.
+    # Attribute names are passed as placeholders as they may be DynamoDB reserved words
+    if not query_parameters.get('fields'):
+        return {}
+    fields = list(dict.fromkeys(list(required_fields) +
+                                [f.strip() for f in query_parameters['fields'].split(',') if f.strip()]))
+    return {
+        'ProjectionExpression': ', '.join(f'#f{i}' for i in range(len(fields))),
+        'ExpressionAttributeNames': {f'#f{i}': field for i, field in enumerate(fields)}
+    }
+
+
+def project_item(item, query_parameters, *required_fields):
+    # Same fields as get_projection, picked from an item that was read in full
+    if not query_parameters.get('fields'):
+        return dict(item)
+    fields = list(required_fields) + [f.strip() for f in query_parameters['fields'].split(',') if f.strip()]
+    return {field: item[field] for field in fields if field in item}
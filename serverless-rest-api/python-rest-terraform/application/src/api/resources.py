@@ -2,6 +2,11 @@
 # SPDX-License-Identifier: MIT-0
 
 # Implementation of the API backend for resources
+import time
+
+# Module initialization time is measured from here, see Router.put_cold_start_metrics
+init_started = time.perf_counter()
+
 import boto3
 import json
 import os
@@ -10,105 +15,195 @@ from datetime import datetime
 
 from aws_embedded_metrics import metric_scope
 
+# Handlers are imported from the src.api package or as top-level modules, depending on the deployment
+try:
+    from .bulk_get import batch_get_items, get_ids
+    from .cache import TTLCache
+    from .etag import conditional_get
+    from .fast_json import EncodedJSON, query_json
+    from .fields import get_projection, project_item
+    from .router import DynamoDBMetrics, Router, patch_libraries
+except ImportError:
+    from bulk_get import batch_get_items, get_ids
+    from cache import TTLCache
+    from etag import conditional_get
+    from fast_json import EncodedJSON, query_json
+    from fields import get_projection, project_item
+    from router import DynamoDBMetrics, Router, patch_libraries
+
 # Patch libraries to instrument downstream calls
-# See https://docs.aws.amazon.com/xray/latest/devguide/xray-sdk-python-patching.html for more details
-from aws_xray_sdk.core import patch_all
-patch_all()
+patch_libraries()
+router = Router(init_started)
 
 # Prepare DynamoDB client
 RESOURCES_TABLE = os.getenv('RESOURCES_TABLE', None)
 dynamodb = boto3.resource('dynamodb')
 ddbTable = dynamodb.Table(RESOURCES_TABLE)
+# Optional single-table layout, a location, its resources and bookings share the partition key
+SINGLE_TABLE = os.getenv('SINGLE_TABLE') or None
+single_table = dynamodb.Table(SINGLE_TABLE) if SINGLE_TABLE else None
+# Optional fast path for list responses, the low-level client returns items in DynamoDB JSON
+# that is encoded to the response directly instead of being deserialized to Python types first
+FAST_JSON_RESPONSES = os.getenv('FAST_JSON_RESPONSES', 'false') == 'true'
+ddb_client = boto3.client('dynamodb') if FAST_JSON_RESPONSES else None
+# Measure the DynamoDB calls of every request
+ddb_metrics = DynamoDBMetrics()
+ddb_metrics.instrument(dynamodb.meta.client)
+if ddb_client:
+    ddb_metrics.instrument(ddb_client)
+
+# Read-through cache of single resource lookups, writes of this execution environment invalidate it
+CACHE_MAX_ITEMS = int(os.getenv('CACHE_MAX_ITEMS', '1000'))
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', '60'))
+resource_cache = TTLCache(CACHE_MAX_ITEMS, CACHE_TTL_SECONDS)
+
+
+# Get all resources
+@router.route('GET /locations/{locationid}/resources')
+def get_resources(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    query_parameters = event.get('queryStringParameters') or {}
+    if 'ids' in query_parameters:
+        # get requested resources from the database, return only the ones in the location
+        items, unprocessed_ids = batch_get_items(
+            dynamodb, RESOURCES_TABLE, 'resourceid',
+            get_ids(query_parameters),
+            get_projection(query_parameters, 'resourceid', 'locationid')
+        )
+        response_body = {'items': [item for item in items
+                                   if item['locationid'] == event['pathParameters']['locationid']]}
+        if unprocessed_ids:
+            response_body['unprocessedIds'] = unprocessed_ids
+    else:
+        query_args = dict(
+            IndexName='locationidGSI',
+            KeyConditionExpression='locationid = :locationid',
+            ExpressionAttributeValues={
+                ':locationid': event['pathParameters']['locationid']
+            },
+            **get_projection(query_parameters, 'resourceid', 'locationid')
+        )
+        if FAST_JSON_RESPONSES:
+            response_body, _ = query_json(ddb_client, RESOURCES_TABLE, **query_args)
+        else:
+            # get data from the database
+            ddb_response = ddbTable.query(**query_args)
+            # return list of items instead of full DynamoDB response
+            response_body = ddb_response['Items']
+    return 200, response_body
+
+
+# Resource CRUD operations
+@router.route('GET /locations/{locationid}/resources/{resourceid}')
+def get_resource(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'GET'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = event['pathParameters']['resourceid']
+    # read through the resource cache, projections are applied to the cached item
+    resourceid = event['pathParameters']['resourceid']
+    item = resource_cache.get(resourceid)
+    if item is None:
+        item = ddbTable.get_item(Key={'resourceid': resourceid}).get('Item')
+        if item:
+            resource_cache.put(resourceid, item)
+    query_parameters = event.get('queryStringParameters') or {}
+    response_body = project_item(item, query_parameters, 'resourceid', 'locationid') if item else {}
+    return 200, response_body
+
+
+@router.route('DELETE /locations/{locationid}/resources/{resourceid}')
+def delete_resource(event, metric_payload):
+    # generate business metrics for the route
+    metric_payload['operation'] = 'DELETE'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = event['pathParameters']['resourceid']
+    # delete item in the database
+    ddbTable.delete_item(
+        Key={'resourceid': event['pathParameters']['resourceid']}
+    )
+    resource_cache.invalidate(event['pathParameters']['resourceid'])
+    if single_table:
+        single_table.delete_item(
+            Key={
+                'PK': f"LOCATION#{event['pathParameters']['locationid']}",
+                'SK': f"RESOURCE#{event['pathParameters']['resourceid']}"
+            }
+        )
+    response_body = {}
+    return 200, response_body
+
+
+@router.route('PUT /locations/{locationid}/resources')
+def put_resource(event, metric_payload):
+    request_json = json.loads(event['body'])
+    request_json['locationid'] = event['pathParameters']['locationid']
+    request_json['timestamp'] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    # generate unique id if it isn't present in the request
+    if 'resourceid' not in request_json:
+        request_json['resourceid'] = str(uuid.uuid1())
+    # generate business metrics for the route
+    metric_payload['operation'] = 'DELETE'
+    metric_payload['locationid'] = event['pathParameters']['locationid']
+    metric_payload['resourceid'] = request_json['resourceid']
+    # update the database
+    ddbTable.put_item(
+        Item=request_json
+    )
+    resource_cache.invalidate(request_json['resourceid'])
+    if single_table:
+        single_table.put_item(
+            Item=dict(
+                request_json,
+                PK=f"LOCATION#{request_json['locationid']}",
+                SK=f"RESOURCE#{request_json['resourceid']}"
+            )
+        )
+    response_body = request_json
+    return 200, response_body
 
 
 @metric_scope
 def lambda_handler(event, context, metrics):
     route_key = f"{event['httpMethod']} {event['resource']}"
 
-    # Set default response, override with data from DynamoDB if any
-    response_body = {'Message': 'Unsupported route'}
-    status_code = 400
     headers = {
         'Content-Type': 'application/json',
-        'Access-Control-Allow-Origin': '*'
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag'
         }
 
     # Initialize putting common business metrics using EMF
     metric_payload = {}
     metrics.put_dimensions({'Service': 'Resources'})
+    metrics.put_dimensions({'Service': 'Resources', 'RouteKey': route_key})
     metrics.put_metric('ProcessedResources', 1, 'Count')
     metrics.set_property('requestId', event['requestContext']['requestId'])
     metrics.set_property('routeKey', route_key)
+    router.put_cold_start_metrics(metrics)
 
+    ddb_metrics.reset()
+    started = time.perf_counter()
     try:
-        # Get all resources
-        if route_key == 'GET /locations/{locationid}/resources':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'GET'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            # get data from the database
-            ddb_response = ddbTable.query(
-                IndexName='locationidGSI',
-                KeyConditionExpression='locationid = :locationid',
-                ExpressionAttributeValues={
-                    ':locationid': event['pathParameters']['locationid']
-                }
-            )
-            # return list of items instead of full DynamoDB response
-            response_body = ddb_response['Items']
-            status_code = 200
-        # Resource CRUD operations
-        if route_key == 'GET /locations/{locationid}/resources/{resourceid}':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'GET'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = event['pathParameters']['resourceid']
-            # get data from the database
-            ddb_response = ddbTable.get_item(
-                Key={'resourceid': event['pathParameters']['resourceid']}
-            )
-            # return list of items instead of full DynamoDB response
-            if 'Item' in ddb_response:
-                response_body = ddb_response['Item']
-            else:
-                response_body = {}
-            status_code = 200
-        if route_key == 'DELETE /locations/{locationid}/resources/{resourceid}':
-            # generate business metrics for the route
-            metric_payload['operation'] = 'DELETE'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = event['pathParameters']['resourceid']
-            # delete item in the database
-            ddbTable.delete_item(
-                Key={'resourceid': event['pathParameters']['resourceid']}
-            )
-            response_body = {}
-            status_code = 200
-        if route_key == 'PUT /locations/{locationid}/resources':
-            request_json = json.loads(event['body'])
-            request_json['locationid'] = event['pathParameters']['locationid']
-            request_json['timestamp'] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-            # generate unique id if it isn't present in the request
-            if 'resourceid' not in request_json:
-                request_json['resourceid'] = str(uuid.uuid1())
-            # generate business metrics for the route
-            metric_payload['operation'] = 'DELETE'
-            metric_payload['locationid'] = event['pathParameters']['locationid']
-            metric_payload['resourceid'] = request_json['resourceid']
-            # update the database
-            ddbTable.put_item(
-                Item=request_json
-            )
-            response_body = request_json
-            status_code = 200
+        status_code, response_body = router.dispatch(route_key, event, metric_payload)
     except Exception as err:
         status_code = 400
         response_body = {'Error:': str(err)}
         print(str(err))
+    # Add route and DynamoDB performance metrics
+    metrics.put_metric('Latency', (time.perf_counter() - started) * 1000, 'Milliseconds')
+    ddb_metrics.put_metrics(metrics)
+    resource_cache.put_metrics(metrics)
     # Add route specific business metrics
     metrics.set_property("Payload", metric_payload)
-    return {
+    response = {
         'statusCode': status_code,
-        'body': json.dumps(response_body),
+        'body': response_body if isinstance(response_body, EncodedJSON) else json.dumps(response_body),
         'headers': headers
     }
+    # Let clients revalidate unchanged entities with If-None-Match
+    if route_key.startswith('GET '):
+        response = conditional_get(event, response)
+    return response
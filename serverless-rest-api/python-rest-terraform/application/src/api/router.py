@@ -0,0 +1,97 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Routing and initialization shared by the API handlers
+import os
+import threading
+import time
+
+
+def patch_libraries():
+    # Patch only botocore, patch_all() tries to import every library the X-Ray SDK supports.
+    # The SDK isn't imported at all when tracing is disabled with AWS_XRAY_SDK_ENABLED=false
+    # See https://docs.aws.amazon.com/xray/latest/devguide/xray-sdk-python-patching.html for more details
+    if os.getenv('AWS_XRAY_SDK_ENABLED', 'true').lower() == 'false':
+        return
+    from aws_xray_sdk.core import patch
+    patch(['botocore'])
+
+
+class Router:
+    # Dispatch table of route handlers indexed by route key.
+    # Route handlers take the event and the business metrics payload and return status code and response body
+    def __init__(self, init_started):
+        self.routes = {}
+        self.init_started = init_started
+        self.cold_start = True
+
+    def route(self, route_key):
+        def register(handler):
+            self.routes[route_key] = handler
+            return handler
+        return register
+
+    def dispatch(self, route_key, event, metric_payload):
+        handler = self.routes.get(route_key)
+        if handler is None:
+            return 400, {'Message': 'Unsupported route'}
+        return handler(event, metric_payload)
+
+    def put_cold_start_metrics(self, metrics):
+        # Report time from the start of the handler module import to its first invocation
+        metrics.set_property('coldStart', self.cold_start)
+        if self.cold_start:
+            self.cold_start = False
+            metrics.put_metric('InitDuration', (time.perf_counter() - self.init_started) * 1000, 'Milliseconds')
+
+
+class DynamoDBMetrics:
+    # Latency, item count and consumed capacity of the DynamoDB calls made while handling a request.
+    # Calls are measured with botocore event hooks, so every call made through an instrumented client is
+    # included, from worker threads as well
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.latency = 0.0
+        self.items = 0
+        self.consumed_capacity = 0.0
+
+    def instrument(self, client):
+        client.meta.events.register('provide-client-params.dynamodb.*', self.request_consumed_capacity)
+        client.meta.events.register('before-call.dynamodb.*', self.start_call)
+        client.meta.events.register('after-call.dynamodb.*', self.end_call)
+
+    def request_consumed_capacity(self, params, model, **kwargs):
+        if 'ReturnConsumedCapacity' in model.input_shape.members:
+            params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    def start_call(self, context, **kwargs):
+        context['started'] = time.perf_counter()
+
+    def end_call(self, parsed, context, **kwargs):
+        latency = (time.perf_counter() - context['started']) * 1000
+        if 'Count' in parsed:
+            items = parsed['Count']
+        elif 'Responses' in parsed:
+            items = sum(len(table_items) for table_items in parsed['Responses'].values())
+        else:
+            items = 1 if 'Item' in parsed else 0
+        # single item operations return one ConsumedCapacity, batch operations a list with one per table
+        consumed_capacity = parsed.get('ConsumedCapacity') or []
+        if isinstance(consumed_capacity, dict):
+            consumed_capacity = [consumed_capacity]
+        with self.lock:
+            self.calls += 1
+            self.latency += latency
+            self.items += items
+            self.consumed_capacity += sum(capacity.get('CapacityUnits', 0) for capacity in consumed_capacity)
+
+    def put_metrics(self, metrics):
+        if self.calls:
+            metrics.put_metric('DynamoDBCalls', self.calls, 'Count')
+            metrics.put_metric('DynamoDBLatency', self.latency, 'Milliseconds')
+            metrics.put_metric('DynamoDBItems', self.items, 'Count')
+            metrics.put_metric('DynamoDBConsumedCapacity', self.consumed_capacity, 'Count')
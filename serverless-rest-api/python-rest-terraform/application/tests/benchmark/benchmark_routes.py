@@ -0,0 +1,252 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Runs every route of the locations, resources and bookings handlers against moto's in-memory DynamoDB
+# at several table sizes and reports latency percentiles, allocations and peak memory per route.
+# Each run is appended to tests/benchmark/results.jsonl and compared with the previous run in the file,
+# the benchmark exits with status 1 when the p95 latency of a route regressed by more than REGRESSION_RATIO.
+# Latencies include the in-memory DynamoDB calls, compare them between runs rather than with deployed functions
+# Run from the project root: python -m tests.benchmark.benchmark_routes
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import boto3
+from moto import mock_aws
+
+for name, value in {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'AWS_XRAY_SDK_ENABLED': 'false',
+    'AWS_EMF_ENVIRONMENT': 'Local',
+    'LOCATIONS_TABLE': 'Locations',
+    'RESOURCES_TABLE': 'Resources',
+    'BOOKINGS_TABLE': 'Bookings'
+}.items():
+    os.environ.setdefault(name, value)
+
+ITERATIONS = 50
+TABLE_SIZES = [100, 1000]
+RESULTS_FILE = os.getenv('BENCHMARK_RESULTS', 'tests/benchmark/results.jsonl')
+REGRESSION_RATIO = 1.25
+LOCATION_ID = 'f8216640-91a2-11eb-8ab9-57aa454facef'
+RESOURCE_ID = '86f0b180-9be1-11eb-a305-35487c0301a7'
+USER_ID = 'bf6dbddc-db2e-4f70-a892-1b165556dede'
+BOOKING_ID = '1f290bf0-9be2-11eb-9326-b188c945553f'
+FIRST_BOOKING_TIME = 1617278400
+PATH_PARAMETERS = {'locationid': LOCATION_ID, 'resourceid': RESOURCE_ID, 'userid': USER_ID, 'bookingid': BOOKING_ID}
+
+
+def new_bookings(event, iteration):
+    # Booking requests get free slots after the existing bookings, so every iteration creates new bookings
+    body = json.loads(event['body'])
+    bookings = body if isinstance(body, list) else [body]
+    for i, booking in enumerate(bookings):
+        booking['resourceid'] = RESOURCE_ID
+        booking['starttimeepochtime'] = FIRST_BOOKING_TIME + (100000 + iteration * len(bookings) + i) * 3600
+    return dict(event, body=json.dumps(body))
+
+
+# Handler, event file and optional event preparation of each route, the DELETE routes come last
+ROUTES = [
+    ('locations', 'event-get-all-locations.json', None),
+    ('locations', 'event-get-location-by-id.json', None),
+    ('locations', 'event-put-location.json', None),
+    ('resources', 'event-get-resources-by-location.json', None),
+    ('resources', 'event-get-resource-by-id.json', None),
+    ('resources', 'event-put-resource.json', None),
+    ('bookings', 'event-get-bookings-by-resource.json', None),
+    ('bookings', 'event-get-bookings-by-user.json', None),
+    ('bookings', 'event-get-booking-by-id.json', None),
+    ('bookings', 'event-get-availability.json', None),
+    ('bookings', 'event-put-booking.json', new_bookings),
+    ('bookings', 'event-put-bookings-batch.json', new_bookings),
+    ('bookings', 'event-delete-booking.json', None),
+    ('resources', 'event-delete-resource.json', None),
+    ('locations', 'event-delete-location.json', None)
+]
+
+
+def create_tables(dynamodb):
+    throughput = {'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+
+    def index(name, *key):
+        return {
+            'IndexName': name,
+            'KeySchema': [{'AttributeName': key[0], 'KeyType': 'HASH'}] +
+                         [{'AttributeName': attribute, 'KeyType': 'RANGE'} for attribute in key[1:]],
+            'Projection': {'ProjectionType': 'ALL'},
+            'ProvisionedThroughput': throughput
+        }
+
+    dynamodb.create_table(
+        TableName=os.environ['LOCATIONS_TABLE'],
+        KeySchema=[{'AttributeName': 'locationid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'locationid', 'AttributeType': 'S'}],
+        ProvisionedThroughput=throughput
+    )
+    dynamodb.create_table(
+        TableName=os.environ['RESOURCES_TABLE'],
+        KeySchema=[{'AttributeName': 'resourceid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'resourceid', 'AttributeType': 'S'},
+            {'AttributeName': 'locationid', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[index('locationidGSI', 'locationid')],
+        ProvisionedThroughput=throughput
+    )
+    dynamodb.create_table(
+        TableName=os.environ['BOOKINGS_TABLE'],
+        KeySchema=[{'AttributeName': 'bookingid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'bookingid', 'AttributeType': 'S'},
+            {'AttributeName': 'userid', 'AttributeType': 'S'},
+            {'AttributeName': 'resourceid', 'AttributeType': 'S'},
+            {'AttributeName': 'starttimeepochtime', 'AttributeType': 'N'}
+        ],
+        GlobalSecondaryIndexes=[
+            index('useridGSI', 'userid'),
+            index('bookingsByResourceByTimeGSI', 'resourceid', 'starttimeepochtime'),
+            index('bookingsByUserByTimeGSI', 'userid', 'starttimeepochtime')
+        ],
+        ProvisionedThroughput=throughput
+    )
+
+
+def put_items(dynamodb, size):
+    # size locations, size resources in the benchmarked location and size bookings of the benchmarked resource
+    timestamp = '2021-03-30T21:57:49.860Z'
+    with dynamodb.Table(os.environ['LOCATIONS_TABLE']).batch_writer() as batch:
+        for i in range(size):
+            batch.put_item(Item={'locationid': LOCATION_ID if i == 0 else f'location-{i}',
+                                 'name': f'Location {i}', 'description': 'Las Vegas', 'timestamp': timestamp})
+    with dynamodb.Table(os.environ['RESOURCES_TABLE']).batch_writer() as batch:
+        for i in range(size):
+            batch.put_item(Item={'resourceid': RESOURCE_ID if i == 0 else f'resource-{i}', 'locationid': LOCATION_ID,
+                                 'name': f'Room {i}', 'type': 'room', 'timestamp': timestamp})
+    with dynamodb.Table(os.environ['BOOKINGS_TABLE']).batch_writer() as batch:
+        for i in range(size):
+            batch.put_item(Item={'bookingid': BOOKING_ID if i == 0 else f'booking-{i}', 'resourceid': RESOURCE_ID,
+                                 'userid': USER_ID, 'starttimeepochtime': FIRST_BOOKING_TIME + i * 3600,
+                                 'timestamp': timestamp})
+
+
+def load_event(event_file):
+    with open(os.path.join('events', event_file), 'r') as f:
+        event = json.load(f)
+    if event.get('pathParameters'):
+        event['pathParameters'] = {name: PATH_PARAMETERS[name] for name in event['pathParameters']}
+    return event
+
+
+def route_key(event):
+    return event.get('routeKey') or f"{event['httpMethod']} {event['resource']}"
+
+
+def invoke(handler, event):
+    # The handlers print their EMF metrics, keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        return handler.lambda_handler(event, None)
+
+
+def run(handler, event, prepare):
+    latencies = []
+    for i in range(ITERATIONS):
+        request = prepare(event, i) if prepare else event
+        start = time.perf_counter()
+        response = invoke(handler, request)
+        latencies.append((time.perf_counter() - start) * 1000)
+    # Allocations are traced in a separate request, tracing slows the allocating code down
+    request = prepare(event, ITERATIONS) if prepare else event
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    traced = tracemalloc.get_traced_memory()[0]
+    invoke(handler, request)
+    peak = tracemalloc.get_traced_memory()[1] - traced
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocations = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {
+        'status': response['statusCode'],
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(percentiles[94], 2),
+        'p99_ms': round(percentiles[98], 2),
+        'allocations': allocations,
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+
+def previous_run():
+    if not os.path.exists(RESULTS_FILE):
+        return {}
+    with open(RESULTS_FILE, 'r') as f:
+        lines = [line for line in f if line.strip()]
+    if not lines:
+        return {}
+    return {(result['route'], result['items']): result for result in json.loads(lines[-1])['results']}
+
+
+def save_run(results):
+    with open(RESULTS_FILE, 'a') as f:
+        f.write(json.dumps({
+            'started': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'iterations': ITERATIONS,
+            'results': results
+        }) + '\n')
+
+
+def delete_tables(dynamodb):
+    for table in ['LOCATIONS_TABLE', 'RESOURCES_TABLE', 'BOOKINGS_TABLE']:
+        dynamodb.Table(os.environ[table]).delete()
+
+
+def compare(result, previous, regressions):
+    last = previous.get((result['route'], result['items']))
+    if not last:
+        return ''
+    ratio = result['p95_ms'] / last['p95_ms'] if last['p95_ms'] else 1
+    if ratio > REGRESSION_RATIO:
+        regressions.append(result['route'])
+        return f'{(ratio - 1) * 100:+.0f}% !'
+    return f'{(ratio - 1) * 100:+.0f}%'
+
+
+if __name__ == '__main__':
+    previous = previous_run()
+    results = []
+    regressions = []
+    print(f"{'route':<62}{'items':>7}{'status':>8}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}"
+          f"{'allocs':>9}{'peak (KB)':>11}{'p95 vs last':>13}")
+    # The handlers create their DynamoDB clients on import, import them with the in-memory DynamoDB started
+    with mock_aws():
+        from src.api import bookings, locations, resources
+        handlers = {'locations': locations, 'resources': resources, 'bookings': bookings}
+        dynamodb = boto3.resource('dynamodb')
+        for size in TABLE_SIZES:
+            create_tables(dynamodb)
+            put_items(dynamodb, size)
+            locations.location_cache.items.clear()
+            resources.resource_cache.items.clear()
+            for handler_name, event_file, prepare in ROUTES:
+                event = load_event(event_file)
+                result = dict(run(handlers[handler_name], event, prepare), route=route_key(event), items=size)
+                results.append(result)
+                print(f"{result['route']:<62}{size:>7}{result['status']:>8}{result['p50_ms']:>10}"
+                      f"{result['p95_ms']:>10}{result['p99_ms']:>10}{result['allocations']:>9}"
+                      f"{result['peak_kb']:>11}{compare(result, previous, regressions):>13}")
+            delete_tables(dynamodb)
+    save_run(results)
+    if regressions:
+        print(f'p95 latency regressed by more than {(REGRESSION_RATIO - 1) * 100:.0f}% on {len(regressions)} routes')
+        sys.exit(1)
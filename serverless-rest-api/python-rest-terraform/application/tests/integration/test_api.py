@@ -42,7 +42,7 @@ def test_get_list_of_locations_by_regular_user(global_config):
     )
     assert response.status_code == 200
     data = json.loads(response.text)
-    assert data == []
+    assert data == {'items': []}
 
 
 def test_deny_put_location_by_regular_user(global_config):
@@ -172,7 +172,7 @@ def test_get_list_of_bookings_for_resource_by_regular_user(global_config):
     )
     assert response.status_code == 200
     data = json.loads(response.text)
-    assert data == []
+    assert data == {'items': []}
 
 
 def test_deny_put_booking_for_somebody_else(global_config):
@@ -223,7 +223,7 @@ def test_get_list_of_bookings_for_yourself(global_config):
     )
     assert response.status_code == 200
     data = json.loads(response.text)
-    assert data == []
+    assert data == {'items': []}
 
 
 def test_allow_put_booking_for_yourself(global_config):
@@ -250,7 +250,7 @@ def test_get_list_of_bookings_for_resource_after_adding_booking_for_user(global_
                  'X-Api-Key': global_config["enterpriseUsagePlanApiKeyValue"]}
     )
     assert response.status_code == 200
-    data = (json.loads(response.text))[0]
+    data = (json.loads(response.text))['items'][0]
     assert data['userid'] == global_config["regularUserSub"]
 
 
@@ -261,7 +261,7 @@ def test_get_list_of_bookings_for_yourself_after_adding_booking_for_user(global_
                  'X-Api-Key': global_config["enterpriseUsagePlanApiKeyValue"]}
     )
     assert response.status_code == 200
-    data = (json.loads(response.text))[0]
+    data = (json.loads(response.text))['items'][0]
     assert data['userid'] == global_config["regularUserSub"]
 
 
@@ -9,7 +9,12 @@ import boto3
 import pytest
 from moto import mock_aws
 
+from src.api import bulk_get
+
 BOOKINGS_MOCK_TABLE_NAME = 'Bookings'
+RESOURCES_MOCK_TABLE_NAME = 'Resources'
+SINGLE_TABLE_MOCK_NAME = 'Single'
+LOCATION_MOCK_VALUE = 'f8216640-91a2-11eb-8ab9-57aa454facef'
 UUID_MOCK_VALUE = '13245678-1234-5678-1234-123456789012'
 
 
@@ -153,7 +158,7 @@ def test_get_bookings_by_user():
         ret = bookings.lambda_handler(apigw_event, '')
         assert ret['statusCode'] == 200
         data = json.loads(ret['body'])
-        assert data == expected_response
+        assert data == {'items': expected_response}
 
 
 def test_get_bookings_by_resource():
@@ -173,7 +178,169 @@ def test_get_bookings_by_resource():
         ret = bookings.lambda_handler(apigw_event, '')
         assert ret['statusCode'] == 200
         data = json.loads(ret['body'])
-        assert data == expected_response
+        assert data == {'items': expected_response}
+
+def test_get_bookings_by_resource_time_range():
+    with setup_test_environment():
+        from src.api import bookings
+        table = boto3.resource('dynamodb').Table(BOOKINGS_MOCK_TABLE_NAME)
+        for i, starttime in enumerate([1617285600, 1617364800]):
+            table.put_item(
+                Item={
+                    'bookingid': f'booking-{i}',
+                    'resourceid': '86f0b180-9be1-11eb-a305-35487c0301a7',
+                    'userid': '123456',
+                    'timestamp': '2021-03-30T21:57:49.860Z',
+                    'starttimeepochtime': starttime
+                }
+            )
+        with open('./events/event-get-bookings-by-resource.json', 'r') as f:
+            apigw_event = json.load(f)
+        # epoch and ISO 8601 times can be mixed, timestamps without offset are UTC
+        apigw_event['queryStringParameters'] = {'from': '1617278400', 'to': '2021-04-01T14:00:00'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert [item['starttimeepochtime'] for item in data['items']] == [1617278400, 1617285600]
+        assert 'nextToken' not in data
+        apigw_event['queryStringParameters'] = {'from': '2021-04-01T13:00:00Z', 'order': 'desc', 'limit': '1'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert [item['starttimeepochtime'] for item in data['items']] == [1617364800]
+        assert 'nextToken' in data
+        apigw_event['queryStringParameters'] = {'from': '2021-04-02T00:00:00Z', 'to': '2021-04-01T00:00:00Z'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+        apigw_event['queryStringParameters'] = {'from': 'yesterday'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
+
+def test_get_bookings_by_resource_fast_json():
+    with setup_test_environment():
+        from src.api import bookings
+        with open('./events/event-get-bookings-by-resource.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'from': '1617278400', 'order': 'desc'}
+        expected = bookings.lambda_handler(apigw_event, '')
+        with patch.object(bookings, 'FAST_JSON_RESPONSES', True), \
+                patch.object(bookings, 'ddb_client', boto3.client('dynamodb', region_name='us-east-1')):
+            ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert json.loads(ret['body']) == json.loads(expected['body'])
+        assert len(json.loads(ret['body'])['items']) == 1
+        # pages of the fast path have the same tokens
+        boto3.resource('dynamodb').Table(BOOKINGS_MOCK_TABLE_NAME).put_item(
+            Item={
+                'bookingid': 'booking-1',
+                'resourceid': '86f0b180-9be1-11eb-a305-35487c0301a7',
+                'userid': '123456',
+                'timestamp': '2021-03-30T21:57:49.860Z',
+                'starttimeepochtime': 1617285600
+            }
+        )
+        apigw_event['queryStringParameters']['limit'] = '1'
+        expected = bookings.lambda_handler(apigw_event, '')
+        with patch.object(bookings, 'FAST_JSON_RESPONSES', True), \
+                patch.object(bookings, 'ddb_client', boto3.client('dynamodb', region_name='us-east-1')):
+            ret = bookings.lambda_handler(apigw_event, '')
+            assert json.loads(ret['body']) == json.loads(expected['body'])
+            apigw_event['queryStringParameters']['nextToken'] = json.loads(ret['body'])['nextToken']
+            ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert [item['bookingid'] for item in json.loads(ret['body'])['items']] == [
+            '31a9f940-1234-5678-1234-67837e2c40b0'
+        ]
+
+
+
+def test_get_bookings_by_user_paginated():
+    with setup_test_environment():
+        from src.api import bookings
+        boto3.resource('dynamodb').Table(BOOKINGS_MOCK_TABLE_NAME).put_item(
+            Item={
+                'bookingid': '2f290bf0-9be2-11eb-9326-b188c945553f',
+                'resourceid': 'f8216640-91a2-11eb-8ab9-57aa454facef',
+                'userid': 'bf6dbddc-db2e-4f70-a892-1b165556dede',
+                'timestamp': '2021-03-30T21:57:49.860Z',
+                'starttimeepochtime': 1617282000
+            }
+        )
+        with open('./events/event-get-bookings-by-user.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'limit': '1'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        first_page = json.loads(ret['body'])
+        assert len(first_page['items']) == 1
+        assert 'nextToken' in first_page
+        apigw_event['queryStringParameters'] = {'limit': '1', 'nextToken': first_page['nextToken']}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        second_page = json.loads(ret['body'])
+        assert len(second_page['items']) == 1
+        assert second_page['items'][0]['bookingid'] != first_page['items'][0]['bookingid']
+        # a token issued for one user can't be used to page through another user's bookings
+        apigw_event['pathParameters']['userid'] = '123456'
+        apigw_event['queryStringParameters'] = {'nextToken': first_page['nextToken']}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
+def test_get_bookings_by_ids():
+    with setup_test_environment():
+        from src.api import bookings
+        with open('./events/event-get-bookings-by-user.json', 'r') as f:
+            apigw_event = json.load(f)
+        # bookings of other users and unknown ids are not returned
+        apigw_event['queryStringParameters'] = {
+            'ids': '1f290bf0-9be2-11eb-9326-b188c945553f,31a9f940-1234-5678-1234-67837e2c40b0,123456789',
+            'fields': 'resourceid'
+        }
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert data == {
+            'items': [
+                {
+                    'bookingid': '1f290bf0-9be2-11eb-9326-b188c945553f',
+                    'resourceid': 'f8216640-91a2-11eb-8ab9-57aa454facef',
+                    'userid': 'bf6dbddc-db2e-4f70-a892-1b165556dede'
+                }
+            ]
+        }
+        apigw_event['queryStringParameters'] = {'ids': ','.join(str(i) for i in range(bulk_get.MAX_BULK_GET_IDS + 1))}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
+
+def test_get_bookings_by_ids_unprocessed_keys():
+    with setup_test_environment():
+        from src.api import bookings
+        with open('./events/event-get-bookings-by-user.json', 'r') as f:
+            apigw_event = json.load(f)
+        userid = apigw_event['pathParameters']['userid']
+        apigw_event['queryStringParameters'] = {'ids': ','.join(str(i) for i in range(150))}
+
+        def batch_get_item(RequestItems):
+            # first chunk is throttled once, second chunk is never processed
+            keys = RequestItems[bookings.BOOKINGS_TABLE]['Keys']
+            if keys[0]['bookingid'] == '100':
+                return {'Responses': {}, 'UnprocessedKeys': {bookings.BOOKINGS_TABLE: {'Keys': keys}}}
+            items = [dict(key, userid=userid) for key in keys]
+            if len(keys) == bulk_get.BATCH_GET_SIZE:
+                return {'Responses': {bookings.BOOKINGS_TABLE: items[:90]},
+                        'UnprocessedKeys': {bookings.BOOKINGS_TABLE: {'Keys': keys[90:]}}}
+            return {'Responses': {bookings.BOOKINGS_TABLE: items}, 'UnprocessedKeys': {}}
+        with patch.object(bookings.dynamodb, 'batch_get_item', side_effect=batch_get_item) as mock_batch_get_item, \
+                patch('time.sleep'):
+            ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])
+        assert [item['bookingid'] for item in data['items']] == [str(i) for i in range(100)]
+        assert data['unprocessedIds'] == [str(i) for i in range(100, 150)]
+        assert mock_batch_get_item.call_count == 2 + 1 + bulk_get.BATCH_GET_MAX_RETRIES
+
 
 
 def test_get_single_booking():
@@ -206,6 +373,25 @@ def test_get_single_booking_wrong_id():
         data = json.loads(ret['body'])
         assert data == expected_response
 
+def test_get_bookings_sparse_fields():
+    with setup_test_environment():
+        from src.api import bookings
+        with open('./events/event-get-bookings-by-user.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'fields': 'starttimeepochtime'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert json.loads(ret['body'])['items'] == [
+            {'bookingid': '1f290bf0-9be2-11eb-9326-b188c945553f', 'starttimeepochtime': 1617278400}
+        ]
+        with open('./events/event-get-booking-by-id.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['queryStringParameters'] = {'fields': 'timestamp'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        assert sorted(json.loads(ret['body']).keys()) == ['bookingid', 'timestamp']
+
+
 
 @patch('uuid.uuid1', mock_uuid)
 @pytest.mark.freeze_time('2001-01-01')
@@ -251,3 +437,179 @@ def test_delete_booking():
         ret = bookings.lambda_handler(apigw_event, '')
         assert ret['statusCode'] == 200
         assert json.loads(ret['body']) == {}
+
+
+@pytest.mark.freeze_time('2001-01-01')
+def test_add_bookings_batch():
+    with setup_test_environment():
+        from src.api import bookings
+        with open('./events/event-put-bookings-batch.json', 'r') as f:
+            apigw_event = json.load(f)
+        request_bookings = json.loads(apigw_event['body'])
+        request_bookings.append({'resourceid': 'f8216640-91a2-11eb-8ab9-57aa454facef'})
+        request_bookings.append(dict(request_bookings[0], bookingid='123456789'))
+        request_bookings.append(dict(request_bookings[1], bookingid='123456789'))
+        apigw_event['body'] = json.dumps(request_bookings)
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])['items']
+        assert [result['status'] for result in data] == ['created', 'created', 'created', 'failed', 'created', 'failed']
+        assert data[3]['error'] == 'Invalid booking'
+        assert data[5]['error'] == 'Duplicate bookingid'
+        for result in data[:3]:
+            assert result['booking']['userid'] == apigw_event['pathParameters']['userid']
+            assert result['booking']['timestamp'] == '2001-01-01T00:00:00'
+        # created bookings are returned by the list route
+        with open('./events/event-get-bookings-by-user.json', 'r') as f:
+            apigw_event = json.load(f)
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert len(json.loads(ret['body'])['items']) == 5
+
+
+def test_add_bookings_batch_unprocessed_items():
+    with setup_test_environment():
+        from src.api import bookings
+        with open('./events/event-put-bookings-batch.json', 'r') as f:
+            apigw_event = json.load(f)
+        apigw_event['body'] = json.dumps([
+            {'bookingid': str(i), 'resourceid': 'f8216640-91a2-11eb-8ab9-57aa454facef', 'starttimeepochtime': 1617278400 + i}
+            for i in range(30)
+        ])
+
+        def batch_write_item(RequestItems):
+            # first chunk is throttled once, second chunk is never processed
+            request_items = RequestItems[bookings.BOOKINGS_TABLE]
+            if request_items[0]['PutRequest']['Item']['bookingid'] == '0' and len(request_items) == 25:
+                return {'UnprocessedItems': {bookings.BOOKINGS_TABLE: request_items[20:]}}
+            if request_items[0]['PutRequest']['Item']['bookingid'] == '25':
+                return {'UnprocessedItems': {bookings.BOOKINGS_TABLE: request_items}}
+            return {'UnprocessedItems': {}}
+        with patch.object(bookings.dynamodb, 'batch_write_item', side_effect=batch_write_item) as mock_batch_write_item, \
+                patch('time.sleep'):
+            ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 200
+        data = json.loads(ret['body'])['items']
+        assert all(result['status'] == 'created' for result in data[:25])
+        assert all(result['status'] == 'failed' for result in data[25:])
+        assert mock_batch_write_item.call_count == 2 + 1 + bookings.BATCH_WRITE_MAX_RETRIES
+
+
+def set_up_resources_dynamodb():
+    table = boto3.resource('dynamodb').create_table(
+        TableName=RESOURCES_MOCK_TABLE_NAME,
+        KeySchema=[{'AttributeName': 'resourceid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[
+            {'AttributeName': 'resourceid', 'AttributeType': 'S'},
+            {'AttributeName': 'locationid', 'AttributeType': 'S'}
+        ],
+        GlobalSecondaryIndexes=[
+            {
+                'IndexName': 'locationidGSI',
+                'KeySchema': [{'AttributeName': 'locationid', 'KeyType': 'HASH'}],
+                'Projection': {'ProjectionType': 'ALL'},
+                'ProvisionedThroughput': {'ReadCapacityUnits': 2, 'WriteCapacityUnits': 2}
+            }
+        ],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+    for resourceid in ['f8216640-91a2-11eb-8ab9-57aa454facef', '86f0b180-9be1-11eb-a305-35487c0301a7', '123456789']:
+        table.put_item(Item={'resourceid': resourceid, 'locationid': LOCATION_MOCK_VALUE, 'name': resourceid})
+
+
+def test_get_availability():
+    with setup_test_environment():
+        from src.api import bookings
+        set_up_resources_dynamodb()
+        bookings.availability_indexes.clear()
+        with open('./events/event-get-availability.json', 'r') as f:
+            apigw_event = json.load(f)
+        with patch.object(bookings, 'RESOURCES_TABLE', RESOURCES_MOCK_TABLE_NAME), \
+                patch.object(bookings, 'query_all', wraps=bookings.query_all) as mock_query_all:
+            # both booked resources are busy between 12:00 and 13:00
+            apigw_event['queryStringParameters'] = {'from': '2021-04-01T11:30:00Z', 'to': '2021-04-01T12:30:00Z'}
+            ret = bookings.lambda_handler(apigw_event, '')
+            assert ret['statusCode'] == 200
+            assert [resource['resourceid'] for resource in json.loads(ret['body'])] == ['123456789']
+            # index is reused for other windows of the same day
+            apigw_event['queryStringParameters'] = {'from': '2021-04-01T13:00:00Z', 'to': '2021-04-01T14:00:00Z'}
+            ret = bookings.lambda_handler(apigw_event, '')
+            assert len(json.loads(ret['body'])) == 3
+            assert mock_query_all.call_count == 1 + 3
+            # index is rebuilt once a booking for one of the location resources changes
+            with open('./events/event-put-booking.json', 'r') as f:
+                put_event = json.load(f)
+            put_event['body'] = json.dumps({'resourceid': '123456789', 'starttimeepochtime': 1617283800})
+            bookings.lambda_handler(put_event, '')
+            assert len(bookings.availability_indexes) == 0
+            ret = bookings.lambda_handler(apigw_event, '')
+            assert len(json.loads(ret['body'])) == 2
+            assert mock_query_all.call_count == 2 * (1 + 3)
+        apigw_event['queryStringParameters'] = {'from': '2021-04-01T14:00:00Z', 'to': '2021-04-01T13:00:00Z'}
+        ret = bookings.lambda_handler(apigw_event, '')
+        assert ret['statusCode'] == 400
+
+
+def set_up_single_table_dynamodb():
+    return boto3.resource('dynamodb').create_table(
+        TableName=SINGLE_TABLE_MOCK_NAME,
+        KeySchema=[
+            {'AttributeName': 'PK', 'KeyType': 'HASH'},
+            {'AttributeName': 'SK', 'KeyType': 'RANGE'}
+        ],
+        AttributeDefinitions=[
+            {'AttributeName': 'PK', 'AttributeType': 'S'},
+            {'AttributeName': 'SK', 'AttributeType': 'S'}
+        ],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+
+
+def test_bookings_single_table_writes():
+    with setup_test_environment():
+        from src.api import bookings
+        set_up_resources_dynamodb()
+        single_table = set_up_single_table_dynamodb()
+        with patch.object(bookings, 'RESOURCES_TABLE', RESOURCES_MOCK_TABLE_NAME), \
+                patch.object(bookings, 'single_table', single_table):
+            with open('./events/event-put-booking.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['body'] = json.dumps({'bookingid': 'booking-1', 'resourceid': '123456789', 'starttimeepochtime': 1617278400})
+            bookings.lambda_handler(apigw_event, '')
+            with open('./events/event-put-bookings-batch.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['body'] = json.dumps([
+                {'bookingid': 'booking-2', 'resourceid': '123456789', 'starttimeepochtime': 1617282000},
+                {'bookingid': 'booking-3', 'resourceid': 'unknown-resource', 'starttimeepochtime': 1617282000}
+            ])
+            bookings.lambda_handler(apigw_event, '')
+            items = single_table.scan()['Items']
+            assert sorted((item['PK'], item['SK']) for item in items) == [
+                (f'LOCATION#{LOCATION_MOCK_VALUE}', 'BOOKING#123456789#booking-1'),
+                (f'LOCATION#{LOCATION_MOCK_VALUE}', 'BOOKING#123456789#booking-2')
+            ]
+            with open('./events/event-delete-booking.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['pathParameters']['bookingid'] = 'booking-1'
+            bookings.lambda_handler(apigw_event, '')
+            assert [item['bookingid'] for item in single_table.scan()['Items']] == ['booking-2']
+
+
+def test_bookings_single_table_writes_without_resource():
+    with setup_test_environment():
+        from src.api import bookings
+        set_up_resources_dynamodb()
+        single_table = set_up_single_table_dynamodb()
+        with patch.object(bookings, 'RESOURCES_TABLE', RESOURCES_MOCK_TABLE_NAME), \
+                patch.object(bookings, 'single_table', single_table):
+            # a booking without a resource is stored, but can't be placed in the single table
+            with open('./events/event-put-booking.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['body'] = json.dumps({'bookingid': 'booking-1', 'starttimeepochtime': 1617278400})
+            ret = bookings.lambda_handler(apigw_event, '')
+            assert ret['statusCode'] == 200
+            assert single_table.scan()['Items'] == []
+            with open('./events/event-delete-booking.json', 'r') as f:
+                apigw_event = json.load(f)
+            apigw_event['pathParameters']['bookingid'] = 'booking-1'
+            ret = bookings.lambda_handler(apigw_event, '')
+            assert ret['statusCode'] == 200
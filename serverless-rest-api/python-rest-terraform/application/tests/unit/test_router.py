@@ -0,0 +1,75 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import os
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import boto3
+from moto import mock_aws
+
+from src.api.router import DynamoDBMetrics, Router, patch_libraries
+
+
+def test_dispatch():
+    router = Router(time.perf_counter())
+
+    @router.route('GET /locations/{locationid}')
+    def get_location(event, metric_payload):
+        metric_payload['locationid'] = event['pathParameters']['locationid']
+        return 200, {'locationid': event['pathParameters']['locationid']}
+
+    metric_payload = {}
+    event = {'pathParameters': {'locationid': '1234'}}
+    assert router.dispatch('GET /locations/{locationid}', event, metric_payload) == (200, {'locationid': '1234'})
+    assert metric_payload == {'locationid': '1234'}
+    assert router.dispatch('DELETE /locations/{locationid}', event, {}) == (400, {'Message': 'Unsupported route'})
+
+
+def test_cold_start_metrics():
+    router = Router(time.perf_counter())
+    metrics = MagicMock()
+    router.put_cold_start_metrics(metrics)
+    metrics.set_property.assert_called_with('coldStart', True)
+    assert metrics.put_metric.call_args[0][0] == 'InitDuration'
+    metrics = MagicMock()
+    router.put_cold_start_metrics(metrics)
+    metrics.set_property.assert_called_with('coldStart', False)
+    metrics.put_metric.assert_not_called()
+
+
+@patch.dict(os.environ, {'AWS_XRAY_SDK_ENABLED': 'false'})
+def test_patch_libraries_disabled():
+    # the X-Ray SDK must not be imported when tracing is disabled
+    with patch.dict(sys.modules, {'aws_xray_sdk.core': None}):
+        patch_libraries()
+
+
+@mock_aws()
+def test_dynamodb_metrics():
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+    table = dynamodb.create_table(
+        TableName='Locations',
+        KeySchema=[{'AttributeName': 'locationid', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'locationid', 'AttributeType': 'S'}],
+        ProvisionedThroughput={'ReadCapacityUnits': 1, 'WriteCapacityUnits': 1}
+    )
+    ddb_metrics = DynamoDBMetrics()
+    ddb_metrics.instrument(dynamodb.meta.client)
+    table.put_item(Item={'locationid': '1234'})
+    table.put_item(Item={'locationid': '5678'})
+    assert 'ConsumedCapacity' in table.get_item(Key={'locationid': '1234'})
+    table.scan()
+    assert ddb_metrics.calls == 4
+    assert ddb_metrics.items == 3
+    assert ddb_metrics.consumed_capacity > 0
+    metrics = MagicMock()
+    ddb_metrics.put_metrics(metrics)
+    assert [call[0][0] for call in metrics.put_metric.call_args_list] == \
+        ['DynamoDBCalls', 'DynamoDBLatency', 'DynamoDBItems', 'DynamoDBConsumedCapacity']
+    # nothing is reported for requests without DynamoDB calls
+    ddb_metrics.reset()
+    metrics = MagicMock()
+    ddb_metrics.put_metrics(metrics)
+    metrics.put_metric.assert_not_called()
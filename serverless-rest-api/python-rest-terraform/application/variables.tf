@@ -19,6 +19,30 @@ variable "environment" {
   default     = "dev"
 }
 
+variable "single_table_layout" {
+  description = "create the optional single-table layout and mirror locations, resources and bookings writes to it"
+  type        = bool
+  default     = false
+}
+
+variable "fast_json_responses" {
+  description = "read list routes with the low-level DynamoDB client and encode the items to JSON directly"
+  type        = bool
+  default     = false
+}
+
+variable "authorizer_policy_mode" {
+  description = "policies returned by the Lambda authorizer, 'route' lists the allowed routes, 'principal' uses wildcards scoped to the user"
+  type        = string
+  default     = "route"
+}
+
+variable "authorizer_result_ttl" {
+  description = "time in seconds API Gateway caches Lambda authorizer results, 0 disables caching"
+  type        = number
+  default     = 300
+}
+
 variable "lambda_python_runtime" {
   description = "python runtime for lambda function"
   type        = string